@@ -0,0 +1,474 @@
+import io
+import threading
+import time
+import wave
+from math import gcd
+from typing import Optional, List, Callable, Any, Tuple, Iterable, Iterator
+
+import numpy as np
+
+import profiling
+
+# sounddevice, scipy and soundfile are imported on first use; only numpy is needed to import this module
+_soundfile = None
+
+# Constants
+SAMPLE_RATE = 44100  # Audio sample rate
+UPLOAD_SAMPLE_RATE = 16000  # Whisper works at 16 kHz internally, so anything above is wasted upload
+UPLOAD_FORMAT = "flac"  # "flac" (lossless, roughly half the size of WAV) or "wav"
+UPLOAD_FORMATS = ["wav", "flac"]
+CHANNELS = 1
+SAMPLE_WIDTH = 2  # Bytes per int16 sample
+VAD_FRAME_MS = 30  # Analysis frame length for voice activity detection
+VAD_MIN_RMS = 300.0  # Frames quieter than this (int16 RMS, about -40 dBFS) are never speech
+VAD_NOISE_FACTOR = 3.0  # Speech must be this many times louder than the estimated noise floor
+VAD_MAX_ZCR = 0.35  # Quiet frames crossing zero more often than this are treated as noise (fricatives excepted when loud)
+VAD_PADDING_MS = 200  # Audio kept on either side of detected speech when trimming
+AUTO_STOP_SILENCE = 1.5  # Seconds of trailing silence that end a hands-free recording
+SEGMENT_PAUSE = 0.5  # Seconds of silence that close a segment for incremental transcription
+SEGMENT_MIN_SECONDS = 3.0  # Segments are not closed on a pause before they are this long
+SEGMENT_MAX_SECONDS = 12.0  # Segments are closed at this length even without a pause
+PLAYBACK_SAMPLE_RATE = 22050  # Matches the pcm_22050 text-to-speech output format
+JITTER_BUFFER_MS = 150  # Audio buffered before output starts, to ride out gaps between network chunks
+READ_CHUNK_BYTES = 32 * 1024
+
+
+def load_soundfile() -> Any:
+    """Import soundfile on first use, returning None when it is not installed (FLAC is then unavailable)"""
+    global _soundfile
+    if _soundfile is None:
+        try:
+            import soundfile
+        except (ImportError, OSError):
+            return None
+        _soundfile = soundfile
+    return _soundfile
+
+
+def callback_stop() -> Exception:
+    """Return the exception that tells sounddevice to end a stream from inside its callback"""
+    import sounddevice as sd
+
+    return sd.CallbackStop()
+
+
+class StreamRecorder:
+    """Captures microphone input through a sounddevice callback into a growable chunked buffer"""
+
+    def __init__(
+        self,
+        sample_rate: int = SAMPLE_RATE,
+        max_seconds: float = 60,
+        stream_factory: Optional[Callable[..., Any]] = None,
+        auto_stop_silence: Optional[float] = None,
+        on_segment: Optional[Callable[[np.ndarray], Any]] = None,
+    ):
+        self.sample_rate = sample_rate
+        self.max_frames = int(max_seconds * sample_rate)
+        if stream_factory is None:
+            import sounddevice as sd
+
+            stream_factory = sd.InputStream
+        self.stream_factory = stream_factory
+        self.auto_stop_silence = auto_stop_silence
+        self.on_segment = on_segment
+        self.vad = VoiceActivityDetector(sample_rate) if auto_stop_silence is not None or on_segment is not None else None
+        self.finished = threading.Event()  # Set once max_seconds of audio (or the trailing silence) has been captured
+
+        self._chunks: List[np.ndarray] = []
+        self._frames = 0
+        self._segment_chunks: List[np.ndarray] = []
+        self._segment_frames = 0
+        self._segment_has_speech = False
+        self._lock = threading.Lock()
+        self._stream = None
+
+    @property
+    def frames(self) -> int:
+        """Number of frames captured so far"""
+        return self._frames
+
+    @property
+    def seconds(self) -> float:
+        """Duration captured so far, based on frames rather than wall-clock time"""
+        return self._frames / self.sample_rate
+
+    def start(self) -> None:
+        """Open the input stream and start capturing"""
+        self._stream = self.stream_factory(
+            samplerate=self.sample_rate,
+            channels=CHANNELS,
+            dtype="int16",
+            callback=self._callback,
+        )
+        self._stream.start()
+
+    def stop(self) -> np.ndarray:
+        """Stop capturing and return the recorded int16 samples, flushing the last segment to on_segment"""
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+        with self._lock:
+            if self.on_segment is not None and self._segment_frames:
+                self._emit_segment()
+            if not self._chunks:
+                return np.zeros(0, dtype=np.int16)
+            return np.concatenate(self._chunks)
+
+    def _callback(self, indata: np.ndarray, frames: int, time_info: Any, status: Any) -> None:
+        with self._lock:
+            remaining = self.max_frames - self._frames
+            if remaining > 0:
+                # sounddevice reuses indata between callbacks, so keep a copy of just what we need
+                chunk = indata[:remaining, 0].copy()
+                self._chunks.append(chunk)
+                self._frames += len(chunk)
+                if self.vad is not None and self.vad.feed(chunk).any():
+                    self._segment_has_speech = True
+                if self.on_segment is not None:
+                    self._segment_chunks.append(chunk)
+                    self._segment_frames += len(chunk)
+                    if self._segment_complete():
+                        self._emit_segment()
+            if self._frames >= self.max_frames or self._heard_enough():
+                self.finished.set()
+                raise callback_stop()
+
+    def _segment_complete(self) -> bool:
+        """True when the current segment has hit a pause after enough speech, or its maximum length"""
+        seconds = self._segment_frames / self.sample_rate
+        if seconds >= SEGMENT_MAX_SECONDS:
+            return True
+        return (
+            seconds >= SEGMENT_MIN_SECONDS
+            and self._segment_has_speech
+            and self.vad.trailing_silence >= SEGMENT_PAUSE
+        )
+
+    def _emit_segment(self) -> None:
+        """Hand the current segment to on_segment; the callback must only queue work, not do it"""
+        segment = np.concatenate(self._segment_chunks)
+        self._segment_chunks = []
+        self._segment_frames = 0
+        self._segment_has_speech = False
+        self.on_segment(segment)
+
+    def _heard_enough(self) -> bool:
+        """True once the speaker has said something and then stayed quiet for auto_stop_silence seconds"""
+        return (
+            self.auto_stop_silence is not None
+            and self.vad.speech_detected
+            and self.vad.trailing_silence >= self.auto_stop_silence
+        )
+
+
+def frame_features(samples: np.ndarray, sample_rate: int, frame_ms: int = VAD_FRAME_MS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compute per-frame RMS energy and zero-crossing rate
+
+    Args:
+        samples: Mono int16 (or float) samples; a trailing partial frame is ignored
+        sample_rate: Sample rate of the samples
+        frame_ms: Frame length in milliseconds
+
+    Returns:
+        (rms, zcr) arrays with one value per frame; zcr is the fraction of sample pairs that change sign
+    """
+    frame_length = max(int(sample_rate * frame_ms / 1000), 2)
+    frame_count = len(samples) // frame_length
+    if frame_count == 0:
+        return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32)
+
+    frames = samples[:frame_count * frame_length].reshape(frame_count, frame_length).astype(np.float32)
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (frame_length - 1)
+    return rms, zcr.astype(np.float32)
+
+
+def classify_frames(
+    rms: np.ndarray,
+    zcr: np.ndarray,
+    noise_floor: Optional[float] = None,
+    min_rms: float = VAD_MIN_RMS,
+    noise_factor: float = VAD_NOISE_FACTOR,
+    max_zcr: float = VAD_MAX_ZCR,
+) -> np.ndarray:
+    """Return a boolean speech mask for frames described by their RMS energy and zero-crossing rate"""
+    if noise_floor is None:
+        noise_floor = float(np.percentile(rms, 10)) if len(rms) else 0.0
+    threshold = max(min_rms, noise_floor * noise_factor)
+    loud = rms >= threshold
+    # High zero-crossing rates at modest energy are hiss or wind rather than voice
+    tonal = (zcr <= max_zcr) | (rms >= 2 * threshold)
+    return loud & tonal
+
+
+def trim_silence(
+    samples: np.ndarray,
+    sample_rate: int,
+    padding_ms: int = VAD_PADDING_MS,
+    frame_ms: int = VAD_FRAME_MS,
+) -> np.ndarray:
+    """
+    Remove leading and trailing silence from a recording
+
+    Returns:
+        A view of samples covering the detected speech plus padding, or an empty array when no speech was found
+    """
+    rms, zcr = frame_features(samples, sample_rate, frame_ms)
+    speech = np.flatnonzero(classify_frames(rms, zcr))
+    if len(speech) == 0:
+        return samples[:0]
+
+    frame_length = max(int(sample_rate * frame_ms / 1000), 2)
+    padding = int(sample_rate * padding_ms / 1000)
+    start = max(speech[0] * frame_length - padding, 0)
+    end = min((speech[-1] + 1) * frame_length + padding, len(samples))
+    return samples[start:end]
+
+
+class VoiceActivityDetector:
+    """Streaming frame-energy and zero-crossing voice activity detector"""
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE, frame_ms: int = VAD_FRAME_MS):
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.frame_length = max(int(sample_rate * frame_ms / 1000), 2)
+        self.noise_floor: Optional[float] = None
+        self.speech_detected = False
+        self.silent_frames = 0  # Consecutive non-speech frames since the last speech frame
+
+        self._pending = np.zeros(0, dtype=np.int16)
+
+    @property
+    def trailing_silence(self) -> float:
+        """Seconds of silence since speech was last heard"""
+        return self.silent_frames * self.frame_length / self.sample_rate
+
+    def feed(self, samples: np.ndarray) -> np.ndarray:
+        """Analyse newly captured samples, returning the speech mask for the complete frames they finished"""
+        if len(self._pending):
+            samples = np.concatenate((self._pending, samples))
+        frame_count = len(samples) // self.frame_length
+        self._pending = samples[frame_count * self.frame_length:].copy()
+        if frame_count == 0:
+            return np.zeros(0, dtype=bool)
+
+        rms, zcr = frame_features(samples[:frame_count * self.frame_length], self.sample_rate, self.frame_ms)
+        if self.noise_floor is None:
+            self.noise_floor = float(np.min(rms))
+        speech = classify_frames(rms, zcr, self.noise_floor)
+
+        # Track the noise floor slowly from frames that are not speech
+        quiet = rms[~speech]
+        if len(quiet):
+            self.noise_floor = 0.9 * self.noise_floor + 0.1 * float(np.median(quiet))
+
+        if speech.any():
+            self.speech_detected = True
+            self.silent_frames = frame_count - 1 - int(np.flatnonzero(speech)[-1])
+        else:
+            self.silent_frames += frame_count
+        return speech
+
+
+def encode_wav(samples: np.ndarray, sample_rate: int, name: str = "recording.wav") -> io.BytesIO:
+    """
+    Encode int16 samples as an in-memory WAV file
+
+    Args:
+        samples: Mono int16 samples
+        sample_rate: Sample rate of the samples
+        name: File name reported to upload APIs that infer the format from it
+
+    Returns:
+        A BytesIO positioned at the start of the WAV data
+    """
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(CHANNELS)
+        wav_file.setsampwidth(SAMPLE_WIDTH)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(np.ascontiguousarray(samples, dtype=np.int16))
+    buffer.seek(0)
+    buffer.name = name
+    return buffer
+
+
+def resample(samples: np.ndarray, sample_rate: int, target_rate: int) -> np.ndarray:
+    """Resample int16 samples with a polyphase filter, returning int16"""
+    if sample_rate == target_rate or len(samples) == 0:
+        return samples
+    from scipy.signal import resample_poly
+
+    divisor = gcd(sample_rate, target_rate)
+    resampled = resample_poly(samples.astype(np.float32), target_rate // divisor, sample_rate // divisor)
+    np.clip(resampled, -32768, 32767, out=resampled)
+    return resampled.astype(np.int16)
+
+
+def encode_flac(samples: np.ndarray, sample_rate: int, name: str = "recording.flac") -> io.BytesIO:
+    """Encode int16 samples as an in-memory FLAC file"""
+    buffer = io.BytesIO()
+    load_soundfile().write(buffer, samples, sample_rate, format="FLAC", subtype="PCM_16")
+    buffer.seek(0)
+    buffer.name = name
+    return buffer
+
+
+def prepare_for_upload(
+    samples: np.ndarray,
+    sample_rate: int,
+    target_rate: Optional[int] = UPLOAD_SAMPLE_RATE,
+    audio_format: str = UPLOAD_FORMAT,
+) -> io.BytesIO:
+    """
+    Shrink a recording before sending it to the speech-to-text API
+
+    Args:
+        samples: Mono int16 samples
+        sample_rate: Sample rate the samples were captured at
+        target_rate: Rate to resample to, or None to keep the capture rate
+        audio_format: "flac" or "wav"; FLAC falls back to WAV when soundfile is not installed
+
+    Returns:
+        A named in-memory file ready for upload
+    """
+    if audio_format not in UPLOAD_FORMATS:
+        raise ValueError(f"Unsupported upload format: {audio_format}")
+
+    with profiling.span("encode", audio_seconds=round(len(samples) / sample_rate, 3)) as span:
+        if target_rate and target_rate < sample_rate:
+            samples = resample(samples, sample_rate, target_rate)
+            sample_rate = target_rate
+
+        if audio_format == "flac" and load_soundfile() is not None:
+            upload = encode_flac(samples, sample_rate)
+        else:
+            upload = encode_wav(samples, sample_rate)
+        span.set(format=upload.name.rsplit(".", 1)[-1], upload_bytes=upload.getbuffer().nbytes)
+        return upload
+
+
+class NullOutputStream:
+    """Stand-in for sd.RawOutputStream that discards audio, optionally at real-time speed"""
+
+    def __init__(self, samplerate: int, channels: int = CHANNELS, dtype: str = "int16", realtime: bool = False, **kwargs: Any):
+        self.samplerate = samplerate
+        self.channels = channels
+        self.realtime = realtime
+        self.frames_written = 0
+        self.active = False
+
+    def start(self) -> None:
+        self.active = True
+
+    def write(self, data: Any) -> bool:
+        frames = len(memoryview(data).cast("B")) // (SAMPLE_WIDTH * self.channels)
+        self.frames_written += frames
+        if self.realtime:
+            time.sleep(frames / self.samplerate)
+        return False
+
+    def stop(self) -> None:
+        self.active = False
+
+    def close(self) -> None:
+        self.active = False
+
+
+class StreamPlayer:
+    """Plays raw int16 PCM chunks in-process as they arrive, once a small jitter buffer has filled"""
+
+    def __init__(
+        self,
+        sample_rate: int = PLAYBACK_SAMPLE_RATE,
+        jitter_buffer_ms: int = JITTER_BUFFER_MS,
+        stream_factory: Optional[Callable[..., Any]] = None,
+    ):
+        self.sample_rate = sample_rate
+        self.jitter_buffer_bytes = int(sample_rate * jitter_buffer_ms / 1000) * SAMPLE_WIDTH * CHANNELS
+        if stream_factory is None:
+            import sounddevice as sd
+
+            stream_factory = sd.RawOutputStream
+        self.stream_factory = stream_factory
+        self.last_time_to_first_sample: Optional[float] = None
+
+    def play(self, chunks: Iterable[bytes], started_at: Optional[float] = None) -> int:
+        """
+        Play a stream of PCM chunks, blocking until playback has finished
+
+        Args:
+            chunks: Raw little-endian int16 mono audio; chunk boundaries may split samples
+            started_at: time.monotonic() value to measure time-to-first-sample from (defaults to now)
+
+        Returns:
+            Number of frames played
+        """
+        started_at = time.monotonic() if started_at is None else started_at
+        self.last_time_to_first_sample = None
+        frame_bytes = SAMPLE_WIDTH * CHANNELS
+        pending = bytearray()
+        stream = None
+        frames = 0
+
+        with profiling.span("playback") as span:
+            try:
+                for chunk in chunks:
+                    pending += chunk
+                    if stream is None:
+                        if len(pending) < self.jitter_buffer_bytes:
+                            continue
+                        stream = self._open(started_at)
+                    frames += self._write(stream, pending, frame_bytes)
+
+                if stream is None and len(pending) >= frame_bytes:
+                    # Clips shorter than the jitter buffer are played once they are complete
+                    stream = self._open(started_at)
+                if stream is not None:
+                    frames += self._write(stream, pending, frame_bytes)
+                    stream.stop()  # Returns once the queued audio has been played
+            finally:
+                if stream is not None:
+                    stream.close()
+                span.set(frames=frames)
+                if self.last_time_to_first_sample is not None:
+                    span.set(time_to_first_sample_ms=round(1000 * self.last_time_to_first_sample, 3))
+        return frames
+
+    def _open(self, started_at: float) -> Any:
+        stream = self.stream_factory(samplerate=self.sample_rate, channels=CHANNELS, dtype="int16")
+        stream.start()
+        self.last_time_to_first_sample = time.monotonic() - started_at
+        return stream
+
+    @staticmethod
+    def _write(stream: Any, pending: bytearray, frame_bytes: int) -> int:
+        """Write every whole frame in pending to the stream, keeping any partial frame"""
+        usable = len(pending) - len(pending) % frame_bytes
+        if usable:
+            stream.write(bytes(pending[:usable]))
+            del pending[:usable]
+        return usable // frame_bytes
+
+
+def read_chunks(path: str, chunk_size: int = READ_CHUNK_BYTES) -> Iterator[bytes]:
+    """Yield a file's contents in chunks"""
+    with open(path, "rb") as audio_file:
+        while True:
+            chunk = audio_file.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def decode_audio_file(path: str) -> Tuple[bytes, int]:
+    """Decode a compressed audio file to mono int16 PCM, returning (pcm, sample_rate); needs soundfile"""
+    sf = load_soundfile()
+    if sf is None:
+        raise RuntimeError("Playing compressed audio requires the soundfile package")
+    data, sample_rate = sf.read(path, dtype="int16", always_2d=True)
+    return np.ascontiguousarray(data[:, 0]).tobytes(), sample_rate
@@ -0,0 +1,1022 @@
+import argparse
+import asyncio
+import base64
+import builtins
+import contextlib
+import functools
+import io
+import json
+import os
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unicodedata
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Any, Tuple, Callable, Iterator
+
+import numpy as np
+
+import profiling
+from audio import SAMPLE_RATE, prepare_for_upload, resample
+from stubs import ProviderStubServer, StubConfig
+
+# Modules that must not be loaded just by importing the application
+HEAVY_MODULES = ["numpy", "scipy", "sounddevice", "soundfile", "openai", "elevenlabs", "requests", "tiktoken"]
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROMPT_MARKER = "Select input mode"
+PERCENTILES = [50, 95, 99]
+SCENARIOS = ["text", "voice", "conversation", "conversation_voice"]
+FIXTURE_BLOCK_FRAMES = 1024  # Frames per fake audio callback, about 23 ms at 44.1 kHz
+BENCH_SENTENCES = [
+    "Hola, ¿cómo estás?",
+    "Me gustaría pedir un café con leche, por favor.",
+    "Ayer fuimos al mercado y compramos muchas frutas.",
+    "¿Dónde está la estación de tren más cercana?",
+    "Si tuviera más tiempo, aprendería a tocar la guitarra.",
+]
+
+MEMORY_SIZES = [10_000, 100_000, 1_000_000]
+# Pseudo-Spanish syllables (onset, vowel, coda) for synthetic translation memory corpora
+SYLLABLES = [
+    onset + vowel + coda
+    for onset in ["", "b", "c", "d", "f", "g", "l", "m", "n", "p", "r", "s", "t", "v", "ch", "ll", "qu", "tr", "br", "pl"]
+    for vowel in "aeiouáéíóú"
+    for coda in ["", "", "", "n", "s", "r", "l"]
+]
+
+# Upload configurations compared by the upload benchmark: (label, target sample rate, format)
+UPLOAD_CONFIGS = [
+    ("wav_44k", None, "wav"),
+    ("wav_16k", 16000, "wav"),
+    ("flac_16k", 16000, "flac"),
+]
+
+
+def load_wav(path: str) -> Tuple[np.ndarray, int]:
+    """Load a mono int16 WAV fixture, returning (samples, sample_rate)"""
+    with wave.open(path, "rb") as wav_file:
+        frames = wav_file.readframes(wav_file.getnframes())
+        samples = np.frombuffer(frames, dtype=np.int16)
+        if wav_file.getnchannels() > 1:
+            samples = samples.reshape(-1, wav_file.getnchannels())[:, 0].copy()
+        return samples, wav_file.getframerate()
+
+
+def synthetic_speech(seconds: float, sample_rate: int = SAMPLE_RATE, seed: int = 0) -> np.ndarray:
+    """Generate a speech-like test signal: voiced harmonics with syllable-rate amplitude modulation plus noise"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 6))
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None)
+    signal = 0.3 * voiced * envelope + 0.01 * rng.standard_normal(len(t))
+    return (np.clip(signal, -1, 1) * 32767).astype(np.int16)
+
+
+def bench_upload(samples: np.ndarray, sample_rate: int, transcribe: bool, repeat: int) -> List[Dict[str, Any]]:
+    """Measure upload size, encode time and (optionally) end-to-end transcription latency per upload config"""
+    ai_service = None
+    if transcribe:
+        from translation import AIService
+        from env import OPENAI_API_KEY
+
+        ai_service = AIService(OPENAI_API_KEY)
+
+    results = []
+    for label, target_rate, audio_format in UPLOAD_CONFIGS:
+        encode_times = []
+        transcribe_times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            upload = prepare_for_upload(samples, sample_rate, target_rate, audio_format)
+            encode_times.append(time.perf_counter() - start)
+            upload_bytes = len(upload.getbuffer())
+
+            if ai_service is not None:
+                start = time.perf_counter()
+                ai_service.transcribe_audio(upload)
+                transcribe_times.append(time.perf_counter() - start)
+
+        result = {
+            "config": label,
+            "format": upload.name.rsplit(".", 1)[-1],
+            "bytes_uploaded": upload_bytes,
+            "encode_ms": 1000 * float(np.median(encode_times)),
+        }
+        if transcribe_times:
+            result["transcribe_ms"] = 1000 * float(np.median(transcribe_times))
+            result["end_to_end_ms"] = result["encode_ms"] + result["transcribe_ms"]
+        results.append(result)
+    return results
+
+
+def stub_env_dir() -> str:
+    """Create a directory holding a dummy env.py so the application can start without real API keys"""
+    directory = tempfile.mkdtemp(prefix="sla_bench_")
+    with open(os.path.join(directory, "env.py"), "w") as env_file:
+        env_file.write('DEEPL_ACCESS_KEY = "bench"\nOPENAI_API_KEY = "bench"\nELEVEN_LABS_API_KEY = "bench"\n')
+    return directory
+
+
+def child_env(env_dir: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([env_dir, PROJECT_DIR, env.get("PYTHONPATH", "")])
+    env["PYTHONUNBUFFERED"] = "1"
+    return env
+
+
+def bench_import(env_dir: str) -> Dict[str, Any]:
+    """Import the application in a fresh interpreter, returning import time and any heavy modules it pulled in"""
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        "import translation\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+        "print(json.dumps({'import_ms': 1000 * elapsed, 'heavy_modules': heavy}))\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], env=child_env(env_dir), cwd=env_dir, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def bench_first_prompt(env_dir: str) -> float:
+    """Start the interactive application and return milliseconds until the mode prompt is shown"""
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(PROJECT_DIR, "translation.py")],
+        env=child_env(env_dir),
+        cwd=env_dir,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+    output = ""
+    try:
+        while PROMPT_MARKER not in output:
+            character = process.stdout.read(1)
+            if not character:
+                raise RuntimeError("Application exited before showing the first prompt")
+            output += character
+        elapsed = time.perf_counter() - start
+        process.communicate("q\n", timeout=10)
+    finally:
+        if process.poll() is None:
+            process.kill()
+    return 1000 * elapsed
+
+
+def bench_startup(repeat: int) -> Dict[str, Any]:
+    """Measure cold import time and time-to-first-prompt over several fresh processes"""
+    env_dir = stub_env_dir()
+    imports = [bench_import(env_dir) for _ in range(repeat)]
+    prompts = [bench_first_prompt(env_dir) for _ in range(repeat)]
+    return {
+        "import_ms": float(np.median([result["import_ms"] for result in imports])),
+        "first_prompt_ms": float(np.median(prompts)),
+        "heavy_modules": sorted({module for result in imports for module in result["heavy_modules"]}),
+    }
+
+
+def import_application() -> None:
+    """Make translation.py importable, falling back to dummy API keys when there is no env.py"""
+    try:
+        import env  # noqa: F401
+    except ImportError:
+        sys.path.insert(0, stub_env_dir())
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Count, mean and percentiles (in milliseconds) of durations given in seconds"""
+    if not samples:
+        return {"count": 0}
+    values = 1000 * np.asarray(samples)
+    summary = {"count": len(samples), "mean_ms": float(values.mean())}
+    for percentile, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        summary[f"p{percentile}_ms"] = float(value)
+    return summary
+
+
+class StageTimer:
+    """Collects wall-clock durations per pipeline stage by wrapping the methods that implement each stage"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def wrap(self, obj: Any, method: str, stage: Optional[str] = None, streaming: bool = False) -> None:
+        """Replace obj.method with a timed version; streaming methods are timed until their iterator is exhausted"""
+        stage = stage or method
+        original = getattr(obj, method)
+
+        if streaming:
+            @functools.wraps(original)
+            def timed(*args: Any, **kwargs: Any) -> Iterator[Any]:
+                start = time.perf_counter()
+                try:
+                    yield from original(*args, **kwargs)
+                finally:
+                    self.record(stage, time.perf_counter() - start)
+        else:
+            @functools.wraps(original)
+            def timed(*args: Any, **kwargs: Any) -> Any:
+                start = time.perf_counter()
+                try:
+                    return original(*args, **kwargs)
+                finally:
+                    self.record(stage, time.perf_counter() - start)
+
+        setattr(obj, method, timed)
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {stage: summarize(samples) for stage, samples in sorted(self.samples.items())}
+
+
+class ScriptedInput:
+    """Replaces input() with scripted answers per thread, so concurrent sessions run without a terminal"""
+
+    def __init__(self, reaction_time: float = 0.0):
+        """
+        Args:
+            reaction_time: Seconds taken to answer yes/no confirmations, as a person reading the question would
+        """
+        self.reaction_time = reaction_time
+        self._local = threading.local()
+        self._original = builtins.input
+
+    def set_script(self, answers: List[str]) -> None:
+        self._local.answers = list(answers)
+
+    def __call__(self, prompt: str = "") -> str:
+        answers = getattr(self._local, "answers", None)
+        if not answers:
+            raise EOFError("Scripted input exhausted")
+        if self.reaction_time and "(y/n)" in prompt:
+            time.sleep(self.reaction_time)
+        return answers.pop(0)
+
+    def __enter__(self) -> "ScriptedInput":
+        builtins.input = self
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        builtins.input = self._original
+
+
+class FixtureInputStream:
+    """Stand-in for sd.InputStream that pushes fixture samples through the recorder callback from a thread"""
+
+    def __init__(self, samples: np.ndarray, samplerate: int, callback: Callable[..., None], speed: float = 0.0, **kwargs: Any):
+        self.samples = samples
+        self.samplerate = samplerate
+        self.callback = callback
+        self.speed = speed  # 1.0 feeds audio in real time, 0 as fast as possible
+        self.exhausted = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._feed, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def close(self) -> None:
+        pass
+
+    def _feed(self) -> None:
+        try:
+            for start in range(0, len(self.samples), FIXTURE_BLOCK_FRAMES):
+                if self._stopped.is_set():
+                    return
+                block = self.samples[start:start + FIXTURE_BLOCK_FRAMES].reshape(-1, 1)
+                self.callback(block, len(block), None, None)
+                if self.speed:
+                    time.sleep(len(block) / self.samplerate / self.speed)
+        except Exception:
+            # The recorder raises CallbackStop once it has heard enough
+            pass
+        finally:
+            self.exhausted.set()
+
+
+def fixture_recorder(fixtures: List[np.ndarray], sample_rate: int, speed: float) -> Any:
+    """Build an AudioRecorder that records from a list of fixtures instead of the microphone"""
+    from audio import StreamRecorder
+    from translation import AudioRecorder
+
+    class FixtureRecorder(AudioRecorder):
+        def _capture(self, hands_free: bool, on_segment: Optional[Callable[[np.ndarray], Any]] = None) -> np.ndarray:
+            if not fixtures:
+                # Nothing more to say: an empty recording ends voice conversations
+                return np.zeros(0, dtype=np.int16)
+            samples = fixtures.pop(0)
+            streams: List[FixtureInputStream] = []
+
+            def stream_factory(**kwargs: Any) -> FixtureInputStream:
+                streams.append(FixtureInputStream(samples, speed=speed, **kwargs))
+                return streams[-1]
+
+            recorder = StreamRecorder(
+                self.sample_rate,
+                self.max_record_time,
+                stream_factory=stream_factory,
+                auto_stop_silence=self.auto_stop_silence if hands_free else None,
+                on_segment=on_segment,
+            )
+            recorder.start()
+            # Stop at the end of the fixture, as a user pressing ENTER would
+            while not recorder.finished.is_set() and not streams[0].exhausted.is_set():
+                recorder.finished.wait(0.01)
+            return recorder.stop()
+
+    return FixtureRecorder(sample_rate)
+
+
+def session_script(scenario: str, turns: int, reject_rate: float = 0.0) -> List[str]:
+    """Answers to the application's prompts for one session of the given scenario"""
+    sentences = [BENCH_SENTENCES[index % len(BENCH_SENTENCES)] for index in range(turns)]
+    if scenario == "text":
+        return [answer for sentence in sentences for answer in ("1", sentence)] + ["q"]
+    if scenario == "voice":
+        # Evenly spread rejections of the transcription, e.g. every fourth turn at 0.25
+        rejected = [int((turn + 1) * reject_rate) > int(turn * reject_rate) for turn in range(turns)]
+        return [answer for reject in rejected for answer in ("2", "n" if reject else "y")] + ["q"]
+    if scenario == "conversation":
+        return ["3", "t"] + sentences + ["exit", "q"]
+    return ["3", "v", "q"]
+
+
+def run_session(
+    scenario: str,
+    turns: int,
+    server: Any,
+    timer: StageTimer,
+    scripted_input: ScriptedInput,
+    fixture: np.ndarray,
+    speed: float,
+    cache_dir: Optional[str],
+    speculation: Optional[List[Dict[str, Any]]] = None,
+    speculative_translation: bool = True,
+    reject_rate: float = 0.0,
+    ledger: Any = None,
+) -> int:
+    """
+    Run one scripted assistant session against the stub server, returning the number of turns completed
+
+    Args:
+        speculation: The assistant's speculative translation stats are appended here when given
+        ledger: Usage ledger shared by every session, so token counts are reported for the whole run
+    """
+    from audio import NullOutputStream, StreamPlayer
+    from cache import TranslationCache, ExplanationCache, AudioCache
+    from http_client import PooledSession
+    from translation import TranslationService, AIService, SpanishLearningAssistant
+
+    caches: Dict[str, Any] = {}
+    if cache_dir is not None:
+        caches = {
+            "translation": TranslationCache(os.path.join(cache_dir, "translations.sqlite3")),
+            "explanation": ExplanationCache(os.path.join(cache_dir, "explanations.sqlite3")),
+            "audio": AudioCache(os.path.join(cache_dir, "audio")),
+        }
+
+    player = StreamPlayer(stream_factory=functools.partial(NullOutputStream, realtime=speed > 0))
+    ai_service = AIService(
+        "bench",
+        explanation_cache=caches.get("explanation"),
+        audio_cache=caches.get("audio"),
+        openai_base_url=server.openai_url,
+        elevenlabs_base_url=server.elevenlabs_url,
+        player=player,
+        ledger=ledger,
+    )
+    translator = TranslationService(
+        "bench",
+        server.deepl_url,
+        cache=caches.get("translation"),
+        session=PooledSession(),
+        fallback=ai_service.translate_text,
+    )
+    fixtures = [fixture] * turns if scenario in ("voice", "conversation_voice") else []
+    assistant = SpanishLearningAssistant(
+        speculative_translation=speculative_translation,
+        translator=translator,
+        ai_service=ai_service,
+        audio_recorder=fixture_recorder(fixtures, SAMPLE_RATE, speed),
+    )
+
+    # Per-request stages
+    timer.wrap(translator, "translate", "translate")
+    timer.wrap(ai_service, "transcribe_audio", "transcribe")
+    timer.wrap(ai_service, "get_text_completion", "completion")
+    timer.wrap(ai_service, "stream_text_completion", "completion_stream", streaming=True)
+    timer.wrap(ai_service, "text_to_speech_stream", "speech_synthesis", streaming=True)
+    timer.wrap(player, "play", "playback")
+    # Whole turns, from the user finishing their input to the last of the reply being played
+    timer.wrap(assistant, "transcribe_speech", "recording_and_transcription")
+    timer.wrap(assistant, "translation_mode", "turn")
+    timer.wrap(assistant, "run_conversation_turn", "turn")
+    timer.wrap(assistant, "run_streaming_conversation_turn", "turn")
+
+    scripted_input.set_script(session_script(scenario, turns, reject_rate))
+    try:
+        assistant.run()
+        if speculation is not None:
+            speculation.append(assistant.speculator.stats())
+    finally:
+        for name in ("translation", "explanation"):
+            if name in caches:
+                caches[name].close()
+        translator.session.close()
+    return turns
+
+
+def bench_e2e(
+    scenario: str,
+    sessions: int,
+    turns: int,
+    server: Any,
+    fixture: np.ndarray,
+    speed: float,
+    use_cache: bool,
+    reaction_time: float = 0.0,
+    reject_rate: float = 0.0,
+    speculative_translation: bool = True,
+) -> Dict[str, Any]:
+    """Run concurrent scripted sessions against the stub server and summarize per-stage and per-turn latency"""
+    import_application()
+    from usage import UsageLedger
+
+    timer = StageTimer()
+    speculation: List[Dict[str, Any]] = []
+    ledger = UsageLedger()
+
+    cache_root = tempfile.mkdtemp(prefix="sla_bench_cache_") if use_cache else None
+    start = time.perf_counter()
+    # The application prints as it goes; keep that out of the report
+    with ScriptedInput(reaction_time) as scripted_input, contextlib.redirect_stdout(io.StringIO()):
+        with ThreadPoolExecutor(max_workers=sessions) as executor:
+            futures = [
+                executor.submit(
+                    run_session,
+                    scenario,
+                    turns,
+                    server,
+                    timer,
+                    scripted_input,
+                    fixture,
+                    speed,
+                    os.path.join(cache_root, str(index)) if cache_root else None,
+                    speculation,
+                    speculative_translation,
+                    reject_rate,
+                    ledger,
+                )
+                for index in range(sessions)
+            ]
+            completed = sum(future.result() for future in futures)
+    elapsed = time.perf_counter() - start
+
+    stages = timer.report()
+    result = {
+        "scenario": scenario,
+        "sessions": sessions,
+        "turns_per_session": turns,
+        "cache": use_cache,
+        "elapsed_s": elapsed,
+        "turns_per_second": completed / elapsed,
+        "end_to_end": stages.pop("turn", {"count": 0}),
+        "stages": stages,
+        "provider_requests": server.stats(),
+        "usage": ledger.summary(),
+    }
+    if scenario == "voice":
+        result["speculation"] = merge_speculation_stats(speculation)
+    return result
+
+
+def merge_speculation_stats(sessions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine the speculative translation stats of several sessions"""
+    counters = ["started", "used", "discarded", "wasted", "fully_hidden"]
+    merged: Dict[str, Any] = {name: sum(stats[name] for stats in sessions) for name in counters}
+    merged["hidden_seconds"] = round(sum(stats["hidden_seconds"] for stats in sessions), 3)
+    merged["hit_rate"] = merged["used"] / merged["started"] if merged["started"] else 0.0
+    merged["waste_rate"] = merged["wasted"] / merged["started"] if merged["started"] else 0.0
+    waits = [stats["mean_wait_after_confirm_ms"] for stats in sessions]
+    merged["mean_wait_after_confirm_ms"] = float(np.mean(waits)) if waits else 0.0
+    return merged
+
+
+def bench_rate_limit(server: Any, workers: int, calls: int, limited: bool) -> Dict[str, Any]:
+    """Hammer the throttling stub with translations and completions, with or without the adaptive limiters"""
+    import_application()
+    from http_client import PooledSession
+    from ratelimit import RateLimiter, PROVIDER_LIMITS
+    from translation import TranslationService, AIService, COMPLETION_FALLBACK
+
+    class Unlimited(RateLimiter):
+        """Baseline that neither waits nor learns, like the clients before rate limiting was added"""
+
+        def reserve(self, tokens: int = 0) -> float:
+            return 0.0
+
+        def record_response(self, status_code: int, headers: Any = None) -> None:
+            pass
+
+    def limiter(name: str) -> RateLimiter:
+        return (RateLimiter if limited else Unlimited)(name, **PROVIDER_LIMITS[name])
+
+    translator = TranslationService("bench", server.deepl_url, session=PooledSession(), limiter=limiter("deepl"))
+    ai_service = AIService("bench", openai_base_url=server.openai_url, openai_limiter=limiter("openai"))
+    messages = [{"role": "user", "content": BENCH_SENTENCES[0]}]
+    latencies: List[float] = []
+    failures = 0
+    lock = threading.Lock()
+
+    def worker(index: int) -> None:
+        nonlocal failures
+        for call in range(calls):
+            start = time.perf_counter()
+            if call % 2:
+                ok = ai_service.get_text_completion(messages, max_tokens=50) != COMPLETION_FALLBACK
+            else:
+                # Distinct texts so the comparison is not skewed by caching
+                ok = translator.translate(f"{BENCH_SENTENCES[call % len(BENCH_SENTENCES)]} ({index}-{call})") is not None
+            with lock:
+                latencies.append(time.perf_counter() - start)
+                failures += not ok
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(worker, range(workers)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "limited": limited,
+        "calls": workers * calls,
+        "failures": failures,
+        "elapsed_s": elapsed,
+        "calls_per_second": workers * calls / elapsed,
+        "latency": summarize(latencies),
+        "limiters": {"deepl": translator.limiter.stats(), "openai": ai_service.openai_limiter.stats()},
+        "provider_requests": server.stats(),
+    }
+
+
+def bench_hedge(server: Any, calls: int, hedged: bool) -> Dict[str, Any]:
+    """Translate distinct texts one at a time against a DeepL stub with a slow tail, with or without hedging"""
+    import_application()
+    from http_client import PooledSession
+    from ratelimit import RateLimiter
+    from translation import TranslationService, AIService
+
+    # Budgets far above what one caller can use, so only provider latency is measured
+    ai_service = AIService("bench", openai_base_url=server.openai_url, openai_limiter=RateLimiter("openai", 60_000))
+    translator = TranslationService(
+        "bench",
+        server.deepl_url,
+        session=PooledSession(),
+        limiter=RateLimiter("deepl", 60_000),
+        fallback=ai_service.translate_text if hedged else None,
+    )
+    latencies: List[float] = []
+    failures = 0
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for call in range(calls):
+            start = time.perf_counter()
+            # Distinct texts so every call reaches the providers
+            failures += translator.translate(f"{BENCH_SENTENCES[call % len(BENCH_SENTENCES)]} ({call})") is None
+            latencies.append(time.perf_counter() - start)
+
+    result = {
+        "hedged": hedged,
+        "calls": calls,
+        "failures": failures,
+        "latency": summarize(latencies),
+        "provider_requests": server.stats(),
+    }
+    if translator.hedger is not None:
+        result["hedging"] = translator.hedger.stats()
+        translator.hedger.close()
+    translator.session.close()
+    return result
+
+
+async def http_json(host: str, port: int, method: str, path: str, payload: Optional[Dict[str, Any]] = None) -> Tuple[int, Dict[str, Any]]:
+    """Send one JSON request over a fresh connection, returning the status and decoded body"""
+    reader, writer = await asyncio.open_connection(host, port)
+    body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, data = response.partition(b"\r\n\r\n")
+    return int(head.split(b" ", 2)[1]), json.loads(data or b"{}")
+
+
+async def websocket_connect(host: str, port: int, path: str) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    """Open a WebSocket, returning the stream once the server has accepted the upgrade"""
+    from server import websocket_accept
+
+    key = base64.b64encode(os.urandom(16)).decode("ascii")
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(
+        f"GET {path} HTTP/1.1\r\nHost: {host}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+        f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n".encode("latin-1")
+    )
+    head = await reader.readuntil(b"\r\n\r\n")
+    if not head.startswith(b"HTTP/1.1 101") or websocket_accept(key).encode("ascii") not in head:
+        writer.close()
+        raise RuntimeError(f"WebSocket upgrade refused: {head.splitlines()[0].decode('latin-1')}")
+    return reader, writer
+
+
+async def load_session(
+    host: str, port: int, index: int, turns: int, think_time: float, results: Dict[str, Any]
+) -> None:
+    """One simulated learner: create a session, then hold a WebSocket conversation with think time between turns"""
+    from server import WS_CLOSE, WS_TEXT, read_websocket_message, websocket_frame
+
+    status, session = await http_json(host, port, "POST", "/sessions")
+    if status != 200:
+        results["errors"].append(session.get("error", status))
+        return
+    reader, writer = await websocket_connect(host, port, f"/sessions/{session['session_id']}/ws")
+    rng = np.random.default_rng(index)
+    try:
+        for turn in range(turns):
+            # Spread sessions out instead of having every one speak at the same instant
+            await asyncio.sleep(rng.exponential(think_time))
+            text = f"{BENCH_SENTENCES[(index + turn) % len(BENCH_SENTENCES)]} ({index}.{turn})"
+            start = time.perf_counter()
+            first_token = None
+            writer.write(websocket_frame(WS_TEXT, json.dumps({"type": "turn", "text": text}).encode("utf-8"), mask=True))
+            await writer.drain()
+            while True:
+                _, data = await read_websocket_message(reader, writer, mask=True)
+                message = json.loads(data)
+                if message["type"] == "token" and first_token is None:
+                    first_token = time.perf_counter() - start
+                elif message["type"] == "done":
+                    results["turns"].append(time.perf_counter() - start)
+                    results["first_token"].append(first_token or 0.0)
+                    break
+                elif message["type"] == "error":
+                    results["errors"].append(message["message"])
+                    break
+        writer.write(websocket_frame(WS_CLOSE, struct.pack("!H", 1000), mask=True))
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def run_load(host: str, port: int, sessions: int, turns: int, think_time: float, ramp: float) -> Dict[str, Any]:
+    """Run the simulated sessions against a server, returning latencies and the server's CPU time used"""
+    results: Dict[str, Any] = {"turns": [], "first_token": [], "errors": []}
+    # One untimed turn lets the server's rate limiters learn the stubs' advertised limits first
+    _, session = await http_json(host, port, "POST", "/sessions")
+    await http_json(host, port, "POST", f"/sessions/{session['session_id']}/turns", {"text": BENCH_SENTENCES[0]})
+    await http_json(host, port, "DELETE", f"/sessions/{session['session_id']}")
+    _, before = await http_json(host, port, "GET", "/stats")
+    start = time.perf_counter()
+
+    async def staggered(index: int) -> None:
+        await asyncio.sleep(ramp * index / sessions)
+        await load_session(host, port, index, turns, think_time, results)
+
+    outcomes = await asyncio.gather(*(staggered(index) for index in range(sessions)), return_exceptions=True)
+    results["errors"] += [repr(outcome) for outcome in outcomes if isinstance(outcome, BaseException)]
+    results["elapsed_s"] = time.perf_counter() - start
+    _, after = await http_json(host, port, "GET", "/stats")
+    results["server_cpu_s"] = after["cpu_seconds"] - before["cpu_seconds"]
+    results["server_stats"] = after
+    return results
+
+
+def bench_server(
+    server: Any, sessions: int, turns: int, think_time: float, ramp: float, workers: int
+) -> Dict[str, Any]:
+    """Start server.py against the provider stubs and drive many concurrent WebSocket sessions through it"""
+    env_dir = stub_env_dir()
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            os.path.join(PROJECT_DIR, "server.py"),
+            "--port", "0",
+            "--workers", str(workers),
+            "--max-sessions", str(sessions),
+            "--deepl-url", server.deepl_url,
+            "--openai-url", server.openai_url,
+            "--no-cache",
+        ],
+        env=child_env(env_dir),
+        cwd=env_dir,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+    try:
+        line = process.stdout.readline()
+        if "Listening on" not in line:
+            raise RuntimeError(f"Server did not start: {line.strip()}")
+        host, port = line.strip().rsplit("/", 1)[1].rsplit(":", 1)
+        # Keep reading the server's output so a chatty provider error cannot fill the pipe and stall it
+        threading.Thread(target=process.stdout.read, daemon=True).start()
+        results = asyncio.run(run_load(host, int(port), sessions, turns, think_time, ramp))
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+    # How many sessions with this pace of turns one fully busy core could carry
+    cores_used = results["server_cpu_s"] / results["elapsed_s"]
+    stats = results["server_stats"]
+    return {
+        "sessions": sessions,
+        "turns_per_session": turns,
+        "think_time_s": think_time,
+        "completed_turns": len(results["turns"]),
+        "errors": len(results["errors"]),
+        "error_samples": results["errors"][:5],
+        "elapsed_s": results["elapsed_s"],
+        "server_cpu_s": results["server_cpu_s"],
+        "server_cores_used": cores_used,
+        "sessions_per_core": sessions / cores_used if cores_used else None,
+        "turns_per_cpu_second": len(results["turns"]) / results["server_cpu_s"] if results["server_cpu_s"] else None,
+        "turn_latency": summarize(results["turns"]),
+        "time_to_first_token": summarize(results["first_token"]),
+        "rejected": stats["rejected"],
+        "rate_limiters": stats["rate_limiters"],
+        "provider_requests": server.stats(),
+    }
+
+
+def bench_phrases(glossary: Optional[str], entries: int, lookups: int) -> Dict[str, Any]:
+    """Build a phrase index and time lookups of exact phrases, loosely typed variants and misses"""
+    import_application()
+    from phrases import PhraseTable, build_index, read_glossary
+
+    if glossary:
+        pairs = list(read_glossary(glossary))
+    else:
+        pairs = [
+            (f"{BENCH_SENTENCES[index % len(BENCH_SENTENCES)]} ({index})", f"Translation {index}") for index in range(entries)
+        ]
+    index_dir = tempfile.mkdtemp(prefix="sla_bench_phrases_")
+    path = os.path.join(index_dir, "phrases.idx")
+    build = build_index(pairs, path)
+
+    start = time.perf_counter()
+    table = PhraseTable(path)
+    open_ms = 1000 * (time.perf_counter() - start)
+
+    def timed_lookups(texts: List[str]) -> Dict[str, float]:
+        samples = []
+        for text in texts:
+            start = time.perf_counter()
+            table.lookup(text)
+            samples.append(time.perf_counter() - start)
+        return {
+            key.replace("_ms", "_us"): value if key == "count" else 1000 * value for key, value in summarize(samples).items()
+        }
+
+    phrases = [pairs[index % len(pairs)][0] for index in range(lookups)]
+    # Lower-case, unaccented and unpunctuated, as learners often type
+    loose = ["".join(c for c in unicodedata.normalize("NFKD", text.lower()) if c.isalnum() or c == " ") for text in phrases]
+    result = {
+        "build": build,
+        "open_ms": open_ms,
+        "exact": timed_lookups(phrases),
+        "loose": timed_lookups(loose),
+        "miss": timed_lookups([f"{text} y algo más" for text in phrases]),
+        "stats": table.stats(),
+    }
+    table.close()
+    os.unlink(path)
+    os.rmdir(index_dir)
+    return result
+
+
+def synthetic_corpus(size: int, seed: int = 0) -> List[str]:
+    """Sentences of pseudo-Spanish words with a Zipf-like word distribution, so n-gram frequencies are skewed"""
+    rng = np.random.default_rng(seed)
+    vocabulary = ["".join(rng.choice(SYLLABLES, rng.integers(1, 5))) for _ in range(20_000)]
+    weights = 1 / np.arange(1, len(vocabulary) + 1)
+    words = rng.choice(len(vocabulary), size=(size, 14), p=weights / weights.sum())
+    lengths = rng.integers(6, 15, size)
+    return [" ".join(vocabulary[word] for word in row[:length]).capitalize() + "." for row, length in zip(words, lengths)]
+
+
+def near_duplicate(sentence: str, rng: Any) -> str:
+    """Change one word and drop accents, case and punctuation, as a learner resubmitting a sentence might"""
+    words = sentence.split()
+    words[int(rng.integers(len(words)))] = "".join(rng.choice(SYLLABLES, 2))
+    text = unicodedata.normalize("NFKD", " ".join(words).lower())
+    return "".join(c for c in text if c.isalnum() or c == " ")
+
+
+def bench_memory(size: int, lookups: int) -> Dict[str, Any]:
+    """Fill a translation memory with synthetic pairs and time near-duplicate and novel lookups"""
+    from translation_memory import TranslationMemory
+
+    corpus = synthetic_corpus(size)
+    memory = TranslationMemory()
+    start = time.perf_counter()
+    memory.load((sentence, f"Translation {index}") for index, sentence in enumerate(corpus))
+    build_s = time.perf_counter() - start
+
+    rng = np.random.default_rng(1)
+    originals = [corpus[index] for index in rng.integers(size, size=lookups)]
+    queries = [near_duplicate(sentence, rng) for sentence in originals]
+    novel = synthetic_corpus(lookups, seed=2)
+
+    def timed_lookups(texts: List[str]) -> Tuple[Dict[str, float], List[Any]]:
+        samples, matches = [], []
+        for text in texts:
+            start = time.perf_counter()
+            matches.append(memory.lookup(text))
+            samples.append(time.perf_counter() - start)
+        return summarize(samples), matches
+
+    near_latency, near_matches = timed_lookups(queries)
+    novel_latency, novel_matches = timed_lookups(novel)
+    found = sum(match is not None and match.source == original for match, original in zip(near_matches, originals))
+    return {
+        "entries": size,
+        "build_s": build_s,
+        "near_duplicate": {**near_latency, "recall": found / lookups},
+        # Novel sentences may still be near a stored one by chance; these are not errors as such
+        "novel": {**novel_latency, "match_rate": sum(match is not None for match in novel_matches) / lookups},
+        "stats": memory.stats(),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Spanish Learning Assistant benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    upload_parser = subparsers.add_parser("upload", help="Compare audio upload encodings")
+    upload_parser.add_argument("--wav", help="WAV fixture to encode (default: synthetic speech)")
+    upload_parser.add_argument("--seconds", type=float, default=10, help="Length of the synthetic fixture")
+    upload_parser.add_argument("--repeat", type=int, default=5)
+    upload_parser.add_argument("--transcribe", action="store_true", help="Also time real transcription requests")
+
+    startup_parser = subparsers.add_parser("startup", help="Measure cold import time and time-to-first-prompt")
+    startup_parser.add_argument("--repeat", type=int, default=5)
+    startup_parser.add_argument("--max-import-ms", type=float, help="Fail if the median import time exceeds this")
+    startup_parser.add_argument("--max-prompt-ms", type=float, help="Fail if the median time-to-first-prompt exceeds this")
+
+    e2e_parser = subparsers.add_parser("e2e", help="Measure end-to-end turn latency against local provider stubs")
+    e2e_parser.add_argument("--scenario", choices=SCENARIOS, default="conversation")
+    e2e_parser.add_argument("--sessions", type=int, default=1, help="Concurrent sessions")
+    e2e_parser.add_argument("--turns", type=int, default=5, help="Turns per session")
+    e2e_parser.add_argument("--wav", help="Speech fixture for voice scenarios (default: synthetic speech)")
+    e2e_parser.add_argument("--seconds", type=float, default=3, help="Length of the synthetic fixture")
+    e2e_parser.add_argument("--realtime", action="store_true", help="Record and play audio at real-time speed")
+    e2e_parser.add_argument("--latency", type=float, default=0.05, help="Mean provider latency in seconds")
+    e2e_parser.add_argument("--jitter", type=float, default=0.01, help="Standard deviation of provider latency")
+    e2e_parser.add_argument("--error-rate", type=float, default=0.0, help="Share of provider requests that fail with 503")
+    e2e_parser.add_argument("--no-cache", action="store_true", help="Run without the translation, explanation and audio caches")
+    e2e_parser.add_argument("--reaction-time", type=float, default=0.0, help="Seconds taken to confirm a transcription")
+    e2e_parser.add_argument("--reject-rate", type=float, default=0.0, help="Share of voice transcriptions rejected")
+    e2e_parser.add_argument("--no-speculation", action="store_true", help="Translate only once a transcription is confirmed")
+    e2e_parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    e2e_parser.add_argument("--profile", metavar="PATH", help="Also write per-stage timing spans to PATH")
+
+    rate_parser = subparsers.add_parser("ratelimit", help="Compare throughput against a throttling stub with and without rate limiting")
+    rate_parser.add_argument("--limit-rps", type=float, default=5, help="Requests per second each stub provider allows")
+    rate_parser.add_argument("--workers", type=int, default=8)
+    rate_parser.add_argument("--calls", type=int, default=10, help="Calls per worker")
+
+    hedge_parser = subparsers.add_parser("hedge", help="Compare translation tail latency with and without the OpenAI fallback")
+    hedge_parser.add_argument("--calls", type=int, default=200)
+    hedge_parser.add_argument("--latency", type=float, default=0.05, help="Mean DeepL stub latency in seconds")
+    hedge_parser.add_argument("--tail-rate", type=float, default=0.05, help="Share of DeepL requests that are slow")
+    hedge_parser.add_argument("--tail-latency", type=float, default=1.0, help="Extra seconds added to slow DeepL requests")
+    hedge_parser.add_argument("--error-rate", type=float, default=0.0, help="Share of DeepL requests that fail with 503")
+
+    phrases_parser = subparsers.add_parser("phrases", help="Measure phrase index build and lookup cost")
+    phrases_parser.add_argument("--glossary", help="TSV glossary to index (default: synthetic phrases)")
+    phrases_parser.add_argument("--entries", type=int, default=100_000, help="Synthetic phrases to index")
+    phrases_parser.add_argument("--lookups", type=int, default=20_000, help="Lookups timed per case")
+
+    memory_parser = subparsers.add_parser("memory", help="Measure translation memory lookup latency at several sizes")
+    memory_parser.add_argument("--sizes", type=int, nargs="+", default=MEMORY_SIZES, help="Stored pairs per run")
+    memory_parser.add_argument("--lookups", type=int, default=1000, help="Lookups timed per case")
+
+    server_parser = subparsers.add_parser("server", help="Load test server.py with many concurrent sessions against local provider stubs")
+    server_parser.add_argument("--sessions", type=int, default=200, help="Concurrent sessions")
+    server_parser.add_argument("--turns", type=int, default=5, help="Conversation turns per session")
+    server_parser.add_argument("--think-time", type=float, default=2.0, help="Mean seconds a learner waits between turns")
+    server_parser.add_argument("--ramp", type=float, default=2.0, help="Seconds over which sessions are started")
+    server_parser.add_argument("--workers", type=int, default=64, help="Provider worker threads in the server")
+    server_parser.add_argument("--latency", type=float, default=0.05, help="Mean provider latency in seconds")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "upload":
+        if args.wav:
+            samples, sample_rate = load_wav(args.wav)
+        else:
+            samples, sample_rate = synthetic_speech(args.seconds), SAMPLE_RATE
+        for result in bench_upload(samples, sample_rate, args.transcribe, args.repeat):
+            print(json.dumps(result))
+    elif args.command == "startup":
+        result = bench_startup(args.repeat)
+        print(json.dumps(result))
+
+        failures = []
+        if result["heavy_modules"]:
+            failures.append(f"importing translation loaded {', '.join(result['heavy_modules'])}")
+        if args.max_import_ms is not None and result["import_ms"] > args.max_import_ms:
+            failures.append(f"import took {result['import_ms']:.1f} ms (limit {args.max_import_ms} ms)")
+        if args.max_prompt_ms is not None and result["first_prompt_ms"] > args.max_prompt_ms:
+            failures.append(f"first prompt took {result['first_prompt_ms']:.1f} ms (limit {args.max_prompt_ms} ms)")
+        for failure in failures:
+            print(f"Startup regression: {failure}", file=sys.stderr)
+        if failures:
+            sys.exit(1)
+    elif args.command == "e2e":
+        if args.profile:
+            profiling.enable(args.profile)
+        if args.wav:
+            fixture, sample_rate = load_wav(args.wav)
+            if sample_rate != SAMPLE_RATE:
+                fixture = resample(fixture, sample_rate, SAMPLE_RATE)
+        else:
+            fixture = synthetic_speech(args.seconds)
+
+        config = dict(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate)
+        with ProviderStubServer(StubConfig(**config), StubConfig(**config), StubConfig(**config)) as server:
+            result = bench_e2e(
+                args.scenario,
+                args.sessions,
+                args.turns,
+                server,
+                fixture,
+                1.0 if args.realtime else 0.0,
+                not args.no_cache,
+                args.reaction_time,
+                args.reject_rate,
+                not args.no_speculation,
+            )
+
+        from ratelimit import limiter_stats
+
+        result["rate_limiters"] = limiter_stats()
+        report = json.dumps(result, indent=2)
+        if args.output:
+            with open(args.output, "w") as output_file:
+                output_file.write(report + "\n")
+        else:
+            print(report)
+    elif args.command == "ratelimit":
+        for limited in (False, True):
+            config = dict(latency=0.02, jitter=0.005, requests_per_second=args.limit_rps, token_interval=0)
+            with ProviderStubServer(StubConfig(**config), StubConfig(**config), StubConfig(**config)) as server:
+                print(json.dumps(bench_rate_limit(server, args.workers, args.calls, limited)))
+    elif args.command == "phrases":
+        print(json.dumps(bench_phrases(args.glossary, args.entries, args.lookups)))
+    elif args.command == "memory":
+        for size in args.sizes:
+            print(json.dumps(bench_memory(size, args.lookups)))
+    elif args.command == "hedge":
+        for hedged in (False, True):
+            deepl = StubConfig(
+                latency=args.latency,
+                jitter=args.latency / 5,
+                tail_rate=args.tail_rate,
+                tail_latency=args.tail_latency,
+                error_rate=args.error_rate,
+            )
+            openai = StubConfig(latency=0.1, jitter=0.02, token_interval=0.002)
+            with ProviderStubServer(deepl, openai) as server:
+                print(json.dumps(bench_hedge(server, args.calls, hedged)))
+    elif args.command == "server":
+        # A generous advertised budget, so the server's limiters learn it and only latency and CPU are measured
+        config = dict(latency=args.latency, jitter=args.latency / 5, requests_per_second=10_000, tokens_per_minute=100_000_000)
+        with ProviderStubServer(StubConfig(**config), StubConfig(**config)) as server:
+            result = bench_server(server, args.sessions, args.turns, args.think_time, args.ramp, args.workers)
+        print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,527 @@
+from env import DEEPL_ACCESS_KEY, OPENAI_API_KEY
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+from typing import Optional, List, Dict, Any, Iterator, Tuple, TextIO, Set
+
+from cache import TranslationCache, ExplanationCache
+from phrases import PhraseTable
+from translation import TranslationService, AIService, DEEPL_MAX_TEXTS_PER_REQUEST, COMPLETION_FALLBACK
+
+# Constants
+BULK_BATCH_SIZE = DEEPL_MAX_TEXTS_PER_REQUEST  # Records per translate_many call, one DeepL request when they fit
+BULK_WORKERS = 4  # Batches translated concurrently
+EXPLAIN_WORKERS = 8  # Explanation requests in flight at once
+CHECKPOINT_EVERY = 1000  # Records written between checkpoints
+CHECKPOINT_SUFFIX = ".checkpoint.json"
+INPUT_FORMATS = ["csv", "jsonl", "txt"]
+OUTPUT_FORMATS = ["csv", "jsonl"]
+TEXT_FIELD = "text"  # Column (CSV) or key (JSONL) holding the Spanish text
+AUDIO_EXTENSIONS = [".wav", ".mp3"]
+TRANSCRIPT_SUFFIX = ".txt"  # lesson.wav is transcribed to lesson.wav.txt
+TRANSCRIBE_WORKERS = 8  # Uploads in flight at once
+MAX_UPLOAD_BYTES = 25 * 1024 * 1024  # Whisper rejects files above 25 MB
+SPLIT_SECONDS = 600  # Larger recordings are decoded and uploaded in pieces of this length
+
+
+def detect_format(path: str, formats: List[str], default: str) -> str:
+    """Pick a file format from the path's extension"""
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    if extension == "ndjson":
+        extension = "jsonl"
+    return extension if extension in formats else default
+
+
+def read_records(path: str, input_format: str, text_field: str = TEXT_FIELD) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Stream (text, record) pairs from a corpus file without loading it into memory
+
+    Args:
+        path: Corpus file
+        input_format: "csv", "jsonl" or "txt" (one text per line)
+        text_field: CSV column or JSONL key holding the text
+
+    Returns:
+        An iterator of the text to translate and the record it came from, which is copied to the output
+    """
+    with open(path, newline="" if input_format == "csv" else None, encoding="utf-8") as input_file:
+        if input_format == "csv":
+            reader = csv.DictReader(input_file)
+            if reader.fieldnames is None or text_field not in reader.fieldnames:
+                raise ValueError(f"{path} has no '{text_field}' column")
+            for row in reader:
+                yield row[text_field] or "", row
+        elif input_format == "jsonl":
+            for number, line in enumerate(input_file, 1):
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if text_field not in record:
+                    raise ValueError(f"{path}:{number} has no '{text_field}' key")
+                yield str(record[text_field] or ""), record
+        else:
+            for number, line in enumerate(input_file, 1):
+                text = line.rstrip("\r\n")
+                yield text, {"line": number, "text": text}
+
+
+class RecordWriter:
+    """Appends translated records to a CSV or JSONL file"""
+
+    def __init__(self, output_file: TextIO, output_format: str, write_header: bool):
+        self.output_file = output_file
+        self.output_format = output_format
+        self.write_header = write_header
+        self._csv_writer: Optional[csv.DictWriter] = None
+
+    def write(self, record: Dict[str, Any]) -> None:
+        if self.output_format == "jsonl":
+            self.output_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            return
+
+        if self._csv_writer is None:
+            # Columns come from the first record, so the input's column order is kept
+            self._csv_writer = csv.DictWriter(self.output_file, fieldnames=list(record), extrasaction="ignore")
+            if self.write_header:
+                self._csv_writer.writeheader()
+        self._csv_writer.writerow(record)
+
+    def sync(self) -> int:
+        """Flush everything written so far to disk and return the file size"""
+        self.output_file.flush()
+        os.fsync(self.output_file.fileno())
+        return os.fstat(self.output_file.fileno()).st_size
+
+
+class Checkpoint:
+    """Progress of a bulk run, saved atomically so a crashed run can resume where it stopped"""
+
+    def __init__(self, output_path: str):
+        self.path = output_path + CHECKPOINT_SUFFIX
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.path, encoding="utf-8") as checkpoint_file:
+                return json.load(checkpoint_file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"***   Ignoring unreadable checkpoint {self.path}: {e}")
+            return None
+
+    def save(self, state: Dict[str, Any]) -> None:
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as checkpoint_file:
+            json.dump(state, checkpoint_file)
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(temp_path, self.path)
+
+    def remove(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class BulkTranslator:
+    """Translates a corpus file headlessly with bounded concurrency, writing results in input order"""
+
+    def __init__(
+        self,
+        translator: TranslationService,
+        ai_service: Optional[AIService] = None,
+        batch_size: int = BULK_BATCH_SIZE,
+        workers: int = BULK_WORKERS,
+        explain_workers: int = EXPLAIN_WORKERS,
+        checkpoint_every: int = CHECKPOINT_EVERY,
+        source_lang: str = "ES",
+        target_lang: str = "EN",
+    ):
+        """
+        Args:
+            translator: Service used for every translation
+            ai_service: When given, an explanation is generated for each translated record
+            batch_size: Records per translate_many call
+            workers: Batches in flight at once; also bounds how far output can lag behind input
+            explain_workers: Explanation requests in flight at once
+            checkpoint_every: Records written between checkpoints
+        """
+        self.translator = translator
+        self.ai_service = ai_service
+        self.batch_size = batch_size
+        self.workers = workers
+        self.explain_workers = explain_workers
+        self.checkpoint_every = checkpoint_every
+        self.source_lang = source_lang
+        self.target_lang = target_lang
+
+    def run(
+        self,
+        input_path: str,
+        output_path: str,
+        input_format: Optional[str] = None,
+        output_format: Optional[str] = None,
+        text_field: str = TEXT_FIELD,
+    ) -> Dict[str, Any]:
+        """
+        Translate every record of input_path into output_path, resuming from a checkpoint if one exists
+
+        Returns:
+            Throughput report for this run
+        """
+        input_format = input_format or detect_format(input_path, INPUT_FORMATS, "txt")
+        output_format = output_format or detect_format(output_path, OUTPUT_FORMATS, "jsonl")
+        checkpoint = Checkpoint(output_path)
+        input_size = os.path.getsize(input_path)
+
+        state = checkpoint.load()
+        if state is not None and (state.get("input") != os.path.abspath(input_path) or state.get("input_bytes") != input_size):
+            print(f"***   Checkpoint {checkpoint.path} belongs to a different input; starting over")
+            state = None
+
+        skip = state["records_done"] if state else 0
+        if state:
+            # Drop anything written after the last checkpoint; those records are translated again
+            with open(output_path, "r+b") as output_file:
+                output_file.truncate(state["output_bytes"])
+            print(f"***   Resuming after {skip} records")
+
+        counters = {"records": 0, "translated": 0, "failed": 0, "explained": 0, "explanations_failed": 0}
+        deepl_before = self.translator.session.stats()["requests"]
+        explain_cache = self.ai_service.explanation_cache if self.ai_service is not None else None
+        explain_hits_before = explain_cache.hits if explain_cache is not None else 0
+
+        start = time.perf_counter()
+        records_done = skip
+        output_bytes = state["output_bytes"] if state else 0
+
+        def save_checkpoint(complete: bool = False) -> None:
+            checkpoint.save({
+                "input": os.path.abspath(input_path),
+                "input_bytes": input_size,
+                "records_done": records_done,
+                "output_bytes": output_bytes,
+                "complete": complete,
+            })
+
+        mode = "a" if state else "w"
+        with open(output_path, mode, newline="" if output_format == "csv" else None, encoding="utf-8") as output_file, \
+                ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bulk") as batch_pool, \
+                ThreadPoolExecutor(max_workers=self.explain_workers, thread_name_prefix="explain") as explain_pool:
+            writer = RecordWriter(output_file, output_format, write_header=not skip)
+            records = islice(read_records(input_path, input_format, text_field), skip, None)
+            in_flight: "deque[Future]" = deque()
+            last_checkpoint = records_done
+
+            try:
+                for batch in self._batches(records):
+                    in_flight.append(batch_pool.submit(self._process_batch, batch, explain_pool))
+                    # Results are written strictly in submission order, so the queue of futures bounds concurrency too
+                    while len(in_flight) >= self.workers * 2 or (in_flight and in_flight[0].done()):
+                        records_done += self._write_batch(writer, in_flight.popleft().result(), counters)
+
+                    if records_done - last_checkpoint >= self.checkpoint_every:
+                        output_bytes = writer.sync()
+                        save_checkpoint()
+                        last_checkpoint = records_done
+                        self._print_progress(records_done - skip, start)
+
+                while in_flight:
+                    records_done += self._write_batch(writer, in_flight.popleft().result(), counters)
+                output_bytes = writer.sync()
+            except BaseException:
+                # Keep whatever was written in order, then give up on the batches still running
+                for future in in_flight:
+                    future.cancel()
+                output_bytes = writer.sync()
+                save_checkpoint()
+                raise
+
+        checkpoint.remove()
+        elapsed = time.perf_counter() - start
+        deepl_requests = self.translator.session.stats()["requests"] - deepl_before
+        openai_requests = counters["explained"] + counters["explanations_failed"]
+        if explain_cache is not None:
+            openai_requests -= explain_cache.hits - explain_hits_before
+
+        return {
+            **counters,
+            "resumed_from": skip,
+            "elapsed_s": round(elapsed, 3),
+            "lines_per_s": round(counters["records"] / elapsed, 1) if elapsed else 0.0,
+            "deepl_requests": deepl_requests,
+            "openai_requests": openai_requests,
+            "requests_per_s": round((deepl_requests + openai_requests) / elapsed, 1) if elapsed else 0.0,
+        }
+
+    def _batches(self, records: Iterator[Tuple[str, Dict[str, Any]]]) -> Iterator[List[Tuple[str, Dict[str, Any]]]]:
+        while True:
+            batch = list(islice(records, self.batch_size))
+            if not batch:
+                return
+            yield batch
+
+    def _process_batch(
+        self, batch: List[Tuple[str, Dict[str, Any]]], explain_pool: ThreadPoolExecutor
+    ) -> List[Dict[str, Any]]:
+        """Translate one batch (and explain it when enabled), returning the output records in order"""
+        texts = [text for text, _ in batch]
+        translations = self.translator.translate_many(texts, self.source_lang, self.target_lang)
+
+        explanations: List[Optional[Future]] = [None] * len(batch)
+        if self.ai_service is not None:
+            for index, (text, translation) in enumerate(zip(texts, translations)):
+                if translation and text.strip():
+                    explanations[index] = explain_pool.submit(self.ai_service.get_explanation, text, translation)
+
+        results = []
+        for (text, record), translation, explanation in zip(batch, translations, explanations):
+            result = dict(record)
+            result["translation"] = translation
+            if self.ai_service is not None:
+                result["explanation"] = explanation.result() if explanation is not None else None
+            results.append(result)
+        return results
+
+    def _write_batch(self, writer: RecordWriter, results: List[Dict[str, Any]], counters: Dict[str, int]) -> int:
+        for result in results:
+            counters["records"] += 1
+            counters["translated" if result["translation"] is not None else "failed"] += 1
+            if result.get("explanation") == COMPLETION_FALLBACK:
+                result["explanation"] = None
+                counters["explanations_failed"] += 1
+            elif result.get("explanation") is not None:
+                counters["explained"] += 1
+            writer.write(result)
+        return len(results)
+
+    @staticmethod
+    def _print_progress(records: int, start: float) -> None:
+        elapsed = time.perf_counter() - start
+        print(f"***   {records} records translated ({records / elapsed:.1f}/s)", flush=True)
+
+
+def find_recordings(directory: str, extensions: List[str] = AUDIO_EXTENSIONS) -> Iterator[str]:
+    """Walk a directory tree, yielding audio files in a stable order"""
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in extensions:
+                yield os.path.join(root, name)
+
+
+def audio_duration(path: str) -> Optional[float]:
+    """Duration of a recording in seconds, read from its header, or None if it cannot be determined"""
+    from audio import load_soundfile
+
+    sf = load_soundfile()
+    try:
+        if sf is not None:
+            return sf.info(path).duration
+        if path.lower().endswith(".wav"):
+            import wave
+
+            with wave.open(path, "rb") as wav_file:
+                return wav_file.getnframes() / wav_file.getframerate()
+    except Exception:
+        pass
+    return None
+
+
+def write_text_atomic(path: str, text: str) -> None:
+    """Write a file so that it either exists complete or not at all"""
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as output_file:
+        output_file.write(text + "\n")
+    os.replace(temp_path, path)
+
+
+class BulkTranscriber:
+    """Transcribes every recording under a directory with a bounded pool, writing transcripts alongside them"""
+
+    def __init__(
+        self,
+        ai_service: AIService,
+        workers: int = TRANSCRIBE_WORKERS,
+        language: str = "es",
+        max_upload_bytes: int = MAX_UPLOAD_BYTES,
+        split_seconds: float = SPLIT_SECONDS,
+    ):
+        """
+        Args:
+            ai_service: Service used for every transcription
+            workers: Uploads in flight at once
+            language: Language of the recordings
+            max_upload_bytes: Files above this size are split before uploading
+            split_seconds: Length of each piece of a split file
+        """
+        self.ai_service = ai_service
+        self.workers = workers
+        self.language = language
+        self.max_upload_bytes = max_upload_bytes
+        self.split_seconds = split_seconds
+
+    def run(self, directory: str, overwrite: bool = False) -> Dict[str, Any]:
+        """
+        Transcribe every recording under directory that has no transcript yet
+
+        Returns:
+            Throughput report for this run
+        """
+        counters = {"files": 0, "transcribed": 0, "skipped": 0, "failed": 0}
+        audio_seconds = 0.0
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="transcribe") as pool:
+            in_flight: Set[Future] = set()
+
+            def collect(done: Set[Future]) -> None:
+                nonlocal audio_seconds
+                for future in done:
+                    path, seconds, ok = future.result()
+                    counters["transcribed" if ok else "failed"] += 1
+                    if ok and seconds:
+                        audio_seconds += seconds
+                    if not ok:
+                        print(f"***   Failed to transcribe {path}")
+
+            for path in find_recordings(directory):
+                counters["files"] += 1
+                # Transcripts are written atomically, so one that exists is complete
+                if not overwrite and os.path.exists(path + TRANSCRIPT_SUFFIX):
+                    counters["skipped"] += 1
+                    continue
+
+                # Only walk as far ahead as the pool can work on
+                if len(in_flight) >= self.workers * 2:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                in_flight.add(pool.submit(self._transcribe_file, path))
+
+            collect(wait(in_flight).done)
+
+        elapsed = time.perf_counter() - start
+        return {
+            **counters,
+            "audio_seconds": round(audio_seconds, 1),
+            "elapsed_s": round(elapsed, 3),
+            "audio_seconds_per_s": round(audio_seconds / elapsed, 2) if elapsed else 0.0,
+        }
+
+    def transcribe_file(self, path: str) -> Optional[str]:
+        """Transcribe one recording from disk, splitting it when it is too large to upload in one request"""
+        if os.path.getsize(path) <= self.max_upload_bytes:
+            return self.ai_service.transcribe_audio(path, self.language)
+        return self._transcribe_in_pieces(path)
+
+    def _transcribe_file(self, path: str) -> Tuple[str, Optional[float], bool]:
+        text = self.transcribe_file(path)
+        if text is None:
+            return path, None, False
+        write_text_atomic(path + TRANSCRIPT_SUFFIX, text.strip())
+        return path, audio_duration(path), True
+
+    def _transcribe_in_pieces(self, path: str) -> Optional[str]:
+        """Decode an oversized recording block by block, uploading each block as compressed 16 kHz audio"""
+        from audio import load_soundfile, prepare_for_upload
+
+        sf = load_soundfile()
+        if sf is None:
+            print(f"***   {path} is larger than {self.max_upload_bytes} bytes; splitting it requires soundfile")
+            return None
+
+        texts = []
+        try:
+            sample_rate = sf.info(path).samplerate
+            blocksize = int(self.split_seconds * sample_rate)
+            for block in sf.blocks(path, blocksize=blocksize, dtype="int16", always_2d=True):
+                upload = prepare_for_upload(block[:, 0], sample_rate)
+                text = self.ai_service.transcribe_audio(upload, self.language)
+                if text is None:
+                    return None
+                texts.append(text.strip())
+        except Exception as e:
+            print(f"***   Could not decode {path}: {e}")
+            return None
+        return " ".join(text for text in texts if text)
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    """Print a throughput report"""
+    print("***   Bulk run finished")
+    for key, value in report.items():
+        print(f"***   {key}: {value}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Headless bulk processing for the Spanish Learning Assistant")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    translate_parser = subparsers.add_parser("translate", help="Translate a CSV, JSONL or plain-text corpus")
+    translate_parser.add_argument("input", help="Corpus file (.csv, .jsonl, anything else is read as one text per line)")
+    translate_parser.add_argument("output", help="Output file (.csv, otherwise JSONL); resumed if a checkpoint exists")
+    translate_parser.add_argument("--input-format", choices=INPUT_FORMATS)
+    translate_parser.add_argument("--output-format", choices=OUTPUT_FORMATS)
+    translate_parser.add_argument("--field", default=TEXT_FIELD, help="CSV column or JSONL key holding the text")
+    translate_parser.add_argument("--explain", action="store_true", help="Also generate a grammar explanation per record")
+    translate_parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE)
+    translate_parser.add_argument("--workers", type=int, default=BULK_WORKERS)
+    translate_parser.add_argument("--explain-workers", type=int, default=EXPLAIN_WORKERS)
+    translate_parser.add_argument("--checkpoint-every", type=int, default=CHECKPOINT_EVERY)
+    translate_parser.add_argument("--source-lang", default="ES")
+    translate_parser.add_argument("--target-lang", default="EN")
+    translate_parser.add_argument("--report", help="Also write the throughput report to this JSON file")
+
+    transcribe_parser = subparsers.add_parser("transcribe", help="Transcribe every WAV/MP3 recording under a directory")
+    transcribe_parser.add_argument("directory")
+    transcribe_parser.add_argument("--workers", type=int, default=TRANSCRIBE_WORKERS)
+    transcribe_parser.add_argument("--language", default="es")
+    transcribe_parser.add_argument("--overwrite", action="store_true", help="Transcribe files that already have a transcript")
+    transcribe_parser.add_argument("--report", help="Also write the throughput report to this JSON file")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "translate":
+        translator = TranslationService(DEEPL_ACCESS_KEY, cache=TranslationCache(), phrases=PhraseTable.open_default())
+        ai_service = AIService(OPENAI_API_KEY, explanation_cache=ExplanationCache()) if args.explain else None
+        bulk = BulkTranslator(
+            translator,
+            ai_service,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            explain_workers=args.explain_workers,
+            checkpoint_every=args.checkpoint_every,
+            source_lang=args.source_lang,
+            target_lang=args.target_lang,
+        )
+        try:
+            report = bulk.run(args.input, args.output, args.input_format, args.output_format, args.field)
+        except KeyboardInterrupt:
+            print("\n***   Interrupted; run the same command again to resume")
+            sys.exit(130)
+        except ValueError as e:
+            print(f"***   {e}")
+            sys.exit(2)
+    elif args.command == "transcribe":
+        bulk = BulkTranscriber(AIService(OPENAI_API_KEY), workers=args.workers, language=args.language)
+        try:
+            report = bulk.run(args.directory, args.overwrite)
+        except KeyboardInterrupt:
+            print("\n***   Interrupted; run the same command again to continue with the remaining files")
+            sys.exit(130)
+
+    print_report(report)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as report_file:
+            json.dump(report, report_file, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
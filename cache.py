@@ -0,0 +1,490 @@
+import hashlib
+import json
+import os
+import tempfile
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any, Tuple, Iterable, Iterator
+
+# Constants
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "spanish_learning_assistant")
+TRANSLATION_CACHE_PATH = os.path.join(CACHE_DIR, "translations.sqlite3")
+TRANSLATION_CACHE_MAX_ENTRIES = 200_000  # Rows kept on disk before the least recently used are evicted
+TRANSLATION_CACHE_TTL = 90 * 24 * 3600  # Seconds before a cached translation is considered stale
+MEMORY_CACHE_SIZE = 4096  # Entries kept in the in-memory LRU layer
+EVICTION_INTERVAL = 1000  # Writes between eviction passes
+EXPLANATION_CACHE_PATH = os.path.join(CACHE_DIR, "explanations.sqlite3")
+EXPLANATION_CACHE_MAX_BYTES = 64 * 1024 * 1024  # Compressed bytes kept on disk before the least recently used are evicted
+COMPRESSION_LEVEL = 6
+AUDIO_CACHE_DIR = os.path.join(CACHE_DIR, "audio")
+AUDIO_CACHE_MAX_BYTES = 256 * 1024 * 1024  # Synthesized audio kept on disk before the least recently used is evicted
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text for use in a cache key (unicode form and whitespace, case is kept)"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def prompt_hash(prompt: str) -> str:
+    """Short stable hash of a prompt, so that editing the prompt invalidates entries built with it"""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+class TranslationCache:
+    """Disk-backed translation cache with an in-memory LRU front layer"""
+
+    def __init__(
+        self,
+        path: str = TRANSLATION_CACHE_PATH,
+        max_entries: int = TRANSLATION_CACHE_MAX_ENTRIES,
+        ttl: Optional[float] = TRANSLATION_CACHE_TTL,
+        memory_size: int = MEMORY_CACHE_SIZE,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.memory_size = memory_size
+
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+
+        self._memory: "OrderedDict[Tuple[str, str, str], Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_eviction = 0
+        # Memory hits never reach SQLite; their last use is written back before eviction and on close
+        self._touched: Dict[Tuple[str, str, str], float] = {}
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS translations (
+                text TEXT NOT NULL,
+                source_lang TEXT NOT NULL,
+                target_lang TEXT NOT NULL,
+                translation TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (text, source_lang, target_lang)
+            )
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS translations_last_used ON translations (last_used)")
+        self._db.commit()
+        self.evict()
+
+    @staticmethod
+    def make_key(text: str, source_lang: str, target_lang: str) -> Tuple[str, str, str]:
+        """Build the normalized cache key for a translation request"""
+        return normalize_text(text), source_lang.upper(), target_lang.upper()
+
+    def get(self, text: str, source_lang: str = "ES", target_lang: str = "EN") -> Optional[str]:
+        """Return the cached translation for text, or None on a miss"""
+        return self.get_many([text], source_lang, target_lang).get(text)
+
+    def get_many(self, texts: List[str], source_lang: str = "ES", target_lang: str = "EN") -> Dict[str, str]:
+        """
+        Look up several texts at once
+
+        Args:
+            texts: The source texts
+            source_lang: Source language code
+            target_lang: Target language code
+
+        Returns:
+            Mapping from each text that was found to its cached translation
+        """
+        now = time.time()
+        found: Dict[str, str] = {}
+        disk_lookups: Dict[Tuple[str, str, str], List[str]] = {}
+
+        with self._lock:
+            for text in texts:
+                key = self.make_key(text, source_lang, target_lang)
+                entry = self._memory.get(key)
+                if entry is not None and not self._is_expired(entry[1], now):
+                    self._memory.move_to_end(key)
+                    self._touched[key] = now
+                    found[text] = entry[0]
+                    self.memory_hits += 1
+                else:
+                    if entry is not None:
+                        del self._memory[key]
+                    disk_lookups.setdefault(key, []).append(text)
+
+            if disk_lookups:
+                for key, (translation, created_at) in self._load(list(disk_lookups), now).items():
+                    self._remember(key, translation, created_at)
+                    for text in disk_lookups.pop(key):
+                        found[text] = translation
+                        self.disk_hits += 1
+
+            self.hits += len(texts) - sum(len(pending) for pending in disk_lookups.values())
+            self.misses += sum(len(pending) for pending in disk_lookups.values())
+
+        return found
+
+    def put(self, text: str, translation: str, source_lang: str = "ES", target_lang: str = "EN") -> None:
+        """Store a single translation"""
+        self.put_many({text: translation}, source_lang, target_lang)
+
+    def put_many(self, translations: Dict[str, str], source_lang: str = "ES", target_lang: str = "EN") -> None:
+        """Store several translations in one transaction"""
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, translation in translations.items():
+                key = self.make_key(text, source_lang, target_lang)
+                self._remember(key, translation, now)
+                rows.append((*key, translation, now, now))
+
+            self._db.executemany(
+                "INSERT OR REPLACE INTO translations "
+                "(text, source_lang, target_lang, translation, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._db.commit()
+
+            self._writes_since_eviction += len(rows)
+            if self._writes_since_eviction >= EVICTION_INTERVAL:
+                self._evict_locked(now)
+
+    def evict(self) -> None:
+        """Drop expired rows and trim the table to max_entries, least recently used first"""
+        with self._lock:
+            self._evict_locked(time.time())
+
+    def items(self, source_lang: str = "ES", target_lang: str = "EN") -> List[Tuple[str, str]]:
+        """Return every unexpired (text, translation) pair stored on disk for a language pair"""
+        oldest = time.time() - self.ttl if self.ttl is not None else 0.0
+        with self._lock:
+            return self._db.execute(
+                "SELECT text, translation FROM translations WHERE source_lang = ? AND target_lang = ? AND created_at >= ?",
+                (source_lang.upper(), target_lang.upper(), oldest),
+            ).fetchall()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters for the cache"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+    def close(self) -> None:
+        """Record recent memory hits and close the underlying database"""
+        with self._lock:
+            self._flush_touched()
+            self._db.close()
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        return self.ttl is not None and now - created_at > self.ttl
+
+    def _remember(self, key: Tuple[str, str, str], translation: str, created_at: float) -> None:
+        """Insert into the in-memory LRU layer, evicting the oldest entry when full"""
+        self._memory[key] = (translation, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _load(self, keys: List[Tuple[str, str, str]], now: float) -> Dict[Tuple[str, str, str], Tuple[str, float]]:
+        """Fetch fresh rows for keys from disk and mark them as used"""
+        loaded = {}
+        for key in keys:
+            row = self._db.execute(
+                "SELECT translation, created_at FROM translations "
+                "WHERE text = ? AND source_lang = ? AND target_lang = ?",
+                key,
+            ).fetchone()
+            if row is not None and not self._is_expired(row[1], now):
+                loaded[key] = (row[0], row[1])
+
+        if loaded:
+            self._db.executemany(
+                "UPDATE translations SET last_used = ? WHERE text = ? AND source_lang = ? AND target_lang = ?",
+                [(now, *key) for key in loaded],
+            )
+            self._db.commit()
+        return loaded
+
+    def _flush_touched(self) -> None:
+        """Write the last use of entries served from memory to disk, so eviction sees them as recent"""
+        if self._touched:
+            self._db.executemany(
+                "UPDATE translations SET last_used = MAX(last_used, ?) "
+                "WHERE text = ? AND source_lang = ? AND target_lang = ?",
+                [(used, *key) for key, used in self._touched.items()],
+            )
+            self._db.commit()
+            self._touched.clear()
+
+    def _evict_locked(self, now: float) -> None:
+        self._flush_touched()
+        if self.ttl is not None:
+            self._db.execute("DELETE FROM translations WHERE created_at < ?", (now - self.ttl,))
+        self._db.execute(
+            "DELETE FROM translations WHERE rowid IN ("
+            "SELECT rowid FROM translations ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+        self._db.commit()
+        self._writes_since_eviction = 0
+
+
+class ExplanationCache:
+    """Compressed on-disk cache of grammar explanations with a byte budget"""
+
+    def __init__(self, path: str = EXPLANATION_CACHE_PATH, max_bytes: int = EXPLANATION_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS explanations (
+                key TEXT PRIMARY KEY,
+                explanation BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS explanations_last_used ON explanations (last_used)")
+        self._db.commit()
+        self._total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM explanations").fetchone()[0]
+        self.evict()
+
+    @staticmethod
+    def make_key(spanish: str, translation: str, model: str, prompt: str) -> str:
+        """Hash the normalized sentence, its translation, the model and the prompt into a cache key"""
+        parts = [
+            normalize_text(spanish).casefold(),
+            normalize_text(translation).casefold(),
+            model,
+            prompt_hash(prompt),
+        ]
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, spanish: str, translation: str, model: str, prompt: str) -> Optional[str]:
+        """Return the cached explanation, or None on a miss"""
+        key = self.make_key(spanish, translation, model, prompt)
+        with self._lock:
+            row = self._db.execute("SELECT explanation FROM explanations WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute("UPDATE explanations SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def put(self, spanish: str, translation: str, model: str, prompt: str, explanation: str) -> None:
+        """Store an explanation, evicting the least recently used entries if over the byte budget"""
+        key = self.make_key(spanish, translation, model, prompt)
+        blob = zlib.compress(explanation.encode("utf-8"), COMPRESSION_LEVEL)
+        with self._lock:
+            row = self._db.execute("SELECT size FROM explanations WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._total_bytes -= row[0]
+            self._db.execute(
+                "INSERT OR REPLACE INTO explanations (key, explanation, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, blob, len(blob), time.time()),
+            )
+            self._total_bytes += len(blob)
+            self._db.commit()
+            if self._total_bytes > self.max_bytes:
+                self._evict_locked()
+
+    def evict(self) -> None:
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        with self._lock:
+            self._evict_locked()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the compressed size on disk"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "bytes": self._total_bytes,
+        }
+
+    def close(self) -> None:
+        """Close the underlying database"""
+        with self._lock:
+            self._db.close()
+
+    def _evict_locked(self) -> None:
+        if self._total_bytes <= self.max_bytes:
+            return
+        excess = self._total_bytes - self.max_bytes
+        freed = 0
+        doomed = []
+        for key, size in self._db.execute("SELECT key, size FROM explanations ORDER BY last_used"):
+            doomed.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._db.executemany("DELETE FROM explanations WHERE key = ?", doomed)
+        self._db.commit()
+        self._total_bytes -= freed
+
+
+class AudioCache:
+    """Content-addressed store of synthesized speech with a byte budget"""
+
+    def __init__(self, directory: str = AUDIO_CACHE_DIR, max_bytes: int = AUDIO_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._total_bytes = sum(size for _, size, _ in self._entries())
+        self.evict()
+
+    @staticmethod
+    def make_key(text: str, **params: Any) -> str:
+        """Hash the text together with every synthesis parameter that affects the audio"""
+        payload = json.dumps({"text": normalize_text(text), **params}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path_for(self, key: str, extension: str) -> str:
+        return os.path.join(self.directory, f"{key}.{extension}")
+
+    def contains(self, path: str) -> bool:
+        """True if path is a file owned by this cache (and so must not be deleted by callers)"""
+        return os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.directory)
+
+    def get(self, key: str, extension: str) -> Optional[str]:
+        """Return the path of the cached audio, or None on a miss"""
+        path = self.path_for(key, extension)
+        try:
+            # The modification time doubles as the last-used time for eviction
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def put(self, key: str, extension: str, chunks: Iterable[bytes]) -> str:
+        """
+        Write audio chunks to the cache atomically
+
+        The data is streamed to a temporary file in the cache directory and renamed into
+        place, so a crash or a concurrent reader never sees a partial file.
+
+        Returns:
+            Path of the cached audio
+        """
+        path = self.path_for(key, extension)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                for chunk in chunks:
+                    temp_file.write(chunk)
+            self._commit(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        return path
+
+    def tee(self, key: str, extension: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        Yield chunks through while writing them to the cache
+
+        The entry is only committed if the stream is consumed to the end, so an
+        interrupted or failed synthesis never leaves a truncated clip behind.
+        """
+        path = self.path_for(key, extension)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        committed = False
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                for chunk in chunks:
+                    temp_file.write(chunk)
+                    yield chunk
+            self._commit(temp_path, path)
+            committed = True
+        finally:
+            if not committed:
+                os.unlink(temp_path)
+
+    def evict(self) -> None:
+        """Delete least recently used files until the cache fits in max_bytes"""
+        with self._lock:
+            self._evict_locked()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and bytes on disk"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "bytes": self._total_bytes,
+        }
+
+    def _commit(self, temp_path: str, path: str) -> None:
+        """Rename a finished temporary file into place and account for its size"""
+        size = os.path.getsize(temp_path)
+        with self._lock:
+            # Another synthesis of the same clip (or an earlier put) may already be there; count only the difference
+            try:
+                replaced = os.path.getsize(path)
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(temp_path, path)
+            self._total_bytes += size - replaced
+            if self._total_bytes > self.max_bytes:
+                self._evict_locked()
+
+    def _entries(self) -> List[Tuple[str, int, float]]:
+        """List (path, size, last used) for every completed file in the cache"""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith(".part"):
+                stat = entry.stat()
+                entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _evict_locked(self) -> None:
+        if self._total_bytes <= self.max_bytes:
+            return
+        entries = self._entries()
+        self._total_bytes = sum(size for _, size, _ in entries)
+        for path, size, _ in sorted(entries, key=lambda entry: entry[2]):
+            if self._total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._total_bytes -= size
@@ -0,0 +1,195 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, List, Dict, Callable, Tuple
+
+# Constants
+CONTEXT_TOKEN_BUDGET = 4000  # Upper bound on tokens sent as conversation context per request
+COMPACT_THRESHOLD = 0.75  # Start summarizing older turns once the context reaches this share of the budget
+KEEP_RECENT_MESSAGES = 6  # Most recent messages always sent verbatim (three user/assistant exchanges)
+WINDOW_SLACK = 0.25  # Share of the budget freed when the history window has to move, so it then stays put for a while
+MESSAGE_OVERHEAD_TOKENS = 4  # Per-message framing tokens added by the chat format
+CHARS_PER_TOKEN = 4  # Rough estimate used when tiktoken is not installed
+TOKENIZER_ENCODING = "o200k_base"  # Encoding used by the gpt-4o model family
+
+_encoding = None
+_encoding_loaded = False
+
+
+def count_tokens(text: str) -> int:
+    """Count the tokens in text, using tiktoken when available"""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        # tiktoken is optional and slow to import, so it is only loaded once a conversation needs it
+        try:
+            import tiktoken
+
+            _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        except Exception:
+            _encoding = None
+        _encoding_loaded = True
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def count_message_tokens(message: Dict[str, str]) -> int:
+    """Count the tokens a chat message costs, including framing overhead"""
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+class ConversationContext:
+    """Conversation history kept within a token budget by summarizing older turns in the background"""
+
+    def __init__(
+        self,
+        system_prompt: str,
+        summarize: Callable[[Optional[str], List[Dict[str, str]]], Optional[str]],
+        token_budget: int = CONTEXT_TOKEN_BUDGET,
+        keep_recent: int = KEEP_RECENT_MESSAGES,
+        executor: Optional[ThreadPoolExecutor] = None,
+    ):
+        """
+        Args:
+            system_prompt: Always sent first and never summarized
+            summarize: Called off the critical path with (previous summary, messages to fold in); returns the new summary or None on failure
+            token_budget: Maximum tokens returned by messages()
+            keep_recent: Number of most recent messages that are never summarized
+            executor: Where summaries are generated; shared between many contexts (e.g. server sessions)
+                so each does not start its own thread. A private single-thread executor by default.
+        """
+        self.system_message = {"role": "system", "content": system_prompt}
+        self.summarize = summarize
+        self.token_budget = token_budget
+        self.keep_recent = keep_recent
+
+        self.summary: Optional[str] = None
+        self._history: List[Dict[str, str]] = []
+        self._token_counts: List[int] = []
+        self._system_tokens = count_message_tokens(self.system_message)
+        self._summary_tokens = 0
+
+        self._lock = threading.Lock()
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="summarize")
+        self._pending: Optional[Future] = None
+        self._generation = 0  # Bumped by trim() so summaries of dropped messages are not applied
+        # First history message sent; it only moves forward, and in steps, so consecutive requests share a prefix
+        self._window_start = 0
+
+    def add(self, role: str, content: str) -> None:
+        """Append a message and start compacting older turns if the context is getting large"""
+        message = {"role": role, "content": content}
+        with self._lock:
+            self._history.append(message)
+            self._token_counts.append(count_message_tokens(message))
+            started = self._maybe_compact()
+        if started is not None:
+            # Registered outside the lock: a summary that has already finished runs the callback right here,
+            # and _apply_summary takes the lock itself
+            future, count, generation = started
+            future.add_done_callback(lambda done: self._apply_summary(done, count, generation))
+
+    def messages(self, new_messages: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, str]]:
+        """
+        Build the messages to send for the next request
+
+        Args:
+            new_messages: Messages for the request being built (e.g. the new user input), always included
+
+        Returns:
+            System prompt, running summary, recent history, then new_messages. Everything before new_messages
+            is byte-identical to the previous request plus its additions, so provider-side prompt caching applies.
+        """
+        new_messages = new_messages or []
+        with self._lock:
+            used = self._system_tokens + self._summary_tokens + sum(count_message_tokens(m) for m in new_messages)
+            # Keep sending history from the same message while it fits. Once it does not (e.g. a summary is still
+            # being generated), drop older turns until WINDOW_SLACK of the budget is free, rather than one message
+            # per request, which would change the prompt prefix on every turn.
+            start = min(self._window_start, len(self._history))
+            used += sum(self._token_counts[start:])
+            if used > self.token_budget:
+                while start < len(self._history) and used > self.token_budget * (1 - WINDOW_SLACK):
+                    used -= self._token_counts[start]
+                    start += 1
+            self._window_start = start
+
+            messages = [self.system_message]
+            if self.summary:
+                messages.append(self._summary_message())
+            return messages + self._history[start:] + new_messages
+
+    def token_count(self) -> int:
+        """Tokens currently held (system prompt, summary and unsummarized history)"""
+        with self._lock:
+            return self._system_tokens + self._summary_tokens + sum(self._token_counts)
+
+    def trim(self, max_tokens: int) -> int:
+        """
+        Drop the oldest unsummarized messages until at most max_tokens are held
+
+        A hard memory cap for when summaries cannot keep up (or keep failing). Returns the number of messages dropped.
+        """
+        with self._lock:
+            held = self._system_tokens + self._summary_tokens + sum(self._token_counts)
+            dropped = 0
+            while dropped < len(self._history) and held > max_tokens:
+                held -= self._token_counts[dropped]
+                dropped += 1
+            if dropped and self._pending is not None:
+                # A running summary covers messages that are about to disappear, so its result must be discarded
+                self._pending.cancel()
+                self._pending = None
+                self._generation += 1
+            del self._history[:dropped]
+            del self._token_counts[:dropped]
+            self._window_start = max(0, self._window_start - dropped)
+            return dropped
+
+    def close(self) -> None:
+        """Stop the background summarizer"""
+        if self._owns_executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        elif self._pending is not None:
+            self._pending.cancel()
+
+    def _summary_message(self) -> Dict[str, str]:
+        return {"role": "system", "content": f"Summary of the earlier conversation: {self.summary}"}
+
+    def _maybe_compact(self) -> Optional[Tuple[Future, int, int]]:
+        """
+        Summarize everything but the most recent messages once the threshold is crossed (lock held)
+
+        Returns:
+            The started summary with the message count and generation it covers, for the caller to pass to
+            _apply_summary once the lock is released, or None when no summary was started
+        """
+        if self._pending is not None and not self._pending.done():
+            return None
+        total = self._system_tokens + self._summary_tokens + sum(self._token_counts)
+        if total <= self.token_budget * COMPACT_THRESHOLD:
+            return None
+
+        count = len(self._history) - self.keep_recent
+        if count <= 0:
+            return None
+
+        older = list(self._history[:count])
+        self._pending = self._executor.submit(self.summarize, self.summary, older)
+        return self._pending, count, self._generation
+
+    def _apply_summary(self, future: Future, count: int, generation: int) -> None:
+        if future.cancelled() or future.exception() is not None:
+            return
+        summary = future.result()
+        if not summary:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            # Only the messages that were summarized are removed; newer ones were appended after them
+            del self._history[:count]
+            del self._token_counts[:count]
+            self._window_start = max(0, self._window_start - count)
+            self.summary = summary
+            self._summary_tokens = count_message_tokens(self._summary_message())
@@ -0,0 +1,170 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError, wait
+from typing import Optional, Dict, Any, Callable, TypeVar
+
+import profiling
+
+T = TypeVar("T")
+
+# Constants
+HEDGE_PERCENTILE = 95  # Hedge requests slower than this share of recent primary requests
+HEDGE_WINDOW = 200  # Recent primary latencies the percentile is learned from
+HEDGE_MIN_SAMPLES = 20  # Use HEDGE_INITIAL_DELAY until this many latencies have been seen
+HEDGE_INITIAL_DELAY = 1.0  # Seconds to wait before hedging while the percentile is still unknown
+HEDGE_MIN_DELAY = 0.05  # Never hedge sooner than this, so a fast provider is not doubled up on every jitter
+HEDGE_WORKERS = 8
+
+
+class LatencyTracker:
+    """Sliding window of recent latencies with a percentile estimate"""
+
+    def __init__(self, percentile: float = HEDGE_PERCENTILE, window: int = HEDGE_WINDOW):
+        self.percentile = percentile
+        self._samples: "deque[float]" = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def estimate(self) -> Optional[float]:
+        """Current percentile in seconds, or None before any sample"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * self.percentile / 100))
+        return samples[index]
+
+
+class Hedger:
+    """
+    Runs a primary call and, if it is slower than its learned latency percentile, races a fallback against it
+
+    The first good (non-None) answer wins. The losing fallback is told to stop through its cancel event;
+    a primary that is already running cannot be interrupted, so it finishes in the background and its
+    latency still trains the percentile.
+    """
+
+    def __init__(
+        self,
+        percentile: float = HEDGE_PERCENTILE,
+        window: int = HEDGE_WINDOW,
+        min_samples: int = HEDGE_MIN_SAMPLES,
+        initial_delay: float = HEDGE_INITIAL_DELAY,
+        min_delay: float = HEDGE_MIN_DELAY,
+        workers: int = HEDGE_WORKERS,
+    ):
+        self.latencies = LatencyTracker(percentile, window)
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hedge")
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.hedged = 0  # Fallback started because the primary was slow
+        self.rescued = 0  # Fallback started because the primary failed outright
+        self.primary_wins = 0
+        self.fallback_wins = 0
+        self.failures = 0
+
+    def hedge_delay(self) -> float:
+        """Seconds to give the primary before starting the fallback"""
+        estimate = self.latencies.estimate()
+        if estimate is None or len(self.latencies) < self.min_samples:
+            return self.initial_delay
+        return max(self.min_delay, estimate)
+
+    def run(self, primary: Callable[[], Optional[T]], fallback: Callable[[threading.Event], Optional[T]]) -> Optional[T]:
+        """
+        Return the first good result of primary or fallback
+
+        Args:
+            primary: The preferred call, e.g. a DeepL translation
+            fallback: Called with a cancel event it should check while working, set once the primary has won
+
+        Returns:
+            The winning result, or None if both calls failed
+        """
+        delay = self.hedge_delay()
+        primary_future = self._executor.submit(self._timed, primary)
+        self._increment("calls")
+
+        with profiling.span("hedge", delay_ms=round(1000 * delay, 3)) as span:
+            primary_done = True
+            try:
+                result = primary_future.result(timeout=delay)
+            except TimeoutError:
+                primary_done = False
+                span.set(hedged=True)
+                self._increment("hedged")
+            except Exception:
+                result = None
+
+            if primary_done:
+                if result is not None:
+                    self._increment("primary_wins")
+                    span.set(winner="primary")
+                    return result
+                # The primary failed outright, so the fallback is the only chance of an answer
+                span.set(rescued=True)
+                self._increment("rescued")
+
+            cancel = threading.Event()
+            fallback_future = self._executor.submit(fallback, cancel)
+            pending = {primary_future, fallback_future}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result() if future.exception() is None else None
+                    if result is None:
+                        continue
+                    if future is primary_future:
+                        cancel.set()
+                        self._increment("primary_wins")
+                        span.set(winner="primary")
+                    else:
+                        self._increment("fallback_wins")
+                        span.set(winner="fallback")
+                    return result
+
+            self._increment("failures")
+            span.set(winner=None)
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hedge and win counters"""
+        with self._lock:
+            started = self.hedged + self.rescued
+            return {
+                "calls": self.calls,
+                "hedged": self.hedged,
+                "rescued": self.rescued,
+                "hedge_rate": self.hedged / self.calls if self.calls else 0.0,
+                "primary_wins": self.primary_wins,
+                "fallback_wins": self.fallback_wins,
+                "fallback_win_rate": self.fallback_wins / started if started else 0.0,
+                "failures": self.failures,
+                "hedge_delay_ms": round(1000 * self.hedge_delay(), 3),
+            }
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _timed(self, primary: Callable[[], Optional[T]]) -> Optional[T]:
+        """Run the primary, learning its latency from successful calls (including ones that lost a race)"""
+        start = time.perf_counter()
+        result = primary()
+        if result is not None:
+            self.latencies.record(time.perf_counter() - start)
+        return result
+
+    def _increment(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
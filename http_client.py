@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional, Dict, Any, Tuple, Union, TYPE_CHECKING
+
+import requests
+from requests.adapters import HTTPAdapter
+
+if TYPE_CHECKING:
+    from ratelimit import RateLimiter
+
+# Constants
+POOL_CONNECTIONS = 4  # Number of distinct hosts to keep connection pools for
+POOL_MAXSIZE = 16  # Keep-alive connections kept per host
+CONNECT_TIMEOUT = 5  # Seconds to establish a connection
+READ_TIMEOUT = 30  # Seconds to wait for a response
+MAX_RETRIES = 4  # Retries after the first attempt
+BACKOFF_BASE = 0.25  # Seconds, doubled on every retry
+BACKOFF_MAX = 8.0  # Upper bound for a single computed backoff
+MAX_RETRY_AFTER = 60.0  # Longest Retry-After we are willing to wait before giving up
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")  # Safe to resend after a read timeout
+
+
+class PooledSession:
+    """Shared keep-alive HTTP session with retries and connection reuse counters"""
+
+    def __init__(
+        self,
+        pool_connections: int = POOL_CONNECTIONS,
+        pool_maxsize: int = POOL_MAXSIZE,
+        timeout: Union[float, Tuple[float, float]] = (CONNECT_TIMEOUT, READ_TIMEOUT),
+        max_retries: int = MAX_RETRIES,
+        backoff_base: float = BACKOFF_BASE,
+        backoff_max: float = BACKOFF_MAX,
+        max_retry_after: float = MAX_RETRY_AFTER,
+    ):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retry_after = max_retry_after
+
+        self.session = requests.Session()
+        self.session.headers["Connection"] = "keep-alive"
+        # Retries are handled here rather than by urllib3 so that we can add jitter and count them
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+
+        self._lock = threading.Lock()
+        self.requests_sent = 0
+        self.retries = 0
+
+    def post(self, url: str, limiter: Optional[RateLimiter] = None, **kwargs: Any) -> requests.Response:
+        """POST with pooling and retries"""
+        return self.request("POST", url, limiter, **kwargs)
+
+    def get(self, url: str, limiter: Optional[RateLimiter] = None, **kwargs: Any) -> requests.Response:
+        """GET with pooling and retries"""
+        return self.request("GET", url, limiter, **kwargs)
+
+    def request(self, method: str, url: str, limiter: Optional[RateLimiter] = None, **kwargs: Any) -> requests.Response:
+        """
+        Send a request, retrying transient failures
+
+        429 and 5xx responses and connection errors are retried with jittered exponential
+        backoff. A Retry-After header from the server takes precedence over the computed delay.
+        Read timeouts are only retried for idempotent methods: a timed out POST may already have
+        been processed (and billed), and each retry would wait out the full read timeout again.
+        With a limiter, every attempt waits for the provider's budget and reports the response back to it.
+
+        Returns:
+            The final response; the last connection error is re-raised if every attempt failed
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+
+        while True:
+            if limiter is not None:
+                limiter.acquire()
+            with self._lock:
+                self.requests_sent += 1
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.ReadTimeout:
+                if method.upper() not in IDEMPOTENT_METHODS or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+            else:
+                if limiter is not None:
+                    limiter.record_response(response.status_code, response.headers)
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    return response
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if retry_after is not None and retry_after > self.max_retry_after:
+                    return response
+                delay = retry_after if retry_after is not None else self._backoff(attempt)
+                response.close()
+
+            attempt += 1
+            with self._lock:
+                self.retries += 1
+            time.sleep(delay)
+
+    def stats(self) -> Dict[str, int]:
+        """Return request, retry and connection reuse counters"""
+        connections = 0
+        pooled_requests = 0
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+                pooled_requests += pool.num_requests
+        return {
+            "requests": self.requests_sent,
+            "retries": self.retries,
+            "connections_opened": connections,
+            "connections_reused": max(pooled_requests - connections, 0),
+        }
+
+    def close(self) -> None:
+        """Close every pooled connection"""
+        self.session.close()
+
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either in seconds or as an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+_shared_session: Optional[PooledSession] = None
+_shared_session_lock = threading.Lock()
+
+
+def get_session() -> PooledSession:
+    """Return the process-wide pooled session, creating it on first use"""
+    global _shared_session
+    with _shared_session_lock:
+        if _shared_session is None:
+            _shared_session = PooledSession()
+        return _shared_session
@@ -0,0 +1,286 @@
+import argparse
+import csv
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+import unicodedata
+from typing import Optional, List, Dict, Any, Iterable, Iterator, Tuple
+
+from cache import CACHE_DIR
+
+# Constants
+PHRASE_INDEX_PATH = os.path.join(CACHE_DIR, "phrases.idx")
+PHRASE_INDEX_MAGIC = b"SLAPHRS1"
+PHRASE_INDEX_VERSION = 2
+LOAD_FACTOR = 0.5  # Share of hash slots in use; lower means shorter probe sequences and a larger file
+FOLDED_KEY_PREFIX = b"\0"  # Marks accent-folded keys, so they never match an exact key in the same table
+COLLISION_EXAMPLES = 5  # Accent collisions listed in build statistics
+
+# Header: magic, version, slot count, entry count, source language, target language
+_HEADER = struct.Struct("<8sIII8s8s")
+# Slot: key hash and offset of the record (0 marks an empty slot, as no record starts inside the header)
+_SLOT = struct.Struct("<QQ")
+# Record: key and translation lengths in bytes, followed by both as UTF-8
+_RECORD = struct.Struct("<II")
+
+
+def phrase_key(text: str, fold_accents: bool = True) -> str:
+    """
+    Normalize text for phrase matching: case, punctuation and spacing are ignored, and accents unless fold_accents is False
+
+    "¿Cómo estás?", "como estas" and "Cómo  estás" all map to the same folded key. Ñ is a letter of
+    its own rather than an accented n, so it is kept: "año" and "ano" never share a key.
+    """
+    characters = []
+    for character in unicodedata.normalize("NFC", text.casefold()):
+        if character != "ñ":
+            character = unicodedata.normalize("NFKD" if fold_accents else "NFKC", character)
+        for part in character:
+            category = unicodedata.category(part)
+            if category == "Mn" and fold_accents:
+                continue  # Combining accent left over from decomposition
+            characters.append(" " if category[0] in "PZ" or part.isspace() else part)
+    return " ".join("".join(characters).split())
+
+
+def _hash_key(key: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+def read_glossary(path: str) -> Iterator[Tuple[str, str]]:
+    """Yield (phrase, translation) pairs from a two-column TSV, skipping blank lines and # comments"""
+    with open(path, newline="", encoding="utf-8") as glossary_file:
+        for row in csv.reader(glossary_file, delimiter="\t", quoting=csv.QUOTE_NONE):
+            if not row or row[0].startswith("#") or len(row) < 2:
+                continue
+            phrase, translation = row[0].strip(), row[1].strip()
+            if phrase and translation:
+                yield phrase, translation
+
+
+def build_index(
+    pairs: Iterable[Tuple[str, str]], path: str, source_lang: str = "ES", target_lang: str = "EN"
+) -> Dict[str, Any]:
+    """
+    Write a memory-mappable phrase index for one language pair
+
+    Every phrase is stored under its exact key (accents kept) and, unless another phrase differs from
+    it only in accents (sí/si, él/el), under its accent-folded key too. Those collisions are reported
+    and their phrases only match when typed with the right accents.
+
+    Args:
+        pairs: (phrase, translation) pairs; when several phrases share an exact key the first one is kept
+        path: Where to write the index, replaced atomically
+        source_lang: DeepL source language code the phrases are in
+        target_lang: DeepL target language code of the translations
+
+    Returns:
+        Build statistics
+    """
+    start = time.perf_counter()
+    entries: Dict[bytes, bytes] = {}
+    folded: Dict[bytes, Tuple[str, bytes]] = {}  # Folded key to the first phrase with it and its exact key
+    ambiguous: Dict[bytes, List[str]] = {}
+    duplicates = 0
+    for phrase, translation in pairs:
+        key = phrase_key(phrase, fold_accents=False).encode("utf-8")
+        if not key:
+            continue
+        if key in entries:
+            duplicates += 1
+            continue
+        entries[key] = translation.encode("utf-8")
+
+        folded_key = FOLDED_KEY_PREFIX + phrase_key(phrase).encode("utf-8")
+        if folded_key not in folded:
+            folded[folded_key] = (phrase, key)
+        else:
+            ambiguous.setdefault(folded_key, [folded[folded_key][0]]).append(phrase)
+    phrases = len(entries)
+    for folded_key, (_, key) in folded.items():
+        if folded_key not in ambiguous:
+            entries[folded_key] = entries[key]
+
+    slots = 1
+    while slots * LOAD_FACTOR < max(len(entries), 1):
+        slots *= 2
+    table = bytearray(_SLOT.size * slots)
+    records = bytearray()
+    data_start = _HEADER.size + len(table)
+    mask = slots - 1
+
+    for key, translation in entries.items():
+        key_hash = _hash_key(key)
+        slot = key_hash & mask
+        while _SLOT.unpack_from(table, slot * _SLOT.size)[1]:
+            slot = (slot + 1) & mask  # Linear probing keeps collisions on the same pages
+        _SLOT.pack_into(table, slot * _SLOT.size, key_hash, data_start + len(records))
+        records += _RECORD.pack(len(key), len(translation)) + key + translation
+
+    header = _HEADER.pack(
+        PHRASE_INDEX_MAGIC, PHRASE_INDEX_VERSION, slots, phrases, source_lang.encode("ascii"), target_lang.encode("ascii")
+    )
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as index_file:
+            index_file.write(header)
+            index_file.write(table)
+            index_file.write(records)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+    return {
+        "entries": phrases,
+        "duplicates": duplicates,
+        "accent_collisions": len(ambiguous),
+        "collision_examples": [" / ".join(group) for group in list(ambiguous.values())[:COLLISION_EXAMPLES]],
+        "slots": slots,
+        "bytes": os.path.getsize(path),
+        "build_seconds": time.perf_counter() - start,
+    }
+
+
+class PhraseTable:
+    """Read-only phrase index, memory-mapped so it loads instantly and is shared between processes"""
+
+    def __init__(self, path: str = PHRASE_INDEX_PATH):
+        self.path = path
+        with open(path, "rb") as index_file:
+            self._map = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < _HEADER.size:
+            self._map.close()
+            raise ValueError(f"{path} is not a phrase index")
+        magic, version, self.slots, self.entries, source, target = _HEADER.unpack_from(self._map, 0)
+        if magic != PHRASE_INDEX_MAGIC or version != PHRASE_INDEX_VERSION:
+            self._map.close()
+            raise ValueError(f"{path} is not a phrase index (or was built by another version)")
+        self.source_lang = source.rstrip(b"\0").decode("ascii")
+        self.target_lang = target.rstrip(b"\0").decode("ascii")
+        self._mask = self.slots - 1
+
+        self.lookups = 0
+        self.hits = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open_default(cls, path: str = PHRASE_INDEX_PATH) -> Optional["PhraseTable"]:
+        """Open the phrase index if one has been built, returning None otherwise"""
+        if not os.path.exists(path):
+            return None
+        try:
+            return cls(path)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring phrase index: {str(e)}")
+            return None
+
+    def lookup(self, text: str, source_lang: str = "ES", target_lang: str = "EN") -> Optional[str]:
+        """
+        Return the stored translation of text, or None if the phrase (or language pair) is not in the index
+
+        The text is matched with its accents first, then with accents ignored.
+        """
+        if source_lang != self.source_lang or target_lang != self.target_lang:
+            return None
+        key = phrase_key(text, fold_accents=False).encode("utf-8")
+        translation = self._find(key) if key else None
+        if translation is None and key:
+            translation = self._find(FOLDED_KEY_PREFIX + phrase_key(text).encode("utf-8"))
+        with self._lock:
+            self.lookups += 1
+            self.hits += translation is not None
+        return translation
+
+    def lookup_many(self, texts: Iterable[str], source_lang: str = "ES", target_lang: str = "EN") -> Dict[str, str]:
+        """Return translations for the texts found in the index, keyed by the original text"""
+        found: Dict[str, str] = {}
+        for text in texts:
+            translation = self.lookup(text, source_lang, target_lang)
+            if translation is not None:
+                found[text] = translation
+        return found
+
+    def stats(self) -> Dict[str, Any]:
+        """Return size and hit counters"""
+        with self._lock:
+            return {
+                "entries": self.entries,
+                "languages": f"{self.source_lang}->{self.target_lang}",
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+            }
+
+    def close(self) -> None:
+        self._map.close()
+
+    def _find(self, key: bytes) -> Optional[str]:
+        key_hash = _hash_key(key)
+        slot = key_hash & self._mask
+        while True:
+            slot_hash, offset = _SLOT.unpack_from(self._map, _HEADER.size + slot * _SLOT.size)
+            if not offset:
+                return None
+            if slot_hash == key_hash:
+                key_length, value_length = _RECORD.unpack_from(self._map, offset)
+                start = offset + _RECORD.size
+                # Compare the keys too, so a hash collision can never return the wrong translation
+                if self._map[start:start + key_length] == key:
+                    return self._map[start + key_length:start + key_length + value_length].decode("utf-8")
+            slot = (slot + 1) & self._mask
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build and query the local phrase index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Build the index from a TSV glossary (phrase<TAB>translation)")
+    build_parser.add_argument("glossary", nargs="+", help="TSV files; earlier files win when phrases collide")
+    build_parser.add_argument("--output", default=PHRASE_INDEX_PATH)
+    build_parser.add_argument("--source-lang", default="ES")
+    build_parser.add_argument("--target-lang", default="EN")
+
+    lookup_parser = subparsers.add_parser("lookup", help="Look phrases up in an index")
+    lookup_parser.add_argument("text", nargs="+")
+    lookup_parser.add_argument("--index", default=PHRASE_INDEX_PATH)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        pairs = (pair for path in args.glossary for pair in read_glossary(path))
+        try:
+            result = build_index(pairs, args.output, args.source_lang, args.target_lang)
+        except (OSError, UnicodeError) as e:
+            print(f"***   Could not build phrase index: {str(e)}")
+            sys.exit(1)
+        print(
+            f"***   Wrote {result['entries']} phrases to {args.output} "
+            f"({result['bytes'] / 1024:.0f} KiB, {result['duplicates']} duplicates skipped, "
+            f"{result['build_seconds']:.2f} s)"
+        )
+        if result["accent_collisions"]:
+            print(
+                f"***   {result['accent_collisions']} groups of phrases differ only in accents and match only when "
+                f"typed with them, e.g. {'; '.join(result['collision_examples'])}"
+            )
+    elif args.command == "lookup":
+        try:
+            table = PhraseTable(args.index)
+        except (OSError, ValueError) as e:
+            print(f"***   {str(e)}")
+            sys.exit(1)
+        for text in args.text:
+            print(f"{text}\t{table.lookup(text, table.source_lang, table.target_lang) or '(not found)'}")
+        table.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
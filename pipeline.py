@@ -0,0 +1,436 @@
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+# Constants
+TURN_WORKERS = 4  # Stages that may run at the same time within a turn
+SPECULATION_WORKERS = 2  # Room for a new speculation while a discarded one finishes its provider call
+POLL_INTERVAL = 0.05  # Seconds between cancellation checks while waiting on a stage
+MIN_SENTENCE_CHARS = 24  # Shorter fragments are merged with the next sentence before synthesis
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?…])[\"'»”)]*\s+")
+
+
+class TurnCancelled(Exception):
+    """Raised when waiting on a stage of a turn that has been cancelled"""
+
+
+class Turn:
+    """A single conversation turn whose independent stages run concurrently"""
+
+    def __init__(self, executor: ThreadPoolExecutor):
+        self._executor = executor
+        self._cancelled = threading.Event()
+        self._futures: List[Future] = []
+        self._cancel_callbacks: List[Callable[[], Any]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        """Start a stage in the background"""
+        if self.cancelled:
+            raise TurnCancelled()
+        future = self._executor.submit(self._run_stage, fn, *args, **kwargs)
+        self._futures.append(future)
+        return future
+
+    def result(self, future: Future) -> Any:
+        """
+        Wait for a stage to finish
+
+        Results are collected in whatever order the caller asks for them, so printing
+        stays in a fixed order even though the stages finish in any order.
+
+        Raises:
+            TurnCancelled: if the turn is cancelled before the stage finishes
+        """
+        while True:
+            if self.cancelled:
+                raise TurnCancelled()
+            try:
+                return future.result(timeout=POLL_INTERVAL)
+            except FutureTimeoutError:
+                continue
+
+    def wait(self, event: threading.Event) -> None:
+        """Wait for an event set by a stage, raising TurnCancelled if the turn is cancelled first"""
+        while not event.wait(POLL_INTERVAL):
+            if self.cancelled:
+                raise TurnCancelled()
+
+    def drain(self, items: "queue.Queue[Any]") -> Iterator[Any]:
+        """Yield items a stage puts on a queue until it puts None"""
+        while True:
+            if self.cancelled:
+                raise TurnCancelled()
+            try:
+                item = items.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            if item is None:
+                return
+            yield item
+
+    def on_cancel(self, callback: Callable[[], Any]) -> None:
+        """Register a callback to run when the turn is cancelled"""
+        self._cancel_callbacks.append(callback)
+
+    def cancel(self) -> None:
+        """Cancel the turn: stages that have not started are dropped and results are discarded"""
+        self._cancelled.set()
+        for future in self._futures:
+            future.cancel()
+        for callback in self._cancel_callbacks:
+            callback()
+
+    def _run_stage(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        if self.cancelled:
+            raise TurnCancelled()
+        return fn(*args, **kwargs)
+
+
+class TurnScheduler:
+    """Creates turns and owns the worker threads their stages run on"""
+
+    def __init__(self, max_workers: int = TURN_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="turn")
+        self._current: Optional[Turn] = None
+
+    def start_turn(self) -> Turn:
+        """Begin a new turn, cancelling any turn that is still in flight"""
+        self.cancel_current()
+        self._current = Turn(self._executor)
+        return self._current
+
+    def cancel_current(self) -> None:
+        """Cancel the turn in flight, if any"""
+        if self._current is not None:
+            self._current.cancel()
+            self._current = None
+
+    def close(self) -> None:
+        """Cancel outstanding work and release the worker threads"""
+        self.cancel_current()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class _Speculation:
+    """Work started for one unconfirmed input"""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.cancel = threading.Event()
+        self.submitted = time.monotonic()
+        self.finished: Optional[float] = None
+        self.future: Optional[Future] = None
+
+    def run(self, fn: Callable[[threading.Event], Any]) -> Any:
+        try:
+            return fn(self.cancel)
+        finally:
+            self.finished = time.monotonic()
+
+
+class Speculator:
+    """
+    Starts work on input the user has not confirmed yet, e.g. translating a transcription while they check it
+
+    At most one speculation is pending. Once the input is confirmed its result is used; if it is rejected
+    the work is cancelled, or, when a provider call is already running, left to finish and thrown away.
+    """
+
+    def __init__(self, max_workers: int = SPECULATION_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculate")
+        self._lock = threading.Lock()
+        self._pending: Optional[_Speculation] = None
+
+        self.started = 0
+        self.used = 0
+        self.discarded = 0
+        self.wasted = 0  # Discarded after the work had started, so provider calls were made for nothing
+        self.fully_hidden = 0  # Used, and already finished when the input was confirmed
+        self.taken = 0
+        self.hidden_seconds = 0.0  # Work done while the user was still deciding
+        self.waited_seconds = 0.0  # Time from confirmation to result, speculated or not
+
+    def start(self, key: str, fn: Callable[[threading.Event], Any]) -> None:
+        """
+        Begin fn(cancel_event) for an unconfirmed input, discarding any earlier speculation
+
+        fn should check the event between provider calls and stop early once it is set.
+        """
+        self.discard()
+        speculation = _Speculation(key)
+        speculation.future = self._executor.submit(speculation.run, fn)
+        with self._lock:
+            self._pending = speculation
+            self.started += 1
+
+    def take(self, key: str, fn: Callable[[threading.Event], Any]) -> Any:
+        """Return the result for a confirmed input: the speculation's if one was started for it, otherwise fn's"""
+        with self._lock:
+            speculation, self._pending = self._pending, None
+        if speculation is not None and speculation.key != key:
+            self._discard(speculation)
+            speculation = None
+
+        confirmed = time.monotonic()
+        result = None
+        if speculation is not None:
+            try:
+                result = speculation.future.result()
+            except Exception:
+                speculation = None  # Failed in the background; try again now that the input is confirmed
+        if speculation is None:
+            result = fn(threading.Event())
+
+        with self._lock:
+            self.taken += 1
+            self.waited_seconds += time.monotonic() - confirmed
+            if speculation is not None:
+                self.used += 1
+                self.hidden_seconds += min(speculation.finished, confirmed) - speculation.submitted
+                self.fully_hidden += speculation.finished <= confirmed
+        return result
+
+    def discard(self) -> None:
+        """Throw away the pending speculation, e.g. because the user rejected the input"""
+        with self._lock:
+            speculation, self._pending = self._pending, None
+        if speculation is not None:
+            self._discard(speculation)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit, waste and hidden-latency counters"""
+        with self._lock:
+            return {
+                "started": self.started,
+                "used": self.used,
+                "discarded": self.discarded,
+                "wasted": self.wasted,
+                "hit_rate": self.used / self.started if self.started else 0.0,
+                "waste_rate": self.wasted / self.started if self.started else 0.0,
+                "fully_hidden": self.fully_hidden,
+                "hidden_seconds": round(self.hidden_seconds, 3),
+                "mean_wait_after_confirm_ms": round(1000 * self.waited_seconds / self.taken, 3) if self.taken else 0.0,
+            }
+
+    def close(self) -> None:
+        """Discard pending work and release the worker threads"""
+        self.discard()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _discard(self, speculation: _Speculation) -> None:
+        speculation.cancel.set()
+        cancelled = speculation.future.cancel()
+        with self._lock:
+            self.discarded += 1
+            self.wasted += not cancelled
+
+
+class SentenceSplitter:
+    """Splits streamed text into sentences as soon as each one is complete"""
+
+    def __init__(self, min_chars: int = MIN_SENTENCE_CHARS):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        """Add streamed text, returning any sentences it completed"""
+        self._buffer += text
+        sentences = []
+        start = 0
+        for match in SENTENCE_BOUNDARY.finditer(self._buffer):
+            candidate = self._buffer[start:match.start()].strip()
+            if len(candidate) >= self.min_chars:
+                sentences.append(candidate)
+                start = match.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> List[str]:
+        """Return whatever text is left once the stream has ended"""
+        remainder = self._buffer.strip()
+        self._buffer = ""
+        return [remainder] if remainder else []
+
+
+class ChunkQueue:
+    """Hands audio chunks from a synthesis thread to a playback thread as they arrive"""
+
+    def __init__(self):
+        self._chunks: "queue.Queue[Optional[bytes]]" = queue.Queue()
+        self._aborted = threading.Event()
+
+    def put(self, chunk: bytes) -> None:
+        self._chunks.put(chunk)
+
+    def close(self) -> None:
+        """Signal that the clip is complete"""
+        self._chunks.put(None)
+
+    def abort(self) -> None:
+        """End iteration immediately, dropping anything not yet consumed"""
+        self._aborted.set()
+        self._chunks.put(None)
+
+    def __iter__(self) -> Iterator[bytes]:
+        while not self._aborted.is_set():
+            chunk = self._chunks.get()
+            if chunk is None or self._aborted.is_set():
+                return
+            yield chunk
+
+
+class SpeechPipeline:
+    """Synthesizes sentences while later ones are still being generated, and plays them back in order"""
+
+    def __init__(
+        self,
+        synthesize: Callable[[str], Iterable[bytes]],
+        play: Callable[[Iterable[bytes]], Any],
+    ):
+        """
+        Args:
+            synthesize: Returns the audio chunks for a sentence as they are produced
+            play: Plays a stream of audio chunks, starting before the stream is complete
+        """
+        self._synthesize = synthesize
+        self._play = play
+
+        self._sentences: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._clips: "queue.Queue[Optional[ChunkQueue]]" = queue.Queue()
+        self._cancelled = threading.Event()
+        self._current: Optional[ChunkQueue] = None
+        self.done = threading.Event()
+        self.error: Optional[Exception] = None  # Why playback stopped early, if it did
+
+        self.started_at = time.monotonic()
+        self.first_audio_at: Optional[float] = None
+
+        self._synthesis_thread = threading.Thread(target=self._synthesis_loop, daemon=True)
+        self._playback_thread = threading.Thread(target=self._playback_loop, daemon=True)
+        self._synthesis_thread.start()
+        self._playback_thread.start()
+
+    @property
+    def time_to_first_audio(self) -> Optional[float]:
+        """Seconds from the pipeline starting to the first audio chunk reaching the player"""
+        if self.first_audio_at is None:
+            return None
+        return self.first_audio_at - self.started_at
+
+    def add_sentence(self, sentence: str) -> None:
+        """Queue a sentence for synthesis"""
+        if not self._cancelled.is_set():
+            self._sentences.put(sentence)
+
+    def finish(self) -> None:
+        """Signal that no more sentences are coming"""
+        self._sentences.put(None)
+
+    def cancel(self) -> None:
+        """Stop synthesizing and cut off playback"""
+        self._cancelled.set()
+        self._sentences.put(None)
+        self._clips.put(None)
+        current = self._current
+        if current is not None:
+            current.abort()
+
+    def _synthesis_loop(self) -> None:
+        while True:
+            sentence = self._sentences.get()
+            if sentence is None or self._cancelled.is_set():
+                break
+            # Queue the clip before synthesis starts so playback can begin with the first chunk
+            clip = ChunkQueue()
+            self._clips.put(clip)
+            try:
+                for chunk in self._synthesize(sentence):
+                    if self._cancelled.is_set():
+                        break
+                    clip.put(chunk)
+            except Exception as e:
+                # Skip this sentence; the ones after it may still synthesize
+                print(f"Error synthesizing speech: {str(e)}")
+            finally:
+                clip.close()
+        self._clips.put(None)
+
+    def _playback_loop(self) -> None:
+        try:
+            while True:
+                clip = self._clips.get()
+                if clip is None or self._cancelled.is_set():
+                    break
+                self._current = clip
+                try:
+                    self._play(self._track_first_audio(clip))
+                except Exception as e:
+                    # The output device is most likely gone, so later clips would fail the same way
+                    print(f"Error playing audio: {str(e)}")
+                    self.error = e
+                    self.cancel()
+                    break
+                self._current = None
+        finally:
+            self._current = None
+            self.done.set()
+
+    def _track_first_audio(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        for chunk in chunks:
+            if self.first_audio_at is None:
+                self.first_audio_at = time.monotonic()
+            yield chunk
+
+
+class IncrementalTranscriber:
+    """Transcribes recording segments in the background and stitches the transcripts back together in order"""
+
+    def __init__(
+        self,
+        prepare: Callable[[Any], Any],
+        transcribe: Callable[[Any], Optional[str]],
+        max_workers: int = TURN_WORKERS,
+    ):
+        self._prepare = prepare
+        self._transcribe = transcribe
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="transcribe")
+        self._futures: List[Future] = []
+        self._lock = threading.Lock()
+
+    def submit(self, segment: Any) -> None:
+        """Queue a segment; safe to call from the audio callback"""
+        with self._lock:
+            self._futures.append(self._executor.submit(self._run, segment))
+
+    def result(self) -> Optional[str]:
+        """
+        Wait for every segment and return the stitched transcript
+
+        Returns:
+            The transcript, or None if nothing was transcribed or any segment with speech failed to transcribe,
+            since a transcript with a gap in it would be sent on as if it were what the user said
+        """
+        with self._lock:
+            futures = list(self._futures)
+        texts = [future.result() for future in futures]
+        self._executor.shutdown(wait=False)
+        failed = sum(text is None for text in texts)
+        if failed:
+            print(f"***   {failed} of {len(texts)} recording segments could not be transcribed")
+            return None
+        texts = [text.strip() for text in texts if text.strip()]
+        return " ".join(texts) if texts else None
+
+    def _run(self, segment: Any) -> Optional[str]:
+        """Transcribe one segment: "" when it held no speech, None when transcription failed"""
+        upload = self._prepare(segment)
+        if upload is None:
+            return ""
+        return self._transcribe(upload)
@@ -0,0 +1,264 @@
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from typing import Optional, List, Dict, Any, Iterable, Iterator
+
+# Constants
+PROFILE_ENV_VAR = "SLA_PROFILE"  # Set to a JSONL path (or "1" for DEFAULT_PROFILE_PATH) to enable profiling
+DEFAULT_PROFILE_PATH = "profile.jsonl"
+HISTOGRAM_SUFFIX = ".histograms.json"  # Histograms are exported next to the span log on exit
+HISTOGRAM_SUB_BUCKETS = 64  # Linear buckets per power of two, bounding the relative error to about 1.6%
+HISTOGRAM_UNIT = 1e-6  # Durations are bucketed in whole microseconds
+SUMMARY_PERCENTILES = [50, 90, 99]
+
+_profiler: Optional["Profiler"] = None
+
+
+class LatencyHistogram:
+    """Log-linear (HDR-style) histogram of durations with bounded relative error and memory"""
+
+    def __init__(self, sub_buckets: int = HISTOGRAM_SUB_BUCKETS):
+        if sub_buckets & (sub_buckets - 1):
+            raise ValueError("sub_buckets must be a power of two")
+        self.sub_buckets = sub_buckets
+        self._sub_bits = sub_buckets.bit_length() - 1
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def record(self, seconds: float) -> None:
+        index = self._index(max(0, int(seconds / HISTOGRAM_UNIT)))
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        if other.sub_buckets != self.sub_buckets:
+            raise ValueError("Cannot merge histograms with different precision")
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """Value (in seconds) at or below which the given percentage of recorded durations fall"""
+        if not self.count:
+            return None
+        rank = max(1, int(round(percentile / 100 * self.count)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                lower, upper = self._bounds(index)
+                value = (lower + upper) / 2 * HISTOGRAM_UNIT
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, Any]:
+        result: Dict[str, Any] = {"count": self.count}
+        if self.count:
+            result["mean_ms"] = 1000 * self.total / self.count
+            result["min_ms"] = 1000 * self.min
+            result["max_ms"] = 1000 * self.max
+            for percentile in SUMMARY_PERCENTILES:
+                result[f"p{percentile}_ms"] = 1000 * self.percentile(percentile)
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Export the raw buckets as [lower_us, upper_us, count] so histograms can be merged or re-plotted later"""
+        return {
+            "unit": "us",
+            "sub_buckets": self.sub_buckets,
+            "buckets": [[*self._bounds(index), self.counts[index]] for index in sorted(self.counts)],
+            **self.summary(),
+        }
+
+    def _index(self, value: int) -> int:
+        if value < self.sub_buckets:
+            return value
+        shift = value.bit_length() - 1 - self._sub_bits
+        return (shift + 1) * self.sub_buckets + (value >> shift) - self.sub_buckets
+
+    def _bounds(self, index: int) -> List[int]:
+        """Smallest and largest microsecond values that fall in a bucket"""
+        if index < self.sub_buckets:
+            return [index, index]
+        shift = index // self.sub_buckets - 1
+        mantissa = index % self.sub_buckets + self.sub_buckets
+        return [mantissa << shift, ((mantissa + 1) << shift) - 1]
+
+
+class Span:
+    """Times one stage of the pipeline; attributes set on it are written out with the duration"""
+
+    __slots__ = ("stage", "attrs", "start", "_profiler")
+
+    def __init__(self, profiler: "Profiler", stage: str, attrs: Dict[str, Any]):
+        self.stage = stage
+        self.attrs = attrs
+        self.start = 0.0
+        self._profiler = profiler
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def __enter__(self) -> "Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> bool:
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self._profiler.record(self, time.perf_counter() - self.start)
+        return False
+
+
+class _NullSpan:
+    """Span returned while profiling is disabled; does nothing"""
+
+    __slots__ = ()
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> bool:
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Profiler:
+    """Writes spans to a JSONL file and keeps a latency histogram per stage"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+        # Spans are timed with perf_counter; this offset turns their start into a wall-clock timestamp
+        self._clock_offset = time.time() - time.perf_counter()
+
+    def record(self, span: Span, duration: float) -> None:
+        line = json.dumps(
+            {
+                "ts": round(self._clock_offset + span.start, 6),
+                "stage": span.stage,
+                "duration_ms": round(1000 * duration, 3),
+                "thread": threading.current_thread().name,
+                **span.attrs,
+            },
+            default=str,
+        )
+        with self._lock:
+            histogram = self.histograms.get(span.stage)
+            if histogram is None:
+                histogram = self.histograms[span.stage] = LatencyHistogram()
+            histogram.record(duration)
+            if not self._file.closed:
+                self._file.write(line + "\n")
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {stage: histogram.summary() for stage, histogram in sorted(self.histograms.items())}
+
+    def export_histograms(self, path: str) -> None:
+        with self._lock:
+            data = {stage: histogram.to_dict() for stage, histogram in sorted(self.histograms.items())}
+        with open(path, "w", encoding="utf-8") as histogram_file:
+            json.dump(data, histogram_file, indent=2)
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+def enable(path: str = DEFAULT_PROFILE_PATH) -> Profiler:
+    """Start recording spans to path; the summary and histograms are written when the process exits"""
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler(path)
+        atexit.register(close)
+    return _profiler
+
+
+def enable_from_env() -> Optional[Profiler]:
+    """Enable profiling if PROFILE_ENV_VAR is set"""
+    value = os.environ.get(PROFILE_ENV_VAR, "").strip()
+    if not value or value == "0":
+        return None
+    return enable(DEFAULT_PROFILE_PATH if value == "1" else value)
+
+
+def enabled() -> bool:
+    """True while profiling; use to skip computing attributes that are only needed for spans"""
+    return _profiler is not None
+
+
+def span(stage: str, **attrs: Any) -> Any:
+    """
+    Time a block of code as one stage
+
+    Example:
+        with profiling.span("translate", texts=len(texts)) as s:
+            ...
+            s.set(cache_hits=hits)
+
+    Returns a shared no-op span while profiling is disabled, so instrumentation costs one global lookup.
+    """
+    if _profiler is None:
+        return NULL_SPAN
+    return Span(_profiler, stage, attrs)
+
+
+def measure_stream(current_span: Any, chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Pass chunks through, recording their total size and the time to the first one on the span"""
+    if current_span is NULL_SPAN:
+        yield from chunks
+        return
+    start = time.perf_counter()
+    total = 0
+    first = True
+    for chunk in chunks:
+        if first:
+            first = False
+            current_span.set(time_to_first_byte_ms=round(1000 * (time.perf_counter() - start), 3))
+        total += len(chunk)
+        yield chunk
+    current_span.set(response_bytes=total)
+
+
+def close() -> None:
+    """Stop profiling, printing a per-stage summary to stderr and exporting the histograms"""
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is None:
+        return
+    profiler.close()
+    summary = profiler.summary()
+    if not summary:
+        return
+
+    histogram_path = os.path.splitext(profiler.path)[0] + HISTOGRAM_SUFFIX
+    profiler.export_histograms(histogram_path)
+
+    columns = ["count"] + [f"p{percentile}_ms" for percentile in SUMMARY_PERCENTILES] + ["max_ms"]
+    print(f"\n{'stage':<24}" + "".join(f"{column:>12}" for column in columns), file=sys.stderr)
+    for stage, stats in summary.items():
+        cells = [f"{stats[column]:>12.1f}" if column != "count" else f"{stats[column]:>12}" for column in columns]
+        print(f"{stage:<24}" + "".join(cells), file=sys.stderr)
+    print(f"Spans written to {profiler.path}, histograms to {histogram_path}", file=sys.stderr)
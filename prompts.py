@@ -53,3 +53,17 @@ AI: '¡Ah! Everything Everywhere All at Once es una película muy interesante. 
 This should feel like a friendly and engaging way to practice Spanish while gradually improving my accuracy and confidence."
 
 """
+
+
+SUMMARY_PROMPT = """
+You maintain a running summary of a Spanish practice conversation between a learner and their tutor. \
+You will be given the previous summary (if any) and the next part of the conversation. Return an updated \
+summary in English of at most 150 words that keeps the topics discussed, facts the learner shared about \
+themselves, and the grammar or vocabulary corrections the tutor made. Return only the summary text.
+"""
+
+
+TRANSLATE_PROMPT = """
+Translate the user's message from {source} to {target}. Keep the meaning, tone and register of the original. \
+Return only the translation, with no quotes, notes or explanations.
+"""
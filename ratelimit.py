@@ -0,0 +1,253 @@
+import re
+import threading
+import time
+from typing import Optional, Dict, Any, List, Mapping
+
+import profiling
+
+# Constants
+PROVIDER_LIMITS = {
+    # Starting budgets per minute; limits advertised in response headers replace them once seen
+    "deepl": {"requests_per_minute": 300, "tokens_per_minute": None},
+    "openai": {"requests_per_minute": 500, "tokens_per_minute": 200_000},
+    "elevenlabs": {"requests_per_minute": 120, "tokens_per_minute": None},
+}
+BURST_SECONDS = 2.0  # Bucket capacity, in seconds of refill, that can be spent at once after an idle period
+DECREASE_FACTOR = 0.5  # Multiplicative decrease of the sending rate when throttled
+INCREASE_STEP = 0.02  # Additive increase, as a share of the full rate, per successful response
+MIN_RATE_FACTOR = 0.05  # Never slow down below this share of the full rate
+DECREASE_COOLDOWN = 1.0  # Seconds; a burst of 429s from requests already in flight counts as one signal
+CHARS_PER_TOKEN = 4  # Rough estimate used to reserve tokens before a request is sent
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Parse a reset duration such as "20ms", "1.5s" or "6m0s" (as sent in x-ratelimit-reset-* headers)"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+
+def estimate_chat_tokens(messages: List[Dict[str, str]]) -> int:
+    """Rough prompt size of a chat request, reserved before sending; the completion is charged once known"""
+    return sum(len(str(message.get("content", ""))) // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+
+class TokenBucket:
+    """Refilling budget that can go into debt, so waiters are served in the order they reserved"""
+
+    def __init__(self, rate: float, burst_seconds: float = BURST_SECONDS):
+        self.rate = rate  # Units per second
+        self.burst_seconds = burst_seconds
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def capacity(self) -> float:
+        return max(1.0, self.rate * self.burst_seconds)
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Take amount from the bucket and return how long the caller must wait before using it"""
+        self._refill(now)
+        self.level -= amount
+        return -self.level / self.rate if self.level < 0 else 0.0
+
+    def refund(self, amount: float, now: float) -> None:
+        """Give back unused budget, or take more when amount is negative"""
+        self._refill(now)
+        self.level = min(self.capacity, self.level + amount)
+
+    def set_rate(self, rate: float, now: float) -> None:
+        self._refill(now)
+        self.rate = rate
+        self.level = min(self.level, self.capacity)
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class RateLimiter:
+    """
+    Request and token budgets for one provider, with AIMD backoff when throttled
+
+    Safe to share between threads and asyncio tasks: the lock is only held to reserve budget,
+    never while waiting for it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: float,
+        tokens_per_minute: Optional[float] = None,
+        burst_seconds: float = BURST_SECONDS,
+    ):
+        """
+        Args:
+            name: Provider name, used in metrics
+            requests_per_minute: Initial request budget
+            tokens_per_minute: Initial token budget, or None when the provider does not limit tokens
+            burst_seconds: How many seconds of budget may be spent at once
+        """
+        self.name = name
+        self.request_limit = requests_per_minute
+        self.token_limit = tokens_per_minute
+        self.rate_factor = 1.0  # AIMD multiplier applied to both budgets
+
+        now = time.monotonic()
+        self._requests = TokenBucket(requests_per_minute / 60, burst_seconds)
+        self._tokens = TokenBucket(tokens_per_minute / 60, burst_seconds) if tokens_per_minute else None
+        self._blocked_until = 0.0
+        self._last_decrease = now - DECREASE_COOLDOWN
+        self._lock = threading.Lock()
+
+        self.acquired = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait = 0.0
+        self.throttled = 0
+
+    def reserve(self, tokens: int = 0) -> float:
+        """Reserve budget for one request and return the seconds to wait before sending it"""
+        with self._lock:
+            now = time.monotonic()
+            wait = self._requests.reserve(1, now)
+            if self._tokens is not None and tokens:
+                wait = max(wait, self._tokens.reserve(tokens, now))
+            wait = max(wait, self._blocked_until - now)
+
+            self.acquired += 1
+            if wait > 0:
+                self.waits += 1
+                self.wait_seconds += wait
+                self.max_wait = max(self.max_wait, wait)
+            return wait
+
+    def acquire(self, tokens: int = 0) -> float:
+        """Block the calling thread until a request may be sent, returning the time waited"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            with profiling.span("rate_limit_wait", provider=self.name, tokens=tokens):
+                time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, tokens: int = 0) -> float:
+        """Like acquire, but yields to the event loop while waiting"""
+        import asyncio
+
+        wait = self.reserve(tokens)
+        if wait > 0:
+            with profiling.span("rate_limit_wait", provider=self.name, tokens=tokens):
+                await asyncio.sleep(wait)
+        return wait
+
+    def settle(self, reserved: int, used: int) -> None:
+        """Correct the token budget once a response reports its actual usage"""
+        if self._tokens is not None and used != reserved:
+            with self._lock:
+                self._tokens.refund(reserved - used, time.monotonic())
+
+    def record_response(self, status_code: int, headers: Optional[Mapping[str, str]] = None) -> None:
+        """Learn from a response: back off on 429, speed up again on success, and adopt advertised limits"""
+        if headers:
+            self.update_from_headers(headers)
+        if status_code == 429:
+            from http_client import parse_retry_after
+
+            self.throttle(parse_retry_after((headers or {}).get("retry-after") or (headers or {}).get("Retry-After")))
+        elif 200 <= status_code < 400:
+            with self._lock:
+                if self.rate_factor < 1.0:
+                    self.rate_factor = min(1.0, self.rate_factor + INCREASE_STEP)
+                    self._apply_rates(time.monotonic())
+
+    def throttle(self, retry_after: Optional[float] = None) -> None:
+        """Halve the sending rate (at most once per cooldown) and pause everyone until retry_after has passed"""
+        with self._lock:
+            now = time.monotonic()
+            self.throttled += 1
+            if now - self._last_decrease >= DECREASE_COOLDOWN:
+                self.rate_factor = max(MIN_RATE_FACTOR, self.rate_factor * DECREASE_FACTOR)
+                self._last_decrease = now
+                self._apply_rates(now)
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+
+    def update_from_headers(self, headers: Mapping[str, str]) -> None:
+        """Adopt the limits and remaining budget from x-ratelimit-* headers (per-minute limits, as OpenAI sends them)"""
+        lowered = {key.lower(): value for key, value in headers.items()}
+        with self._lock:
+            now = time.monotonic()
+            for kind in ("requests", "tokens"):
+                limit = _parse_float(lowered.get(f"x-ratelimit-limit-{kind}"))
+                remaining = _parse_float(lowered.get(f"x-ratelimit-remaining-{kind}"))
+                reset = parse_duration(lowered.get(f"x-ratelimit-reset-{kind}"))
+
+                if limit:
+                    if kind == "requests":
+                        self.request_limit = limit
+                    else:
+                        self.token_limit = limit
+                        if self._tokens is None:
+                            self._tokens = TokenBucket(limit / 60, self._requests.burst_seconds)
+                if remaining is not None and remaining < 1 and reset:
+                    self._blocked_until = max(self._blocked_until, now + reset)
+            self._apply_rates(now)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return wait and throttling counters"""
+        with self._lock:
+            return {
+                "acquired": self.acquired,
+                "waits": self.waits,
+                "wait_seconds": round(self.wait_seconds, 3),
+                "max_wait_seconds": round(self.max_wait, 3),
+                "mean_wait_ms": round(1000 * self.wait_seconds / self.acquired, 3) if self.acquired else 0.0,
+                "throttled": self.throttled,
+                "rate_factor": round(self.rate_factor, 3),
+                "requests_per_minute": round(self.request_limit * self.rate_factor, 1),
+            }
+
+    def _apply_rates(self, now: float) -> None:
+        """Recompute bucket rates from the limits and the AIMD factor (lock held)"""
+        self._requests.set_rate(self.request_limit / 60 * self.rate_factor, now)
+        if self._tokens is not None and self.token_limit:
+            self._tokens.set_rate(self.token_limit / 60 * self.rate_factor, now)
+
+
+def _parse_float(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(provider: str) -> RateLimiter:
+    """Return the process-wide limiter for a provider, creating it from PROVIDER_LIMITS on first use"""
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            limits = PROVIDER_LIMITS.get(provider, PROVIDER_LIMITS["deepl"])
+            limiter = _limiters[provider] = RateLimiter(provider, **limits)
+        return limiter
+
+
+def limiter_stats() -> Dict[str, Dict[str, Any]]:
+    """Stats of every limiter created so far"""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
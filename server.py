@@ -0,0 +1,651 @@
+import argparse
+import asyncio
+import base64
+import functools
+import hashlib
+import json
+import os
+import secrets
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Optional, List, Dict, Any, Tuple, Callable, Awaitable
+
+import profiling
+from cache import TranslationCache, ExplanationCache
+from context import ConversationContext
+from hedging import Hedger
+from http_client import PooledSession
+from phrases import PhraseTable
+from prompts import CONVO_PROMPT
+from ratelimit import limiter_stats
+from translation import TranslationService, AIService, COMPLETION_FALLBACK, DEEPL_API_URL
+
+# Constants
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+MAX_SESSIONS = 1000
+PROVIDER_WORKERS = 64  # Threads making blocking provider calls, shared by every session
+MAX_ACTIVE_TURNS = 256  # Requests admitted at once (running or waiting for a worker); more are refused with 503
+SESSION_QUEUE_LIMIT = 2  # Requests a session may have waiting behind its running one; more are refused with 429
+SESSION_MAX_TOKENS = 8000  # Conversation history held per session before the oldest messages are dropped
+SESSION_IDLE_TIMEOUT = 30 * 60  # Seconds before an unused session is closed
+SWEEP_INTERVAL = 60  # Seconds between idle-session sweeps
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 64 * 1024  # Also the largest WebSocket message accepted
+MAX_TEXT_CHARS = 2000  # Longest text accepted for a translation or a conversation turn
+BUSY_RETRY_AFTER = 1  # Seconds suggested to clients refused because the server is saturated
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"  # Fixed by RFC 6455 for the handshake
+WS_CONTINUATION, WS_TEXT, WS_BINARY, WS_CLOSE, WS_PING, WS_PONG = 0x0, 0x1, 0x2, 0x8, 0x9, 0xA
+
+
+class HTTPError(Exception):
+    """Error returned to the client with an HTTP status (or as an error message on a WebSocket)"""
+
+    def __init__(self, status: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+
+def websocket_accept(key: str) -> str:
+    """Sec-WebSocket-Accept value answering a client's Sec-WebSocket-Key"""
+    return base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode("ascii")).digest()).decode("ascii")
+
+
+def websocket_frame(opcode: int, payload: bytes, mask: bool = False) -> bytes:
+    """Encode one unfragmented WebSocket frame; clients must mask, servers must not"""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, (0x80 if mask else 0) | length)
+    elif length < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, (0x80 if mask else 0) | 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, (0x80 if mask else 0) | 127, length)
+    if not mask:
+        return header + payload
+    key = os.urandom(4)
+    return header + key + _apply_mask(payload, key)
+
+
+async def read_websocket_message(
+    reader: asyncio.StreamReader,
+    writer: Optional[asyncio.StreamWriter] = None,
+    mask: bool = False,
+    max_bytes: int = MAX_BODY_BYTES,
+) -> Tuple[int, bytes]:
+    """
+    Read one WebSocket message, joining fragments; returns (opcode, payload)
+
+    Args:
+        writer: When given, pings are answered and pongs skipped here, including between the fragments
+            of a message, so only data messages and close frames are returned
+        mask: Mask the pongs, as a client must
+    """
+    opcode, parts, size = None, [], 0
+    while True:
+        first, second = await reader.readexactly(2)
+        frame_opcode, length = first & 0x0F, second & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", await reader.readexactly(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", await reader.readexactly(8))[0]
+        if size + length > max_bytes:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Message too large")
+        key = await reader.readexactly(4) if second & 0x80 else None
+        payload = await reader.readexactly(length)
+        if key is not None:
+            payload = _apply_mask(payload, key)
+
+        # Control frames may arrive between the fragments of a message and are never fragmented themselves
+        if frame_opcode == WS_CLOSE:
+            return frame_opcode, payload  # Nothing follows a close, so a partial message can never complete
+        if frame_opcode in (WS_PING, WS_PONG):
+            if writer is None:
+                return frame_opcode, payload
+            if frame_opcode == WS_PING:
+                writer.write(websocket_frame(WS_PONG, payload, mask))
+            continue
+        size += length
+        if frame_opcode != WS_CONTINUATION:
+            opcode = frame_opcode
+        parts.append(payload)
+        if first & 0x80:
+            return opcode, b"".join(parts)
+
+
+def _apply_mask(payload: bytes, key: bytes) -> bytes:
+    repeated = (key * (len(payload) // 4 + 1))[:len(payload)]
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(repeated, "big")).to_bytes(len(payload), "big")
+
+
+class Session:
+    """One learner's conversation state; isolated from every other session"""
+
+    def __init__(self, session_id: str, context: ConversationContext):
+        self.id = session_id
+        self.context = context
+        self.created = time.monotonic()
+        self.last_used = self.created
+        self.turns = 0
+        self.waiting = 0  # Requests queued behind the running one
+        self.lock = asyncio.Lock()  # Turns of one session run in order, never concurrently
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.id,
+            "turns": self.turns,
+            "context_tokens": self.context.token_count(),
+            "idle_seconds": round(time.monotonic() - self.last_used, 1),
+        }
+
+
+class AssistantServer:
+    """
+    Serves translation, explanation and conversation turns to many concurrent sessions from one process
+
+    Provider clients, connection pools, rate limiters and caches are shared; each session only holds its
+    conversation history. Blocking provider calls run on a shared worker pool, and requests beyond
+    MAX_ACTIVE_TURNS are refused with 503 rather than queued without bound.
+    """
+
+    def __init__(
+        self,
+        translator: TranslationService,
+        ai_service: AIService,
+        max_sessions: int = MAX_SESSIONS,
+        workers: int = PROVIDER_WORKERS,
+        max_active_turns: int = MAX_ACTIVE_TURNS,
+        session_queue_limit: int = SESSION_QUEUE_LIMIT,
+        session_max_tokens: int = SESSION_MAX_TOKENS,
+        idle_timeout: float = SESSION_IDLE_TIMEOUT,
+    ):
+        self.translator = translator
+        self.ai_service = ai_service
+        self.max_sessions = max_sessions
+        self.max_active_turns = max_active_turns
+        self.session_queue_limit = session_queue_limit
+        self.session_max_tokens = session_max_tokens
+        self.idle_timeout = idle_timeout
+
+        self.sessions: Dict[str, Session] = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="provider")
+        self._summarizer = ThreadPoolExecutor(max_workers=max(1, workers // 8), thread_name_prefix="summarize")
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._started = time.monotonic()
+
+        self.active = 0
+        self.requests = 0
+        self.rejected = 0
+        self.connections = 0
+
+    # Sessions
+
+    def create_session(self) -> Session:
+        if len(self.sessions) >= self.max_sessions:
+            self.evict_idle()
+        if len(self.sessions) >= self.max_sessions:
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "Too many sessions", BUSY_RETRY_AFTER)
+        session_id = secrets.token_urlsafe(16)
+        context = ConversationContext(CONVO_PROMPT, self.ai_service.summarize_history, executor=self._summarizer)
+        session = self.sessions[session_id] = Session(session_id, context)
+        return session
+
+    def get_session(self, session_id: str) -> Session:
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, "Unknown session")
+        session.last_used = time.monotonic()
+        return session
+
+    def close_session(self, session_id: str) -> None:
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            session.context.close()
+
+    def evict_idle(self) -> int:
+        """Close sessions unused for longer than the idle timeout, returning how many were closed"""
+        cutoff = time.monotonic() - self.idle_timeout
+        idle = [session.id for session in self.sessions.values() if session.last_used < cutoff and not session.lock.locked()]
+        for session_id in idle:
+            self.close_session(session_id)
+        return len(idle)
+
+    # Operations
+
+    async def translate(self, text: str, explain: bool = False) -> Dict[str, Any]:
+        """Translate text, with a close earlier sentence from the translation memory and optionally an explanation"""
+        text = _validate_text(text)
+        # Translations keep no session state, so they never queue behind a session's turns
+        async with self._admit(None):
+            # Off the event loop: the translation memory is locked while it loads or merges in the background
+            similar = await self._call(self.translator.suggest, text)
+            translation = await self._call(self.translator.translate, text)
+            if not translation:
+                raise HTTPError(HTTPStatus.BAD_GATEWAY, "Could not translate the text")
+            result: Dict[str, Any] = {"text": text, "translation": translation}
+            if similar is not None and similar.score < 1.0:
+                result["similar"] = similar._asdict()
+            if explain:
+                result["explanation"] = await self._call(self.ai_service.get_explanation, text, translation)
+            return result
+
+    async def conversation_turn(
+        self, session: Session, text: str, on_token: Optional[Callable[[str], Awaitable[None]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Run one conversation turn for a session
+
+        Args:
+            on_token: Awaited with each piece of the reply as it is generated; the reply is not streamed when None
+
+        Returns:
+            The translation of the user's text and the reply
+        """
+        text = _validate_text(text)
+        # Holds the session's lock, so turns of one session run in order
+        async with self._admit(session):
+            started = time.perf_counter()
+            messages = session.context.messages([{"role": "user", "content": text}])
+            # The translation is only shown to the user, so it runs alongside the reply
+            translation_future = self._call(self.translator.translate, text)
+            try:
+                if on_token is None:
+                    reply = await self._call(
+                        functools.partial(self.ai_service.get_text_completion, messages, purpose="conversation")
+                    )
+                else:
+                    reply = await self._stream_completion(messages, on_token)
+                translation = await translation_future
+            finally:
+                # If the reply failed (e.g. the client went away mid-stream), drop the translation too
+                # rather than leaving its job behind with an unretrieved result or exception
+                if not translation_future.cancel() and not translation_future.cancelled():
+                    translation_future.exception()
+
+            if reply == COMPLETION_FALLBACK:
+                raise HTTPError(HTTPStatus.BAD_GATEWAY, "Could not generate a reply")
+            session.context.add("user", text)
+            session.context.add("assistant", reply)
+            session.context.trim(self.session_max_tokens)
+            session.turns += 1
+            return {
+                "translation": translation,
+                "reply": reply,
+                "turn_ms": round(1000 * (time.perf_counter() - started), 3),
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        """Return load and rate-limiter statistics"""
+        return {
+            "uptime_s": round(time.monotonic() - self._started, 1),
+            "cpu_seconds": round(time.process_time(), 3),
+            "sessions": len(self.sessions),
+            "connections": self.connections,
+            "active_requests": self.active,
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "rate_limiters": limiter_stats(),
+            "usage": self.ai_service.ledger.summary(),
+        }
+
+    def _admit(self, session: Optional[Session]) -> "_Admission":
+        """Admit a request, holding the session's lock for its duration when a session is given"""
+        return _Admission(self, session)
+
+    def _call(self, function: Callable[..., Any], *args: Any) -> "asyncio.Future[Any]":
+        """Run a blocking provider call on the shared worker pool"""
+        return asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    async def _stream_completion(self, messages: List[Dict[str, str]], on_token: Callable[[str], Awaitable[None]]) -> str:
+        """Stream a completion from a worker thread to on_token, stopping generation if the client goes away"""
+        loop = asyncio.get_running_loop()
+        tokens: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+        cancelled = threading.Event()
+
+        def produce() -> str:
+            parts = []
+            stream = self.ai_service.stream_text_completion(messages)
+            try:
+                for text in stream:
+                    if cancelled.is_set():
+                        break
+                    parts.append(text)
+                    loop.call_soon_threadsafe(tokens.put_nowait, text)
+            finally:
+                stream.close()
+            return "".join(parts)
+
+        future = self._call(produce)
+        # Scheduled after every token, since both go through the loop's callback queue in order
+        future.add_done_callback(lambda _: tokens.put_nowait(None))
+        try:
+            while True:
+                text = await tokens.get()
+                if text is None:
+                    break
+                await on_token(text)
+        except BaseException:
+            cancelled.set()
+            raise
+        return await future
+
+    # Serving
+
+    async def start(self, host: str = SERVER_HOST, port: int = SERVER_PORT) -> Tuple[str, int]:
+        """Start listening, returning the bound address"""
+        self._server = await asyncio.start_server(self._handle_connection, host, port, limit=MAX_HEADER_BYTES)
+        asyncio.get_running_loop().create_task(self._sweep())
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def serve_forever(self) -> None:
+        async with self._server:
+            await self._server.serve_forever()
+
+    def close(self) -> None:
+        for session_id in list(self.sessions):
+            self.close_session(session_id)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._summarizer.shutdown(wait=False, cancel_futures=True)
+
+    async def _sweep(self) -> None:
+        while True:
+            await asyncio.sleep(SWEEP_INTERVAL)
+            self.evict_idle()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve HTTP/1.1 requests on one keep-alive connection, or hand it over to a WebSocket session"""
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except HTTPError as e:
+                    await _write_response(writer, e.status, {"error": e.message}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+
+                if headers.get("upgrade", "").lower() == "websocket":
+                    await self._handle_websocket(path, headers, reader, writer)
+                    break
+
+                self.requests += 1
+                try:
+                    status, payload = HTTPStatus.OK, await self._route(method, path, body)
+                    extra = {}
+                except HTTPError as e:
+                    status, payload = e.status, {"error": e.message}
+                    extra = {"Retry-After": str(e.retry_after)} if e.retry_after is not None else {}
+                await _write_response(writer, status, payload, extra, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def _route(self, method: str, path: str, body: bytes) -> Dict[str, Any]:
+        """Dispatch one REST request"""
+        parts = [part for part in path.split("?")[0].split("/") if part]
+        payload = _parse_json(body) if method in ("POST", "PUT") else {}
+
+        if parts == ["health"] and method == "GET":
+            return {"status": "ok"}
+        if parts == ["stats"] and method == "GET":
+            return self.stats()
+        if parts == ["translate"] and method == "POST":
+            if payload.get("session_id"):
+                self.get_session(payload["session_id"])  # Unknown sessions are still a 404
+            return await self.translate(payload.get("text", ""), bool(payload.get("explain")))
+        if parts == ["sessions"] and method == "POST":
+            return self.create_session().info()
+        if len(parts) >= 2 and parts[0] == "sessions":
+            if len(parts) == 2 and method == "GET":
+                return self.get_session(parts[1]).info()
+            if len(parts) == 2 and method == "DELETE":
+                self.get_session(parts[1])
+                self.close_session(parts[1])
+                return {"closed": parts[1]}
+            if len(parts) == 3 and parts[2] == "turns" and method == "POST":
+                return await self.conversation_turn(self.get_session(parts[1]), payload.get("text", ""))
+        raise HTTPError(HTTPStatus.NOT_FOUND, f"No route for {method} {path}")
+
+    async def _handle_websocket(
+        self, path: str, headers: Dict[str, str], reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """
+        Conversation over a WebSocket at /sessions/{id}/ws
+
+        Client messages are JSON: {"type": "turn", "text": ...} or {"type": "translate", "text": ..., "explain": bool}.
+        A turn is answered with "translation", a "token" per piece of the reply as it is generated, then "done".
+        """
+        parts = [part for part in path.split("?")[0].split("/") if part]
+        key = headers.get("sec-websocket-key")
+        try:
+            if len(parts) != 3 or parts[0] != "sessions" or parts[2] != "ws":
+                raise HTTPError(HTTPStatus.NOT_FOUND, "WebSocket sessions live at /sessions/{id}/ws")
+            if not key:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "Missing Sec-WebSocket-Key")
+            session = self.get_session(parts[1])
+        except HTTPError as e:
+            await _write_response(writer, e.status, {"error": e.message}, keep_alive=False)
+            return
+
+        writer.write(
+            (
+                "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                f"Sec-WebSocket-Accept: {websocket_accept(key)}\r\n\r\n"
+            ).encode("ascii")
+        )
+        await writer.drain()
+
+        async def send(message: Dict[str, Any]) -> None:
+            writer.write(websocket_frame(WS_TEXT, json.dumps(message).encode("utf-8")))
+            await writer.drain()  # Backpressure: a slow reader slows its own stream, not the server
+
+        while True:
+            try:
+                opcode, data = await read_websocket_message(reader, writer)
+            except HTTPError as e:
+                writer.write(websocket_frame(WS_CLOSE, struct.pack("!H", 1009) + e.message.encode("utf-8")))
+                return
+            if opcode == WS_CLOSE:
+                writer.write(websocket_frame(WS_CLOSE, data[:2]))
+                await writer.drain()
+                return
+            if opcode != WS_TEXT:
+                continue
+
+            self.requests += 1
+            try:
+                message = _parse_json(data)
+                if message.get("type") == "turn":
+                    session.last_used = time.monotonic()
+                    result = await self.conversation_turn(
+                        session, message.get("text", ""), lambda text: send({"type": "token", "text": text})
+                    )
+                    await send({"type": "done", **result})
+                elif message.get("type") == "translate":
+                    result = await self.translate(message.get("text", ""), bool(message.get("explain")))
+                    await send({"type": "translation", **result})
+                else:
+                    raise HTTPError(HTTPStatus.BAD_REQUEST, "Unknown message type")
+            except HTTPError as e:
+                error = {"type": "error", "status": int(e.status), "message": e.message}
+                if e.retry_after is not None:
+                    error["retry_after"] = e.retry_after
+                await send(error)
+
+
+class _Admission:
+    """
+    Async context manager enforcing the global and per-session request limits
+
+    With a session it also holds the session's lock, so that session.waiting counts exactly the
+    requests queued on the lock, and only until they get it.
+    """
+
+    def __init__(self, server: AssistantServer, session: Optional[Session]):
+        self.server = server
+        self.session = session
+
+    async def __aenter__(self) -> None:
+        server, session = self.server, self.session
+        if server.active >= server.max_active_turns:
+            server.rejected += 1
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "Server busy", BUSY_RETRY_AFTER)
+        queued = session is not None and session.lock.locked()
+        if queued and session.waiting >= server.session_queue_limit:
+            server.rejected += 1
+            raise HTTPError(HTTPStatus.TOO_MANY_REQUESTS, "Too many requests waiting in this session")
+        server.active += 1
+        if session is None:
+            return
+        if queued:
+            session.waiting += 1
+        try:
+            await session.lock.acquire()
+        except BaseException:
+            server.active -= 1
+            raise
+        finally:
+            if queued:
+                session.waiting -= 1
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self.server.active -= 1
+        if self.session is not None:
+            self.session.lock.release()
+
+
+def _validate_text(text: Any) -> str:
+    if not isinstance(text, str) or not text.strip():
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Missing text")
+    if len(text) > MAX_TEXT_CHARS:
+        raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"Text longer than {MAX_TEXT_CHARS} characters")
+    return text.strip()
+
+
+def _parse_json(body: bytes) -> Dict[str, Any]:
+    try:
+        payload = json.loads(body or b"{}")
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Body is not valid JSON")
+    if not isinstance(payload, dict):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Body must be a JSON object")
+    return payload
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+    """Read one HTTP/1.1 request, or return None once the client has closed the connection"""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError:
+        return None
+    except asyncio.LimitOverrunError:
+        raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Headers too large")
+
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, _ = lines[0].split(" ", 2)
+        headers = {name.strip().lower(): value.strip() for name, value in (line.split(":", 1) for line in lines[1:] if line)}
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, headers, body
+
+
+async def _write_response(
+    writer: asyncio.StreamWriter,
+    status: int,
+    payload: Dict[str, Any],
+    headers: Optional[Dict[str, str]] = None,
+    keep_alive: bool = True,
+) -> None:
+    data = json.dumps(payload).encode("utf-8")
+    lines = [
+        f"HTTP/1.1 {int(status)} {HTTPStatus(status).phrase}",
+        "Content-Type: application/json",
+        f"Content-Length: {len(data)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + data)
+    await writer.drain()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Serve the Spanish Learning Assistant to many sessions over HTTP and WebSocket")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help="0 picks a free port")
+    parser.add_argument("--max-sessions", type=int, default=MAX_SESSIONS)
+    parser.add_argument("--workers", type=int, default=PROVIDER_WORKERS, help="Threads for provider calls")
+    parser.add_argument("--max-active", type=int, default=MAX_ACTIVE_TURNS, help="Requests admitted at once before 503s")
+    parser.add_argument("--session-max-tokens", type=int, default=SESSION_MAX_TOKENS)
+    parser.add_argument("--no-cache", action="store_true", help="Run without the translation and explanation caches")
+    parser.add_argument("--deepl-url", default=DEEPL_API_URL)
+    parser.add_argument("--openai-url", help="OpenAI-compatible base URL (default: the OpenAI API)")
+    parser.add_argument("--profile", metavar="PATH", help="Write per-stage timing spans to PATH")
+    parser.add_argument("--usage", metavar="PATH", help="Write token counts and latency of every chat request to PATH on exit")
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        profiling.enable(args.profile)
+    else:
+        profiling.enable_from_env()
+
+    from env import DEEPL_ACCESS_KEY, OPENAI_API_KEY
+
+    ai_service = AIService(
+        OPENAI_API_KEY,
+        explanation_cache=None if args.no_cache else ExplanationCache(),
+        openai_base_url=args.openai_url,
+    )
+    # DeepL connections and hedged calls are sized for every provider worker, so neither becomes the bottleneck
+    translator = TranslationService(
+        DEEPL_ACCESS_KEY,
+        args.deepl_url,
+        cache=None if args.no_cache else TranslationCache(),
+        session=PooledSession(pool_maxsize=args.workers),
+        hedger=Hedger(workers=2 * args.workers),
+        fallback=ai_service.translate_text,
+        phrases=PhraseTable.open_default(),
+    )
+    threading.Thread(target=translator.load_memory, name="translation-memory", daemon=True).start()
+    server = AssistantServer(
+        translator,
+        ai_service,
+        max_sessions=args.max_sessions,
+        workers=args.workers,
+        max_active_turns=args.max_active,
+        session_max_tokens=args.session_max_tokens,
+    )
+
+    async def serve() -> None:
+        host, port = await server.start(args.host, args.port)
+        print(f"***   Listening on http://{host}:{port}", flush=True)
+        await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        print("\n***   Shutting down")
+    finally:
+        server.close()
+        if args.usage:
+            ai_service.ledger.dump(args.usage)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,306 @@
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, List, Dict, Any, Tuple
+from urllib.parse import parse_qs, urlparse
+
+# Constants
+STUB_PCM_SAMPLE_RATE = 22050  # Matches the pcm_22050 text-to-speech format
+STUB_SPEECH_SECONDS_PER_CHAR = 0.06  # Length of the fake speech returned per character of text
+STUB_AUDIO_CHUNK_BYTES = 4096
+STUB_TRANSCRIPTION = "Hola, me llamo Ana y quiero practicar mi español."
+STUB_REPLY = (
+    "¡Muy bien! Tu frase es correcta. ¿Qué te gusta hacer los fines de semana? "
+    "Yo prefiero pasear por el parque y leer un buen libro."
+)
+STUB_CACHE_MIN_TOKENS = 1024  # Like OpenAI, only prompts of at least this many tokens are cached...
+STUB_CACHE_INCREMENT = 128  # ...and cache hits are counted in blocks of this many tokens
+
+
+@dataclass
+class StubConfig:
+    """Latency and failure behaviour of one emulated provider"""
+
+    latency: float = 0.05  # Mean seconds before the first byte of a response
+    jitter: float = 0.01  # Standard deviation of the latency
+    tail_rate: float = 0.0  # Probability of a slow response, emulating a provider's latency tail
+    tail_latency: float = 1.0  # Extra seconds added to slow responses
+    error_rate: float = 0.0  # Probability of answering with an error instead
+    error_status: int = 503
+    retry_after: Optional[float] = None  # Sent with error responses when set
+    token_interval: float = 0.005  # Seconds between streamed chat tokens or audio chunks
+    requests_per_second: Optional[float] = None  # Throttle with 429s above this rate (one second of burst)
+    tokens_per_minute: Optional[int] = None  # Advertised alongside the request limit, but not enforced
+    prompt_cache: bool = True  # Report cached_tokens for chat prompts that repeat an earlier request's prefix
+    requests: int = 0
+    errors: int = 0
+    throttled: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    _allowance: Optional[float] = field(default=None, repr=False)
+    _allowance_at: float = field(default=0.0, repr=False)
+    _prefixes: set = field(default_factory=set, repr=False)  # Hashes of chat message prefixes already sent
+
+    def cached_tokens(self, messages: List[Dict[str, Any]], token_counts: List[int]) -> int:
+        """Tokens of the longest message prefix seen in an earlier request, rounded as provider prompt caches do"""
+        if not self.prompt_cache:
+            return 0
+        digest = hashlib.sha256()
+        cached = total = 0
+        with self.lock:
+            for message, tokens in zip(messages, token_counts):
+                digest.update(json.dumps(message, sort_keys=True).encode("utf-8"))
+                total += tokens
+                key = digest.copy().digest()
+                if key in self._prefixes:
+                    cached = total
+                self._prefixes.add(key)
+        if cached < STUB_CACHE_MIN_TOKENS:
+            return 0
+        return cached - cached % STUB_CACHE_INCREMENT
+
+    def delay(self) -> None:
+        delay = max(0.0, random.gauss(self.latency, self.jitter))
+        if self.tail_rate and random.random() < self.tail_rate:
+            delay += self.tail_latency
+        time.sleep(delay)
+
+    def rate_limit(self) -> Tuple[bool, Dict[str, str]]:
+        """Check the request budget, returning whether to throttle and the x-ratelimit headers to send"""
+        if self.requests_per_second is None:
+            return False, {}
+        with self.lock:
+            now = time.monotonic()
+            if self._allowance is None:
+                self._allowance = self.requests_per_second
+            else:
+                elapsed = now - self._allowance_at
+                self._allowance = min(self.requests_per_second, self._allowance + elapsed * self.requests_per_second)
+            self._allowance_at = now
+
+            throttled = self._allowance < 1
+            if throttled:
+                self.throttled += 1
+            else:
+                self._allowance -= 1
+            reset = max(0.0, (1 - self._allowance) / self.requests_per_second)
+            headers = {
+                "x-ratelimit-limit-requests": str(int(self.requests_per_second * 60)),
+                "x-ratelimit-remaining-requests": str(int(self._allowance)),
+                "x-ratelimit-reset-requests": f"{reset:.3f}s",
+            }
+            if self.tokens_per_minute:
+                headers["x-ratelimit-limit-tokens"] = str(self.tokens_per_minute)
+            if throttled:
+                headers["Retry-After"] = f"{reset:.3f}"
+            return throttled, headers
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            self.requests += 1
+            fail = random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+            return fail
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    """Threaded server that treats clients dropping pooled keep-alive connections as normal"""
+
+    daemon_threads = True
+
+    def handle_error(self, request: Any, client_address: Any) -> None:
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class ProviderStubServer:
+    """Local HTTP server emulating the DeepL, OpenAI (chat and transcriptions) and ElevenLabs endpoints"""
+
+    def __init__(
+        self,
+        deepl: Optional[StubConfig] = None,
+        openai: Optional[StubConfig] = None,
+        elevenlabs: Optional[StubConfig] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.configs = {
+            "deepl": deepl or StubConfig(),
+            "openai": openai or StubConfig(),
+            "elevenlabs": elevenlabs or StubConfig(),
+        }
+        handler = type("BoundStubHandler", (StubHandler,), {"configs": self.configs})
+        self.server = StubHTTPServer((host, port), handler)
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def deepl_url(self) -> str:
+        return f"{self.url}/v2/translate"
+
+    @property
+    def openai_url(self) -> str:
+        return f"{self.url}/v1"
+
+    @property
+    def elevenlabs_url(self) -> str:
+        return self.url
+
+    def start(self) -> "ProviderStubServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            name: {"requests": config.requests, "errors": config.errors, "throttled": config.throttled}
+            for name, config in self.configs.items()
+        }
+
+    def __enter__(self) -> "ProviderStubServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Request handler shared by every emulated provider"""
+
+    protocol_version = "HTTP/1.1"  # Keep-alive, so connection pooling behaves as it would in production
+    configs: Dict[str, StubConfig] = {}
+    extra_headers: Dict[str, str] = {}
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        path = urlparse(self.path).path
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.extra_headers = {}
+
+        if path.endswith("/v2/translate"):
+            provider, respond = "deepl", self._translate
+        elif path.endswith("/chat/completions"):
+            provider, respond = "openai", self._chat
+        elif path.endswith("/audio/transcriptions"):
+            provider, respond = "openai", self._transcribe
+        elif re.search(r"/v1/text-to-speech/[^/]+(/stream)?$", path):
+            provider, respond = "elevenlabs", self._speech
+        else:
+            self._send_json(404, {"error": "not found"})
+            return
+
+        config = self.configs[provider]
+        throttled, self.extra_headers = config.rate_limit()
+        if throttled:
+            self._send_json(429, {"error": {"message": "rate limited", "type": "rate_limit_exceeded"}})
+            return
+        config.delay()
+        if config.should_fail():
+            headers = {"Retry-After": str(config.retry_after)} if config.retry_after is not None else {}
+            self._send_json(config.error_status, {"error": {"message": "stub failure"}}, headers)
+            return
+        respond(body, config)
+
+    def _translate(self, body: bytes, config: StubConfig) -> None:
+        texts = parse_qs(body.decode("utf-8")).get("text", [])
+        self._send_json(200, {"translations": [{"detected_source_language": "ES", "text": f"[EN] {text}"} for text in texts]})
+
+    def _chat(self, body: bytes, config: StubConfig) -> None:
+        request = json.loads(body or b"{}")
+        messages = request.get("messages", [])
+        token_counts = [len(str(message.get("content", ""))) // 4 for message in messages]
+        prompt_tokens = sum(token_counts)
+        words = STUB_REPLY.split(" ")
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(words),
+            "total_tokens": prompt_tokens + len(words),
+            "prompt_tokens_details": {"cached_tokens": config.cached_tokens(messages, token_counts)},
+        }
+
+        if not request.get("stream"):
+            self._send_json(200, {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "stub"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": STUB_REPLY}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        self._start_chunked(200, "text/event-stream")
+        for index, word in enumerate(words):
+            delta = {"content": word if index == 0 else " " + word}
+            self._write_event(self._chat_chunk(request, [{"index": 0, "delta": delta, "finish_reason": None}]))
+            time.sleep(config.token_interval)
+        self._write_event(self._chat_chunk(request, [{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+        if (request.get("stream_options") or {}).get("include_usage"):
+            self._write_event(self._chat_chunk(request, [], usage))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _transcribe(self, body: bytes, config: StubConfig) -> None:
+        self._send_json(200, {"text": STUB_TRANSCRIPTION})
+
+    def _speech(self, body: bytes, config: StubConfig) -> None:
+        text = json.loads(body or b"{}").get("text", "")
+        remaining = int(len(text) * STUB_SPEECH_SECONDS_PER_CHAR * STUB_PCM_SAMPLE_RATE) * 2
+        self._start_chunked(200, "audio/pcm")
+        while remaining > 0:
+            size = min(STUB_AUDIO_CHUNK_BYTES, remaining)
+            self._write_chunk(b"\x00" * size)
+            remaining -= size
+            time.sleep(config.token_interval)
+        self._write_chunk(b"")
+
+    @staticmethod
+    def _chat_chunk(request: Dict[str, Any], choices: List[Dict[str, Any]], usage: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+        return {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": choices,
+            "usage": usage,
+        }
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in {**self.extra_headers, **(headers or {})}.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_chunked(self, status: int, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        for name, value in self.extra_headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _write_event(self, payload: Dict[str, Any]) -> None:
+        self._write_chunk(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
@@ -0,0 +1,99 @@
+from typing import Any, List
+
+import numpy as np
+import pytest
+
+from audio import SAMPLE_RATE, VAD_PADDING_MS, StreamRecorder, VoiceActivityDetector, callback_stop, trim_silence
+
+RNG = np.random.default_rng(0)
+
+
+def silence(seconds: float) -> np.ndarray:
+    """Low background noise, well under VAD_MIN_RMS"""
+    return RNG.normal(0, 30, int(seconds * SAMPLE_RATE)).astype(np.int16)
+
+
+def speech(seconds: float) -> np.ndarray:
+    """A loud voiced tone standing in for speech"""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (8000 * np.sin(2 * np.pi * 220 * t)).astype(np.int16)
+
+
+class FakeInputStream:
+    def __init__(self, **kwargs: Any):
+        pass
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def test_trim_silence_of_silence_is_empty():
+    assert len(trim_silence(silence(2.0), SAMPLE_RATE)) == 0
+
+
+def test_trim_silence_keeps_speech_and_padding():
+    samples = np.concatenate((silence(1.0), speech(0.5), silence(1.0)))
+
+    trimmed = trim_silence(samples, SAMPLE_RATE)
+
+    padding = VAD_PADDING_MS / 1000
+    assert len(trimmed) / SAMPLE_RATE == pytest.approx(0.5 + 2 * padding, abs=0.07)
+    assert trimmed.max() >= 7900
+
+
+def test_detector_ignores_silence():
+    vad = VoiceActivityDetector(SAMPLE_RATE)
+
+    mask = vad.feed(silence(2.0))
+
+    assert len(mask) > 0 and not mask.any()
+    assert not vad.speech_detected
+
+
+def test_detector_measures_trailing_silence():
+    vad = VoiceActivityDetector(SAMPLE_RATE)
+    vad.feed(silence(0.5))
+    vad.feed(speech(0.5))
+    vad.feed(silence(0.9))
+
+    assert vad.speech_detected
+    assert vad.trailing_silence == pytest.approx(0.9, abs=0.06)
+
+
+def record(recorder: StreamRecorder, chunks: List[np.ndarray], chunk_seconds: float = 0.1) -> bool:
+    """Feed audio through the recorder callback in small blocks, returning whether the recorder stopped itself"""
+    stop = type(callback_stop())
+    block = int(chunk_seconds * SAMPLE_RATE)
+    samples = np.concatenate(chunks)
+    recorder.start()
+    for offset in range(0, len(samples), block):
+        indata = samples[offset:offset + block].reshape(-1, 1)
+        try:
+            recorder._callback(indata, len(indata), None, None)
+        except stop:
+            return True
+    return False
+
+
+def test_auto_stop_fires_after_trailing_silence():
+    recorder = StreamRecorder(SAMPLE_RATE, max_seconds=10, stream_factory=FakeInputStream, auto_stop_silence=1.0)
+
+    assert record(recorder, [silence(0.5), speech(1.0), silence(3.0)])
+
+    assert recorder.finished.is_set()
+    assert recorder.seconds == pytest.approx(0.5 + 1.0 + 1.0, abs=0.15)
+
+
+def test_auto_stop_waits_for_speech():
+    recorder = StreamRecorder(SAMPLE_RATE, max_seconds=10, stream_factory=FakeInputStream, auto_stop_silence=1.0)
+
+    assert not record(recorder, [silence(3.0)])
+
+    assert not recorder.finished.is_set()
+    assert recorder.seconds == pytest.approx(3.0)
@@ -0,0 +1,120 @@
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+from context import ConversationContext, WINDOW_SLACK, count_message_tokens
+
+
+def total_tokens(messages: List[Dict[str, str]]) -> int:
+    return sum(count_message_tokens(message) for message in messages)
+
+
+def never_summarize(summary: Optional[str], messages: List[Dict[str, str]]) -> Optional[str]:
+    return None
+
+
+class ImmediateExecutor:
+    """Runs each task as it is submitted, so its future is already done when callbacks are added"""
+
+    def submit(self, function: Callable[..., Any], *args: Any) -> Future:
+        future: Future = Future()
+        future.set_result(function(*args))
+        return future
+
+
+def test_messages_stay_within_the_budget():
+    context = ConversationContext("Eres un tutor de español.", never_summarize, token_budget=300)
+    try:
+        for turn in range(40):
+            new = [{"role": "user", "content": f"Pregunta número {turn} sobre la gramática del subjuntivo."}]
+            messages = context.messages(new)
+            assert total_tokens(messages) <= 300
+            assert messages[0]["role"] == "system" and messages[-1] == new[0]
+            context.add("user", new[0]["content"])
+            context.add("assistant", f"Respuesta número {turn}, con un ejemplo y una explicación breve.")
+    finally:
+        context.close()
+
+
+def test_window_moves_in_steps_so_the_prefix_is_usually_unchanged():
+    context = ConversationContext("Eres un tutor de español.", never_summarize, token_budget=400)
+    try:
+        previous: List[Dict[str, str]] = []
+        moves = 0
+        for turn in range(60):
+            new = [{"role": "user", "content": f"Frase {turn}: ¿cómo se dice esto en inglés?"}]
+            messages = context.messages(new)[:-1]
+            if messages[: len(previous)] != previous:
+                moves += 1
+                # When the window moves it frees WINDOW_SLACK of the budget, not just one message
+                assert total_tokens(messages + new) <= 400 * (1 - WINDOW_SLACK)
+            previous = messages
+            context.add("user", new[0]["content"])
+            context.add("assistant", f"Traducción de la frase {turn}.")
+        assert 0 < moves < 60 // 4
+    finally:
+        context.close()
+
+
+def test_trim_drops_the_oldest_messages_first():
+    context = ConversationContext("Sistema.", never_summarize, token_budget=10_000)
+    try:
+        for index in range(10):
+            context.add("user", f"mensaje {index}")
+        before = context.token_count()
+
+        dropped = context.trim(before - 1)
+
+        assert dropped >= 1
+        assert context.token_count() <= before - 1
+        assert context.messages()[1]["content"] == f"mensaje {dropped}"
+    finally:
+        context.close()
+
+
+def test_summary_of_trimmed_messages_is_discarded():
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_summary(summary: Optional[str], messages: List[Dict[str, str]]) -> Optional[str]:
+        started.set()
+        release.wait(5)
+        return "resumen antiguo"
+
+    context = ConversationContext("Sistema.", slow_summary, token_budget=60, keep_recent=2)
+    try:
+        for index in range(8):
+            context.add("user", f"mensaje número {index}")
+        assert started.wait(5)
+
+        assert context.trim(context.token_count() // 2) > 0
+        remaining = context.messages()
+        release.set()
+        # The executor has a single thread, so this runs after the stale summary has been handled
+        context._executor.submit(lambda: None).result(5)
+
+        assert context.summary is None
+        assert context.messages() == remaining
+    finally:
+        release.set()
+        context.close()
+
+
+def test_summary_that_finishes_at_once_is_applied():
+    context = ConversationContext(
+        "Sistema.", lambda summary, messages: "resumen", token_budget=40, keep_recent=1, executor=ImmediateExecutor()
+    )
+    adding = threading.Thread(
+        target=lambda: [context.add("user", f"mensaje número {index}") for index in range(6)], daemon=True
+    )
+    adding.start()
+    adding.join(5)
+    try:
+        assert not adding.is_alive(), "add() deadlocked applying a finished summary"
+        assert context.summary == "resumen"
+        messages = context.messages()
+        assert messages[1]["content"].endswith("resumen")
+        assert messages[-1]["content"] == "mensaje número 5"
+        assert total_tokens(messages) <= 40
+    finally:
+        context.close()
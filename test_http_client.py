@@ -0,0 +1,31 @@
+import pytest
+import requests
+
+from http_client import PooledSession
+from stubs import ProviderStubServer, StubConfig
+
+
+def test_post_is_not_resent_after_a_read_timeout():
+    with ProviderStubServer(deepl=StubConfig(latency=0.5)) as server:
+        session = PooledSession(timeout=(1.0, 0.1), backoff_base=0.01)
+        try:
+            with pytest.raises(requests.ReadTimeout):
+                session.post(server.deepl_url, data={"text": "hola"})
+        finally:
+            session.close()
+
+        assert session.requests_sent == 1
+        assert session.retries == 0
+
+
+def test_server_errors_are_retried():
+    with ProviderStubServer(deepl=StubConfig(error_rate=1.0, error_status=503)) as server:
+        session = PooledSession(max_retries=2, backoff_base=0.01)
+        try:
+            response = session.post(server.deepl_url, data={"text": "hola"})
+        finally:
+            session.close()
+
+        assert response.status_code == 503
+        assert session.retries == 2
+        assert server.stats()["deepl"]["requests"] == 3
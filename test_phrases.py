@@ -0,0 +1,33 @@
+from phrases import PhraseTable, build_index, phrase_key
+
+
+def test_phrase_key_keeps_the_tilde_of_n():
+    assert phrase_key("año") != phrase_key("ano")
+    assert phrase_key("AÑO") == phrase_key("año")
+    # Decomposed input (n + combining tilde) is still ñ
+    assert phrase_key("an\u0303o") == phrase_key("año")
+
+
+def test_phrase_key_folds_other_accents():
+    assert phrase_key("¿Cómo estás?") == phrase_key("como  estas") == "como estas"
+    assert phrase_key("pingüino") == "pinguino"
+    assert phrase_key("sí", fold_accents=False) != phrase_key("si", fold_accents=False)
+
+
+def test_lookup_prefers_exact_accents_and_reports_collisions(tmp_path):
+    path = str(tmp_path / "phrases.idx")
+    pairs = [("año", "year"), ("ano", "anus"), ("sí", "yes"), ("si", "if"), ("¿Cómo estás?", "How are you?")]
+
+    stats = build_index(pairs, path)
+    table = PhraseTable(path)
+    try:
+        assert table.lookup("Año") == "year"
+        assert table.lookup("ano") == "anus"
+        assert table.lookup("como estas") == "How are you?"
+        assert table.lookup("sí") == "yes" and table.lookup("si") == "if"
+        assert table.lookup("sï") is None  # Folds to both sí and si, so it matches neither
+    finally:
+        table.close()
+
+    assert stats["accent_collisions"] == 1
+    assert stats["collision_examples"] == ["sí / si"]
@@ -0,0 +1,118 @@
+import time
+from typing import Any, Iterator, List, Optional
+
+from audio import PLAYBACK_SAMPLE_RATE, SAMPLE_WIDTH, NullOutputStream, StreamPlayer
+from pipeline import IncrementalTranscriber, SpeechPipeline
+
+CHUNK_FRAMES = PLAYBACK_SAMPLE_RATE // 10  # 100 ms of audio per synthesized chunk
+
+
+def prepare(segment: str) -> Optional[str]:
+    """Silent segments have nothing to upload"""
+    return None if segment == "silencio" else segment
+
+
+def transcribe(upload: str) -> Optional[str]:
+    """Fails on the segment called "fallo", like transcribe_audio after an API error"""
+    return None if upload == "fallo" else f" {upload} "
+
+
+def transcribe_all(*segments: str) -> Optional[str]:
+    transcriber = IncrementalTranscriber(prepare, transcribe)
+    for segment in segments:
+        transcriber.submit(segment)
+    return transcriber.result()
+
+
+def test_segments_are_joined_in_order_and_silence_is_skipped():
+    assert transcribe_all("hola", "silencio", "qué", "tal") == "hola qué tal"
+
+
+def test_only_silence_gives_no_transcript():
+    assert transcribe_all("silencio", "silencio") is None
+
+
+def test_a_failed_segment_fails_the_whole_transcript():
+    assert transcribe_all("hola", "fallo", "tal") is None
+
+
+class NullPlayer(StreamPlayer):
+    """StreamPlayer on the null output device, keeping every stream it opened"""
+
+    def __init__(self, realtime: bool = False):
+        self.streams: List[NullOutputStream] = []
+
+        def open_stream(**kwargs: Any) -> NullOutputStream:
+            self.streams.append(NullOutputStream(realtime=realtime, **kwargs))
+            return self.streams[-1]
+
+        super().__init__(stream_factory=open_stream)
+
+    @property
+    def frames_written(self) -> int:
+        return sum(stream.frames_written for stream in self.streams)
+
+
+def synthesize(sentence: str) -> Iterator[bytes]:
+    """One 100 ms chunk per word; the sentence "mal" fails halfway, like a dropped TTS stream"""
+    for index, word in enumerate(sentence.split()):
+        if word == "mal" and index:
+            raise ConnectionError("stream reset")
+        # Odd chunk sizes split samples across chunks, as network reads do
+        yield b"\0" * (CHUNK_FRAMES * SAMPLE_WIDTH - 1)
+        yield b"\0"
+
+
+def test_sentences_are_played_in_full():
+    player = NullPlayer()
+    speech = SpeechPipeline(synthesize, player.play)
+    speech.add_sentence("Hola, ¿qué tal?")
+    speech.add_sentence("Muy bien, gracias por preguntar.")
+    speech.finish()
+
+    assert speech.done.wait(5)
+    assert speech.error is None
+    assert player.frames_written == (3 + 5) * CHUNK_FRAMES
+    assert len(player.streams) == 2
+    assert speech.time_to_first_audio is not None
+
+
+def test_cancel_cuts_off_playback():
+    player = NullPlayer(realtime=True)
+    speech = SpeechPipeline(synthesize, player.play)
+    speech.add_sentence(" ".join(["palabra"] * 50))  # Five seconds of audio
+    speech.finish()
+
+    deadline = time.monotonic() + 5
+    while speech.first_audio_at is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    speech.cancel()
+
+    assert speech.done.wait(1)
+    assert 0 < player.frames_written < 50 * CHUNK_FRAMES
+
+
+def test_failed_sentence_is_skipped():
+    player = NullPlayer()
+    speech = SpeechPipeline(synthesize, player.play)
+    speech.add_sentence("Esto va mal")
+    speech.add_sentence("Pero esto sigue")
+    speech.finish()
+
+    assert speech.done.wait(5)
+    assert speech.error is None
+    # The failed sentence plays what was synthesized before the error, then the next sentence plays in full
+    assert player.frames_written == (2 + 3) * CHUNK_FRAMES
+
+
+def test_missing_output_device_stops_the_pipeline():
+    def no_device(**kwargs: Any) -> NullOutputStream:
+        raise OSError("PortAudio library not found")
+
+    speech = SpeechPipeline(synthesize, StreamPlayer(stream_factory=no_device).play)
+    speech.add_sentence("Hola")
+    speech.add_sentence("Adiós")
+    speech.finish()
+
+    assert speech.done.wait(5)
+    assert isinstance(speech.error, OSError)
@@ -0,0 +1,116 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import ratelimit
+from http_client import PooledSession
+from ratelimit import DECREASE_COOLDOWN, DECREASE_FACTOR, INCREASE_STEP, RateLimiter
+from stubs import ProviderStubServer, StubConfig
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit, "time", SimpleNamespace(monotonic=clock.monotonic, sleep=clock.advance))
+    return clock
+
+
+def test_throttling_halves_the_rate_once_per_cooldown(clock):
+    limiter = RateLimiter("test", 600)
+
+    limiter.record_response(429)
+    limiter.record_response(429)  # Another request that was already in flight
+
+    assert limiter.rate_factor == DECREASE_FACTOR
+    assert limiter.throttled == 2
+
+    clock.advance(DECREASE_COOLDOWN)
+    limiter.record_response(429)
+    assert limiter.rate_factor == DECREASE_FACTOR ** 2
+    assert limiter.stats()["requests_per_minute"] == 600 * DECREASE_FACTOR ** 2
+
+
+def test_successes_restore_the_rate_additively(clock):
+    limiter = RateLimiter("test", 600)
+    limiter.throttle()
+
+    limiter.record_response(200)
+    assert limiter.rate_factor == pytest.approx(DECREASE_FACTOR + INCREASE_STEP)
+
+    for _ in range(int(1 / INCREASE_STEP)):
+        limiter.record_response(200)
+    assert limiter.rate_factor == 1.0
+
+
+def test_retry_after_pauses_every_request(clock):
+    limiter = RateLimiter("test", 6000)
+
+    limiter.record_response(429, {"Retry-After": "3"})
+
+    assert limiter.reserve() == pytest.approx(3.0)
+    clock.advance(3.0)
+    assert limiter.reserve() == 0.0
+
+
+def test_exhausted_advertised_budget_pauses_until_reset(clock):
+    limiter = RateLimiter("test", 6000)
+
+    limiter.record_response(
+        200,
+        {"x-ratelimit-limit-requests": "120", "x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "1.5s"},
+    )
+
+    assert limiter.request_limit == 120
+    assert limiter.reserve() == pytest.approx(1.5)
+
+
+def test_limiter_learns_the_limit_of_a_throttling_stub():
+    with ProviderStubServer(deepl=StubConfig(latency=0.0, jitter=0.0, requests_per_second=10)) as server:
+        # Starts far above what the stub allows, so it has to learn the limit from the response headers
+        limiter = RateLimiter("deepl", 60_000)
+        session = PooledSession(backoff_base=0.01)
+        try:
+            started = time.monotonic()
+            statuses = [
+                session.post(server.deepl_url, limiter=limiter, data={"text": "hola"}).status_code for _ in range(30)
+            ]
+            elapsed = time.monotonic() - started
+        finally:
+            session.close()
+        throttled = server.stats()["deepl"]["throttled"]
+
+    assert statuses == [200] * 30
+    assert limiter.request_limit == 600  # Adopted from x-ratelimit-limit-requests
+    assert throttled <= 1
+    # Ten requests of burst, then the remaining twenty paced at (at most) ten per second
+    assert elapsed >= 1.5
+
+
+def test_stub_429s_slow_the_limiter_and_retry_after_is_waited_out():
+    config = StubConfig(latency=0.0, jitter=0.0, error_rate=1.0, error_status=429, retry_after=0.3)
+    with ProviderStubServer(deepl=config) as server:
+        limiter = RateLimiter("deepl", 60_000)
+        session = PooledSession(max_retries=2)
+        try:
+            started = time.monotonic()
+            response = session.post(server.deepl_url, limiter=limiter, data={"text": "hola"})
+            elapsed = time.monotonic() - started
+        finally:
+            session.close()
+
+    assert response.status_code == 429
+    assert limiter.throttled == 3
+    assert limiter.rate_factor == DECREASE_FACTOR  # Three 429s within the cooldown count as one signal
+    assert elapsed >= 2 * 0.3
@@ -0,0 +1,82 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from server import HTTPError, Session, _Admission
+
+
+def make_server(**kwargs):
+    return SimpleNamespace(**{"active": 0, "rejected": 0, "max_active_turns": 10, "session_queue_limit": 2, **kwargs})
+
+
+def test_only_requests_queued_on_the_session_lock_are_counted():
+    async def scenario():
+        server = make_server()
+        session = Session("s", context=None)
+        release = asyncio.Event()
+
+        async def turn():
+            async with _Admission(server, session):
+                await release.wait()
+
+        running = asyncio.ensure_future(turn())
+        await asyncio.sleep(0)
+        queued = [asyncio.ensure_future(turn()) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert session.waiting == 2
+
+        # Requests without a session (translations) neither wait nor count
+        async with _Admission(server, None):
+            assert session.waiting == 2
+        with pytest.raises(HTTPError):
+            async with _Admission(server, session):
+                pass
+        assert server.rejected == 1
+
+        # Once the running turn finishes, the next one stops counting as waiting
+        release.set()
+        await asyncio.gather(running, *queued)
+        assert session.waiting == 0
+        assert server.active == 0
+        assert not session.lock.locked()
+
+    asyncio.run(scenario())
+
+
+def test_next_turn_is_not_counted_once_it_runs():
+    async def scenario():
+        server = make_server(session_queue_limit=1)
+        session = Session("s", context=None)
+        first_done = asyncio.Event()
+        second_running = asyncio.Event()
+        finish = asyncio.Event()
+
+        async def first():
+            async with _Admission(server, session):
+                await first_done.wait()
+
+        async def second():
+            async with _Admission(server, session):
+                second_running.set()
+                await finish.wait()
+
+        tasks = [asyncio.ensure_future(first())]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.ensure_future(second()))
+        await asyncio.sleep(0)
+        assert session.waiting == 1
+
+        first_done.set()
+        await second_running.wait()
+        assert session.waiting == 0
+        # A third request may now queue behind the running second one
+        tasks.append(asyncio.ensure_future(first()))
+        await asyncio.sleep(0)
+        assert session.waiting == 1
+
+        finish.set()
+        await asyncio.gather(*tasks)
+        assert server.active == 0
+
+    asyncio.run(scenario())
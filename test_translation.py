@@ -0,0 +1,128 @@
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote_plus
+
+import pytest
+
+from cache import TranslationCache
+from ratelimit import RateLimiter
+from stubs import ProviderStubServer
+from translation import TranslationService, DEEPL_MAX_TEXTS_PER_REQUEST, DEEPL_MAX_REQUEST_BYTES
+
+
+class FakeSession:
+    """Stands in for PooledSession: answers like DeepL and records every batch it was sent"""
+
+    def __init__(self, rejected: Optional[List[str]] = None, status: int = 400):
+        self.rejected = rejected or []
+        self.status = status
+        self.batches: List[List[str]] = []
+
+    def post(self, url: str, limiter: Any = None, **kwargs: Any) -> SimpleNamespace:
+        texts = list(kwargs["data"]["text"])
+        self.batches.append(texts)
+        if any(text in self.rejected for text in texts):
+            return SimpleNamespace(status_code=self.status, reason="Rejected", request=SimpleNamespace(body=b""), content=b"")
+        payload: Dict[str, Any] = {"translations": [{"text": f"[EN] {text}"} for text in texts]}
+        return SimpleNamespace(
+            status_code=200, reason="OK", request=SimpleNamespace(body=b""), content=b"", json=lambda: payload
+        )
+
+
+def make_service(session: Any, **kwargs: Any) -> TranslationService:
+    return TranslationService("test-key", session=session, limiter=RateLimiter("deepl", 60_000), **kwargs)
+
+
+def test_duplicates_are_sent_once_and_answered_in_input_order():
+    session = FakeSession()
+    texts = ["hola", "adiós", "hola", "", "gracias", "adiós"]
+
+    results = make_service(session).translate_many(texts)
+
+    assert results == ["[EN] hola", "[EN] adiós", "[EN] hola", "", "[EN] gracias", "[EN] adiós"]
+    assert session.batches == [["hola", "adiós", "gracias"]]
+
+
+def test_batches_hold_at_most_the_text_limit():
+    session = FakeSession()
+    texts = [f"frase {i}" for i in range(2 * DEEPL_MAX_TEXTS_PER_REQUEST + 1)]
+
+    results = make_service(session).translate_many(texts)
+
+    assert results == [f"[EN] {text}" for text in texts]
+    assert [len(batch) for batch in session.batches] == [DEEPL_MAX_TEXTS_PER_REQUEST, DEEPL_MAX_TEXTS_PER_REQUEST, 1]
+
+
+def test_batches_stay_under_the_request_size_limit():
+    service = make_service(FakeSession())
+    # Each text encodes to about a fifth of the limit, so no more than four fit in one request
+    texts = [f"{i} " + "ñ" * (DEEPL_MAX_REQUEST_BYTES // 30) for i in range(10)]
+
+    batches = service._pack_batches(texts)
+
+    assert [text for batch in batches for text in batch] == texts
+    assert len(batches) > 2
+    for batch in batches:
+        body = "target_lang=XX-XX&source_lang=XX" + "".join("&text=" + quote_plus(text) for text in batch)
+        assert len(body) <= DEEPL_MAX_REQUEST_BYTES
+
+
+def test_oversized_text_gets_a_batch_of_its_own():
+    service = make_service(FakeSession())
+    huge = "a" * (DEEPL_MAX_REQUEST_BYTES + 1)
+
+    assert service._pack_batches(["uno", huge, "dos"]) == [["uno"], [huge], ["dos"]]
+
+
+@pytest.mark.parametrize("status", [400, 413, 414])
+def test_rejected_batch_is_bisected_down_to_the_bad_text(status):
+    session = FakeSession(rejected=["malo"], status=status)
+    texts = ["uno", "dos", "tres", "malo", "cinco", "seis", "siete"]
+
+    results = make_service(session).translate_many(texts)
+
+    assert results == ["[EN] uno", "[EN] dos", "[EN] tres", None, "[EN] cinco", "[EN] seis", "[EN] siete"]
+    assert ["malo"] in session.batches
+    # Halves without the bad text are sent once and not split any further
+    assert len(session.batches) < 2 * len(texts)
+
+
+def test_server_errors_are_not_bisected():
+    session = FakeSession(rejected=["malo"], status=503)
+
+    results = make_service(session).translate_many(["uno", "malo", "tres"])
+
+    assert results == [None, None, None]
+    assert len(session.batches) == 1
+
+
+def test_hedged_translate_looks_up_the_cache_once():
+    session = FakeSession()
+    cache = TranslationCache(":memory:")
+    service = make_service(session, cache=cache, fallback=lambda text, source, target, cancel: None)
+    try:
+        assert service.translate("buenos días") == "[EN] buenos días"
+        assert cache.stats()["misses"] == 1
+        assert service.translate("buenos días") == "[EN] buenos días"
+        assert cache.stats()["hits"] == 1
+        assert len(session.batches) == 1
+    finally:
+        cache.close()
+
+
+def test_translate_many_against_the_provider_stub():
+    from http_client import PooledSession
+
+    with ProviderStubServer() as server:
+        session = PooledSession()
+        try:
+            service = TranslationService(
+                "test-key", api_url=server.deepl_url, session=session, limiter=RateLimiter("deepl", 60_000)
+            )
+            results = service.translate_many(["¿Qué tal?", "bien", "¿Qué tal?"])
+        finally:
+            session.close()
+        requests_sent = server.stats()["deepl"]["requests"]
+
+    assert results == ["[EN] ¿Qué tal?", "[EN] bien", "[EN] ¿Qué tal?"]
+    assert requests_sent == 1
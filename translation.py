@@ -1,30 +1,63 @@
+from __future__ import annotations
+
 from env import DEEPL_ACCESS_KEY, OPENAI_API_KEY, ELEVEN_LABS_API_KEY
-import requests
+import io
 import os
-import time
+import shutil
 import warnings
 import tempfile
+import queue
+import random
 import threading
+import time
 import traceback
-from typing import Optional, List, Dict, Any
-
-import sounddevice as sd
-from scipy.io.wavfile import write
-import numpy as np
-from openai import OpenAI
-from elevenlabs.client import ElevenLabs
-from elevenlabs import VoiceSettings
-
-
-from prompts import CONVO_PROMPT, TEXT_PROMPT
+import argparse
+from typing import Optional, List, Dict, Any, Tuple, Iterator, Union, BinaryIO, Callable, TYPE_CHECKING
+from urllib.parse import quote_plus
+
+# Heavy dependencies (numpy, sounddevice, scipy, openai, elevenlabs, requests) are imported
+# on first use by the mode that needs them, so a text-only session starts quickly.
+import profiling
+from ratelimit import RateLimiter, get_limiter, estimate_chat_tokens
+from prompts import CONVO_PROMPT, TEXT_PROMPT, SUMMARY_PROMPT, TRANSLATE_PROMPT
+from hedging import Hedger
+from context import ConversationContext
+from cache import TranslationCache, ExplanationCache, AudioCache
+from phrases import PhraseTable
+from usage import UsageLedger, DEFAULT_USAGE_PATH, usage_tokens
+from pipeline import TurnScheduler, TurnCancelled, SentenceSplitter, SpeechPipeline, IncrementalTranscriber, Speculator
+
+if TYPE_CHECKING:
+    import numpy as np
+    from audio import StreamPlayer
+    from http_client import PooledSession
+    from translation_memory import TranslationMemory, MemoryMatch
 
 # Constants
 DEEPL_API_URL = "https://api-free.deepl.com/v2/translate"
+DEEPL_MAX_TEXTS_PER_REQUEST = 50  # DeepL accepts at most 50 texts per request
+DEEPL_MAX_REQUEST_BYTES = 128 * 1024  # DeepL rejects request bodies above 128 KiB
 OPENAI_TEXT_MODEL = "gpt-4o-mini"
 OPENAI_AUDIO_MODEL = "whisper-1"
 MAX_TOKENS = 1500
+SUMMARY_MAX_TOKENS = 300  # Length limit for the running conversation summary
+COMPLETION_FALLBACK = "Could not generate explanation."
+TRANSLATE_MAX_TOKENS = 500  # Length limit for fallback translations from the chat model
+LANGUAGE_NAMES = {"ES": "Spanish", "EN": "English"}  # DeepL codes spelled out for the chat model
+OPENAI_MAX_RETRIES = 2  # Extra attempts after a 429, 5xx or connection error (the SDK's own default)
+TTS_VOICE_ID = "21m00Tcm4TlvDq8ikWAM"  # Adam pre-made voice
+TTS_MODEL_ID = "eleven_multilingual_v2"  # Use turbo model for low latency, for other languages use `eleven_multilingual_v2`
+TTS_OUTPUT_FORMAT = "pcm_22050"  # Raw 16-bit PCM, so playback can start without decoding; must match PLAYBACK_SAMPLE_RATE
+TTS_VOICE_SETTINGS = {"stability": 0.5, "similarity_boost": 0.75, "style": 0.15, "speed": 0.75}
 SAMPLE_RATE = 44100  # Audio sample rate
 MAX_RECORD_TIME = 60  # Maximum recording time in seconds
+UPLOAD_SAMPLE_RATE = 16000  # Recordings are resampled to this rate before transcription
+UPLOAD_FORMAT = "flac"  # "flac" or "wav"
+AUTO_STOP_SILENCE = 1.5  # Seconds of trailing silence that end a hands-free recording
+STREAM_RESPONSES = True  # Stream conversation replies and speak them sentence by sentence
+INCREMENTAL_TRANSCRIPTION = True  # Transcribe recording segments while the user is still speaking
+SPECULATIVE_TRANSLATION = True  # Translate a voice transcription while the user is still confirming it
+EXPLAIN_TRANSLATIONS = False  # Also show a grammar explanation of each translation in text and voice modes
 INPUT_MODES = ["text", "voice", "conversation"]  # Available input modes
 
 # Suppress FP16 warning for whisper
@@ -32,8 +65,18 @@ warnings.filterwarnings(
     "ignore", message="FP16 is not supported on CPU; using FP32 instead"
 )
 
-# Initialize OpenAI client
-client = OpenAI(api_key=OPENAI_API_KEY)
+# Temporary audio files of this process only, so cleanup never touches other programs' files
+_temp_dir: Optional[str] = None
+_temp_dir_lock = threading.Lock()
+
+
+def temp_audio_dir() -> str:
+    """Private directory for this process's temporary audio files, created on first use"""
+    global _temp_dir
+    with _temp_dir_lock:
+        if _temp_dir is None:
+            _temp_dir = tempfile.mkdtemp(prefix="sla_audio_")
+        return _temp_dir
 
 
 def print_separator() -> None:
@@ -41,202 +84,791 @@ def print_separator() -> None:
     print("*\n* * * * * * * * * * * * * * * * * * * * * * * * * * *\n*")
 
 
+def explanation_request(spanish_input: str, translation: str) -> str:
+    """Build the user message asking for a grammar explanation"""
+    return f"Analyze this Spanish sentence: '{spanish_input}' which translates to English as: '{translation}'"
+
+
 class AudioRecorder:
     """Handles audio recording functionality"""
     
-    def __init__(self, sample_rate: int = SAMPLE_RATE, max_record_time: int = MAX_RECORD_TIME):
+    def __init__(
+        self,
+        sample_rate: int = SAMPLE_RATE,
+        max_record_time: int = MAX_RECORD_TIME,
+        upload_sample_rate: Optional[int] = UPLOAD_SAMPLE_RATE,
+        upload_format: str = UPLOAD_FORMAT,
+        trim_silence: bool = True,
+        auto_stop_silence: float = AUTO_STOP_SILENCE,
+    ):
         self.sample_rate = sample_rate
         self.max_record_time = max_record_time
+        self.upload_sample_rate = upload_sample_rate
+        self.upload_format = upload_format
+        self.trim_silence = trim_silence
+        self.auto_stop_silence = auto_stop_silence
     
-    def record_audio(self) -> Optional[str]:
-        """Record audio using a simple start/stop approach with ENTER key"""
-        print("***   Press ENTER to start recording...")
-        input()  # Wait for Enter key
+    def record_audio(self, hands_free: bool = False) -> Optional[io.BytesIO]:
+        """
+        Record audio using a simple start/stop approach with ENTER key
+        
+        Args:
+            hands_free: Start immediately and stop after AUTO_STOP_SILENCE seconds of silence instead of waiting for ENTER
+            
+        Returns:
+            The recording with leading and trailing silence removed, ready for upload, or None if nothing was said
+        """
+        return self.prepare_segment(self._capture(hands_free))
 
-        print("***   Recording... Press ENTER to stop")
-        print(f"***   (Recording will automatically stop after {self.max_record_time} seconds)")
+    def record_segments(self, on_segment: Callable[[np.ndarray], Any], hands_free: bool = False) -> float:
+        """
+        Record audio, handing it to on_segment in pieces at pauses (or every SEGMENT_MAX_SECONDS) while recording continues
+        
+        Args:
+            on_segment: Called with the raw int16 samples of each segment, from the audio thread
+            hands_free: See record_audio
+            
+        Returns:
+            Duration of the recording in seconds
+        """
+        samples = self._capture(hands_free, on_segment)
+        return len(samples) / self.sample_rate
 
-        # Start recording
-        recording = sd.rec(
-            int(self.max_record_time * self.sample_rate),
-            samplerate=self.sample_rate,
-            channels=1,
-            dtype='float32',
-        )
+    def prepare_segment(self, samples: np.ndarray) -> Optional[io.BytesIO]:
+        """Trim and encode raw samples for upload, returning None when they hold no speech"""
+        from audio import prepare_for_upload, trim_silence
 
-        # Create a separate thread to wait for key press
-        stop_recording = False
+        if self.trim_silence:
+            samples = trim_silence(samples, self.sample_rate)
 
-        def wait_for_enter():
-            nonlocal stop_recording
-            input()  # Wait for Enter key
-            stop_recording = True
+        if len(samples) == 0:
+            return None
 
-        input_thread = threading.Thread(target=wait_for_enter)
-        input_thread.daemon = True
-        input_thread.start()
+        return prepare_for_upload(samples, self.sample_rate, self.upload_sample_rate, self.upload_format)
 
-        # Show recording progress until Enter is pressed or max time is reached
-        start_time = time.time()
-        frame_index = 0
+    def _capture(self, hands_free: bool, on_segment: Optional[Callable[[np.ndarray], Any]] = None) -> np.ndarray:
+        """Run the interactive recording loop and return the captured samples"""
+        from audio import StreamRecorder
 
-        while not stop_recording and frame_index < len(recording):
-            elapsed = time.time() - start_time
-            print(f"***   Recording: {elapsed:.1f}s", end="\r")
-            time.sleep(0.1)
-            frame_index = int(elapsed * self.sample_rate)
+        stop_recording = threading.Event()
 
-            if elapsed >= self.max_record_time:
-                break
+        if hands_free:
+            print("***   Listening... (recording stops when you pause)")
+        else:
+            print("***   Press ENTER to start recording...")
+            input()  # Wait for Enter key
+
+            print("***   Recording... Press ENTER to stop")
+            print(f"***   (Recording will automatically stop after {self.max_record_time} seconds)")
 
-        # Calculate actual duration
-        duration = time.time() - start_time
+            # Create a separate thread to wait for key press
+            def wait_for_enter():
+                input()  # Wait for Enter key
+                stop_recording.set()
 
-        # Stop recording
-        sd.stop()
-        print(f"\n***   Recording finished! Duration: {duration:.1f} seconds")
+            input_thread = threading.Thread(target=wait_for_enter)
+            input_thread.daemon = True
+            input_thread.start()
 
-        # Trim recording to actual duration
-        actual_frames = int(duration * self.sample_rate)
-        trimmed_recording = recording[:actual_frames]
+        # Start recording
+        with profiling.span("record", hands_free=hands_free) as record_span:
+            recorder = StreamRecorder(
+                self.sample_rate,
+                self.max_record_time,
+                auto_stop_silence=self.auto_stop_silence if hands_free else None,
+                on_segment=on_segment,
+            )
+            recorder.start()
 
-        # Create temporary file for the recording
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_audio:
-            temp_filename = temp_audio.name
-            # Normalize and convert to int16
-            trimmed_recording = np.int16(trimmed_recording * 32767)
-            write(temp_filename, self.sample_rate, trimmed_recording)
+            # Show recording progress until Enter is pressed, silence is detected or max time is reached
+            while not stop_recording.is_set() and not recorder.finished.is_set():
+                print(f"***   Recording: {recorder.seconds:.1f}s", end="\r")
+                stop_recording.wait(0.1)
 
-        return temp_filename
+            # Stop recording; the buffer holds exactly the frames that were captured
+            samples = recorder.stop()
+            record_span.set(audio_seconds=round(len(samples) / self.sample_rate, 3))
+        print(f"\n***   Recording finished! Duration: {len(samples) / self.sample_rate:.1f} seconds")
+        return samples
 
 
 class TranslationService:
     """Handles translation services"""
     
-    def __init__(self, api_key: str, api_url: str = DEEPL_API_URL):
+    def __init__(
+        self,
+        api_key: str,
+        api_url: str = DEEPL_API_URL,
+        max_texts_per_request: int = DEEPL_MAX_TEXTS_PER_REQUEST,
+        max_request_bytes: int = DEEPL_MAX_REQUEST_BYTES,
+        cache: Optional[TranslationCache] = None,
+        session: Optional[PooledSession] = None,
+        limiter: Optional[RateLimiter] = None,
+        fallback: Optional[Callable[[str, str, str, threading.Event], Optional[str]]] = None,
+        hedger: Optional[Hedger] = None,
+        phrases: Optional[PhraseTable] = None,
+        memory: Optional[TranslationMemory] = None,
+    ):
+        """
+        Args:
+            phrases: Local phrase index consulted before the cache and any remote backend
+            memory: Fuzzy translation memory behind suggest(); new translations are added to it
+            fallback: Second translator, called as fallback(text, source_lang, target_lang, cancel_event)
+                when DeepL is slower than usual or fails; translate() then returns whichever answers first
+            hedger: Hedging policy and statistics for translate(), created when a fallback is given
+        """
         self.api_key = api_key
         self.api_url = api_url
+        self.max_texts_per_request = max_texts_per_request
+        self.max_request_bytes = max_request_bytes
+        self.cache = cache
+        self.phrases = phrases
+        self.memory = memory
+        self.limiter = limiter or get_limiter("deepl")
+        self.fallback = fallback
+        self.hedger = hedger or (Hedger() if fallback is not None else None)
+        self._session = session
+
+    @property
+    def session(self) -> PooledSession:
+        """HTTP session used for DeepL requests, the shared pool unless one was given"""
+        if self._session is None:
+            from http_client import get_session
+
+            self._session = get_session()
+        return self._session
     
     def translate(self, text: str, source_lang: str = "ES", target_lang: str = "EN") -> Optional[str]:
-        """Translate text using DeepL API"""
-        try:
-            response = requests.post(
-                url=self.api_url,
-                headers={'Authorization': 'DeepL-Auth-Key ' + self.api_key},
-                data={"text": [text], "target_lang": target_lang, "source_lang": source_lang},
-                timeout=30,
-            )
+        """Translate text using DeepL API, hedging with the fallback translator when DeepL is slow or down"""
+        if self.fallback is None or not text or not text.strip():
+            return self.translate_many([text], source_lang, target_lang)[0]
+
+        # Local answers are instant, so they neither need hedging nor belong in the learned DeepL latency
+        if self.phrases is not None:
+            known = self.phrases.lookup(text, source_lang, target_lang)
+            if known is not None:
+                return known
+        if self.cache is not None:
+            cached = self.cache.get(text, source_lang, target_lang)
+            if cached is not None:
+                return cached
+
+        # The local lookups above already missed, so the hedged primary goes straight to DeepL
+        return self.hedger.run(
+            lambda: self._translate_remote([text], source_lang, target_lang).get(text),
+            lambda cancel: self.fallback(text, source_lang, target_lang, cancel),
+        )
 
-            if response.status_code == 200:
-                return str(response.json()["translations"][0]["text"]).replace("\n", " ")
-            else:
-                print(f"Translation error: {response.status_code} - {response.reason}")
-                return None
-        except Exception as e:
-            print(f"Exception during translation: {str(e)}")
+    def suggest(self, text: str, source_lang: str = "ES", target_lang: str = "EN") -> Optional[MemoryMatch]:
+        """Closest previously translated sentence, to reuse or show while the exact translation is requested"""
+        if self.memory is None:
             return None
+        return self.memory.lookup(text, source_lang, target_lang)
+
+    def load_memory(self, source_lang: str = "ES", target_lang: str = "EN") -> None:
+        """Create the translation memory and fill it with the cached translations (run off the main thread)"""
+        from translation_memory import TranslationMemory
+
+        memory = TranslationMemory(source_lang, target_lang)
+        # Attach first so translations made during the load are remembered too
+        self.memory = memory
+        if self.cache is not None:
+            memory.load(self.cache.items(source_lang, target_lang))
+
+    def translate_many(self, texts: List[str], source_lang: str = "ES", target_lang: str = "EN") -> List[Optional[str]]:
+        """
+        Translate several texts using as few DeepL requests as possible
+        
+        Args:
+            texts: The texts to translate
+            source_lang: DeepL source language code
+            target_lang: DeepL target language code
+            
+        Returns:
+            Translations in the same order as the input, with None for any text that could not be translated
+        """
+        results: List[Optional[str]] = [None] * len(texts)
+
+        with profiling.span("translate", texts=len(texts)) as span:
+            # Send each distinct text once, and skip blanks entirely
+            pending: Dict[str, List[int]] = {}
+            for index, text in enumerate(texts):
+                if not text or not text.strip():
+                    results[index] = text
+                else:
+                    pending.setdefault(text, []).append(index)
+
+            # Stock phrases are answered from the local index, then whatever we can from the cache,
+            # before issuing any request
+            phrase_hits = 0
+            if self.phrases is not None and pending:
+                for text, translation in self.phrases.lookup_many(list(pending), source_lang, target_lang).items():
+                    for index in pending.pop(text):
+                        results[index] = translation
+                    phrase_hits += 1
+
+            cache_hits = 0
+            if self.cache is not None and pending:
+                for text, translation in self.cache.get_many(list(pending), source_lang, target_lang).items():
+                    for index in pending.pop(text):
+                        results[index] = translation
+                    cache_hits += 1
+
+            translated = self._translate_remote(list(pending), source_lang, target_lang)
+            for text, indices in pending.items():
+                for index in indices:
+                    results[index] = translated.get(text)
+
+            span.set(phrase_hits=phrase_hits, cache_hits=cache_hits, translated=len(translated), failed=len(pending) - len(translated))
+
+        return results
+
+    def _translate_remote(self, texts: List[str], source_lang: str, target_lang: str) -> Dict[str, str]:
+        """
+        Translate distinct, non-blank texts with DeepL alone, skipping the phrase index and cache lookups
+
+        Returns:
+            Mapping from each text that was translated to its translation; new translations are also
+            stored in the cache and the translation memory
+        """
+        translated: Dict[str, str] = {}
+        for batch in self._pack_batches(texts):
+            for text, translation in zip(batch, self._translate_batch(batch, source_lang, target_lang)):
+                if translation is not None:
+                    translated[text] = translation
+
+        if self.cache is not None and translated:
+            self.cache.put_many(translated, source_lang, target_lang)
+        if self.memory is not None and translated:
+            self.memory.add_many(translated.items(), source_lang, target_lang)
+        return translated
+
+    def _pack_batches(self, texts: List[str]) -> List[List[str]]:
+        """Group texts into batches that fit DeepL's per-request count and size limits"""
+        overhead = len("target_lang=XX-XX&source_lang=XX")
+        batches: List[List[str]] = []
+        batch: List[str] = []
+        batch_bytes = overhead
+
+        for text in texts:
+            text_bytes = len("&text=") + len(quote_plus(text))
+            if batch and (
+                len(batch) >= self.max_texts_per_request
+                or batch_bytes + text_bytes > self.max_request_bytes
+            ):
+                batches.append(batch)
+                batch = []
+                batch_bytes = overhead
+            batch.append(text)
+            batch_bytes += text_bytes
+
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _translate_batch(self, batch: List[str], source_lang: str, target_lang: str) -> List[Optional[str]]:
+        """Translate one batch, splitting it when DeepL rejects the request because of its contents"""
+        translations, status_code = self._request_translations(batch, source_lang, target_lang)
+        if translations is not None:
+            return translations
+
+        # A single bad or oversized text fails the whole request, so bisect to isolate it.
+        # Server-side and network errors would fail the halves too, so those are not retried here.
+        if len(batch) > 1 and status_code in (400, 413, 414):
+            middle = len(batch) // 2
+            return (
+                self._translate_batch(batch[:middle], source_lang, target_lang)
+                + self._translate_batch(batch[middle:], source_lang, target_lang)
+            )
+        return [None] * len(batch)
+
+    def _request_translations(
+        self, batch: List[str], source_lang: str, target_lang: str
+    ) -> Tuple[Optional[List[str]], Optional[int]]:
+        """Send one DeepL request, returning the translations (or None) and the HTTP status code"""
+        with profiling.span("deepl_request", texts=len(batch)) as span:
+            try:
+                response = self.session.post(
+                    url=self.api_url,
+                    limiter=self.limiter,
+                    headers={'Authorization': 'DeepL-Auth-Key ' + self.api_key},
+                    data={"text": batch, "target_lang": target_lang, "source_lang": source_lang},
+                )
+                if profiling.enabled():
+                    span.set(
+                        status=response.status_code,
+                        request_bytes=len(response.request.body or b""),
+                        response_bytes=len(response.content),
+                    )
+
+                if response.status_code == 200:
+                    translations = response.json()["translations"]
+                    return [str(item["text"]).replace("\n", " ") for item in translations], 200
+                else:
+                    print(f"Translation error: {response.status_code} - {response.reason}")
+                    return None, response.status_code
+            except Exception as e:
+                print(f"Exception during translation: {str(e)}")
+                return None, None
 
 
 class AIService:
     """Handles AI services including text and speech"""
     
-    def __init__(self, api_key: str, text_model: str = OPENAI_TEXT_MODEL, audio_model: str = OPENAI_AUDIO_MODEL):
-        self.client = OpenAI(api_key=api_key)
+    def __init__(
+        self,
+        api_key: str,
+        text_model: str = OPENAI_TEXT_MODEL,
+        audio_model: str = OPENAI_AUDIO_MODEL,
+        explanation_cache: Optional[ExplanationCache] = None,
+        audio_cache: Optional[AudioCache] = None,
+        openai_base_url: Optional[str] = None,
+        elevenlabs_base_url: Optional[str] = None,
+        player: Optional[StreamPlayer] = None,
+        openai_limiter: Optional[RateLimiter] = None,
+        elevenlabs_limiter: Optional[RateLimiter] = None,
+        ledger: Optional[UsageLedger] = None,
+    ):
+        self.api_key = api_key
         self.text_model = text_model
         self.audio_model = audio_model
-        self.elevenlabs_client = ElevenLabs(api_key=ELEVEN_LABS_API_KEY)
-    
-    def get_text_completion(self, context: List[Dict[str, str]], max_tokens: int = MAX_TOKENS) -> str:
-        """Get text completion from OpenAI"""
-        try:
-            completion = self.client.chat.completions.create(
-                model=self.text_model, 
-                messages=context, 
-                max_tokens=max_tokens
-            )
-            return completion.choices[0].message.content
-        except Exception as e:
-            print(f"Error getting explanation: {str(e)}")
-            return "Could not generate explanation."
+        self.openai_base_url = openai_base_url
+        self.elevenlabs_base_url = elevenlabs_base_url
+        self.explanation_cache = explanation_cache
+        self.audio_cache = audio_cache
+        # Shared with every other client of the same provider in this process unless given
+        self.openai_limiter = openai_limiter or get_limiter("openai")
+        self.elevenlabs_limiter = elevenlabs_limiter or get_limiter("elevenlabs")
+        # Token counts and latency of every chat request made through this service
+        self.ledger = ledger or UsageLedger()
+
+        # Provider clients and the audio player are created on first use
+        self._client = None
+        self._elevenlabs_client = None
+        self._player = player
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> Any:
+        """OpenAI client, created on first use"""
+        with self._lock:
+            if self._client is None:
+                from openai import OpenAI
+
+                # Retries are done in _openai_request so the rate limiter sees every 429
+                self._client = OpenAI(api_key=self.api_key, base_url=self.openai_base_url, max_retries=0)
+            return self._client
+
+    @property
+    def elevenlabs_client(self) -> Any:
+        """ElevenLabs client, created on first use"""
+        with self._lock:
+            if self._elevenlabs_client is None:
+                from elevenlabs.client import ElevenLabs
+
+                self._elevenlabs_client = ElevenLabs(api_key=ELEVEN_LABS_API_KEY, base_url=self.elevenlabs_base_url)
+            return self._elevenlabs_client
+
+    @property
+    def player(self) -> StreamPlayer:
+        """In-process audio player, created on first use"""
+        with self._lock:
+            if self._player is None:
+                from audio import StreamPlayer
+
+                self._player = StreamPlayer()
+            return self._player
     
-    def transcribe_audio(self, audio_file_path: str, language: str = "es") -> Optional[str]:
-        """Transcribe audio file using OpenAI Whisper API"""
-        try:
-            with open(audio_file_path, "rb") as audio_file:
-                transcription = self.client.audio.transcriptions.create(
-                    model=self.audio_model,
-                    file=audio_file,
-                    language=language,
-                )
+    def get_text_completion(
+        self, context: List[Dict[str, str]], max_tokens: int = MAX_TOKENS, purpose: str = "completion"
+    ) -> str:
+        """
+        Get text completion from OpenAI
 
-            # Clean up the temporary file
-            os.remove(audio_file_path)
+        Args:
+            purpose: Label for the request in the usage ledger
+        """
+        with profiling.span("completion", model=self.text_model, messages=len(context)) as span:
+            started = time.perf_counter()
+            try:
+                reserved = estimate_chat_tokens(context)
+                completion = self._openai_request(
+                    self.client.chat.completions.with_raw_response.create,
+                    reserved,
+                    model=self.text_model, 
+                    messages=context, 
+                    max_tokens=max_tokens
+                )
+                if completion.usage is not None:
+                    self.openai_limiter.settle(reserved, completion.usage.total_tokens)
+                    prompt_tokens, cached_tokens, completion_tokens = usage_tokens(completion.usage)
+                    span.set(prompt_tokens=prompt_tokens, cached_tokens=cached_tokens, completion_tokens=completion_tokens)
+                self.ledger.record(
+                    purpose,
+                    self.text_model,
+                    completion.usage,
+                    time.perf_counter() - started,
+                    max_tokens=max_tokens,
+                    finish_reason=completion.choices[0].finish_reason,
+                )
+                return completion.choices[0].message.content
+            except Exception as e:
+                print(f"Error getting explanation: {str(e)}")
+                span.set(failed=True)
+                self.ledger.record(purpose, self.text_model, None, time.perf_counter() - started, max_tokens=max_tokens, failed=True)
+                return COMPLETION_FALLBACK
+
+    def translate_text(
+        self, text: str, source_lang: str = "ES", target_lang: str = "EN", cancel: Optional[threading.Event] = None
+    ) -> Optional[str]:
+        """
+        Translate text with the chat model, used as the fallback when DeepL is slow or failing
+        
+        Args:
+            cancel: Checked between streamed tokens; once set the request is abandoned and None returned
+            
+        Returns:
+            The translation, or None on error or cancellation
+        """
+        context = [
+            {
+                "role": "system",
+                "content": TRANSLATE_PROMPT.format(
+                    source=LANGUAGE_NAMES.get(source_lang, source_lang), target=LANGUAGE_NAMES.get(target_lang, target_lang)
+                ),
+            },
+            {"role": "user", "content": text},
+        ]
+        parts = []
+        started = time.perf_counter()
+        usage, finish_reason, first_token, failed = None, None, None, False
+        with profiling.span("fallback_translate", model=self.text_model) as span:
+            try:
+                stream = self._openai_request(
+                    self.client.chat.completions.with_raw_response.create,
+                    estimate_chat_tokens(context),
+                    model=self.text_model,
+                    messages=context,
+                    max_tokens=TRANSLATE_MAX_TOKENS,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                )
+                try:
+                    for chunk in stream:
+                        if cancel is not None and cancel.is_set():
+                            # Closing the stream stops generation, so the losing request is not billed in full
+                            span.set(cancelled=True)
+                            finish_reason = "cancelled"
+                            return None
+                        usage = chunk.usage or usage
+                        if chunk.choices:
+                            finish_reason = chunk.choices[0].finish_reason or finish_reason
+                            if chunk.choices[0].delta.content:
+                                if first_token is None:
+                                    first_token = time.perf_counter() - started
+                                parts.append(chunk.choices[0].delta.content)
+                finally:
+                    stream.close()
+            except Exception as e:
+                print(f"Error translating with {self.text_model}: {str(e)}")
+                span.set(failed=True)
+                failed = True
+                return None
+            finally:
+                self.ledger.record(
+                    "translation",
+                    self.text_model,
+                    usage,
+                    time.perf_counter() - started,
+                    first_token,
+                    TRANSLATE_MAX_TOKENS,
+                    finish_reason,
+                    failed,
+                )
+        return "".join(parts).strip() or None
 
-            return transcription.text
-        except Exception as e:
-            print(f"Error transcribing audio: {str(e)}")
-            return None
+    def get_explanation(self, spanish_input: str, translation: str, max_tokens: int = MAX_TOKENS) -> str:
+        """
+        Get a grammar explanation for a Spanish sentence and its translation
+        
+        Explanations are cached on the sentence, its translation, the model and TEXT_PROMPT,
+        so editing the prompt or switching models never serves a stale explanation.
+        """
+        if self.explanation_cache is not None:
+            with profiling.span("explanation_cache_lookup") as span:
+                explanation = self.explanation_cache.get(spanish_input, translation, self.text_model, TEXT_PROMPT)
+                span.set(cache_hit=explanation is not None)
+            if explanation is not None:
+                return explanation
+
+        context = [
+            {"role": "system", "content": TEXT_PROMPT},
+            {"role": "user", "content": explanation_request(spanish_input, translation)},
+        ]
+        explanation = self.get_text_completion(context, max_tokens, purpose="explanation")
+
+        if self.explanation_cache is not None and explanation != COMPLETION_FALLBACK:
+            self.explanation_cache.put(spanish_input, translation, self.text_model, TEXT_PROMPT, explanation)
+        return explanation
+
+    def summarize_history(self, summary: Optional[str], messages: List[Dict[str, str]]) -> Optional[str]:
+        """Fold older conversation messages into a running summary, returning None on failure"""
+        transcript = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+        request = [
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": f"Previous summary: {summary or 'None'}\n\nConversation:\n{transcript}"},
+        ]
+        result = self.get_text_completion(request, max_tokens=SUMMARY_MAX_TOKENS, purpose="summary")
+        return None if result == COMPLETION_FALLBACK else result
+
+    def stream_text_completion(
+        self, context: List[Dict[str, str]], max_tokens: int = MAX_TOKENS, purpose: str = "conversation"
+    ) -> Iterator[str]:
+        """Stream a text completion from OpenAI, yielding text as it is generated"""
+        generated = False
+        started = time.perf_counter()
+        usage, finish_reason, first_token, failed = None, None, None, False
+        with profiling.span("completion_stream", model=self.text_model, messages=len(context)) as span:
+            try:
+                reserved = estimate_chat_tokens(context)
+                response_chars = 0
+                stream = self._openai_request(
+                    self.client.chat.completions.with_raw_response.create,
+                    reserved,
+                    model=self.text_model,
+                    messages=context,
+                    max_tokens=max_tokens,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                )
+                for chunk in stream:
+                    usage = chunk.usage or usage
+                    if not chunk.choices:
+                        continue
+                    finish_reason = chunk.choices[0].finish_reason or finish_reason
+                    if chunk.choices[0].delta.content:
+                        if not generated:
+                            first_token = time.perf_counter() - started
+                            span.set(time_to_first_token_ms=round(1000 * first_token, 3))
+                        generated = True
+                        response_chars += len(chunk.choices[0].delta.content)
+                        yield chunk.choices[0].delta.content
+                span.set(response_chars=response_chars)
+                if usage is not None:
+                    self.openai_limiter.settle(reserved, usage.total_tokens)
+                    prompt_tokens, cached_tokens, completion_tokens = usage_tokens(usage)
+                    span.set(prompt_tokens=prompt_tokens, cached_tokens=cached_tokens, completion_tokens=completion_tokens)
+            except Exception as e:
+                print(f"Error getting explanation: {str(e)}")
+                span.set(failed=True)
+                failed = True
+                if not generated:
+                    yield COMPLETION_FALLBACK
+            finally:
+                # Also reached when the caller stops reading early, e.g. because the turn was cancelled
+                self.ledger.record(
+                    purpose, self.text_model, usage, time.perf_counter() - started, first_token, max_tokens, finish_reason, failed
+                )
+    
+    def transcribe_audio(self, audio: Union[str, BinaryIO], language: str = "es") -> Optional[str]:
+        """Transcribe a recording (in-memory buffer or file path) using OpenAI Whisper API"""
+        with profiling.span("transcribe", model=self.audio_model) as span:
+            try:
+                if isinstance(audio, str):
+                    span.set(request_bytes=os.path.getsize(audio))
+                    # The file is streamed from disk rather than read into memory, and left in place
+                    with open(audio, "rb") as audio_file:
+                        transcription = self._openai_request(
+                            self.client.audio.transcriptions.with_raw_response.create,
+                            model=self.audio_model,
+                            file=audio_file,
+                            language=language,
+                        )
+                else:
+                    if profiling.enabled() and isinstance(audio, io.BytesIO):
+                        span.set(request_bytes=audio.getbuffer().nbytes)
+                    transcription = self._openai_request(
+                        self.client.audio.transcriptions.with_raw_response.create,
+                        model=self.audio_model,
+                        file=audio,
+                        language=language,
+                    )
+
+                span.set(response_chars=len(transcription.text))
+                return transcription.text
+            except Exception as e:
+                print(f"Error transcribing audio: {str(e)}")
+                span.set(failed=True)
+                return None
     
     def text_to_speech(self, text: str) -> Optional[str]:
         """
-        Convert text to speech using OpenAI's TTS API
+        Convert text to speech using the ElevenLabs API
+        
+        Identical requests are served from the audio cache without any network call.
         
         Args:
             text: The text to convert to speech
-            voice: The voice to use (options: alloy, echo, fable, onyx, nova, shimmer)
             
         Returns:
-            Path to the audio file or None if there was an error
+            Path to the audio file or None if there was an error; release it with release_audio when done
         """
-        try:
-            response = self.elevenlabs_client.text_to_speech.convert(
-                voice_id="21m00Tcm4TlvDq8ikWAM",  # Adam pre-made voice
-                optimize_streaming_latency="0",
-                output_format="mp3_22050_32",
-                text=text,
-                model_id="eleven_multilingual_v2",  # Use turbo model for low latency, for other languages use `eleven_multilingual_v2`
-                voice_settings=VoiceSettings(
-                    stability=0.5,
-                    similarity_boost=0.75,
-                    style=0.15,
-                    speed=0.75
-                ),
-            )
+        extension = TTS_OUTPUT_FORMAT.split("_")[0]
+        cache_key = self._tts_cache_key(text)
+        with profiling.span("text_to_speech", chars=len(text)) as span:
+            if cache_key is not None:
+                cached_path = self.audio_cache.get(cache_key, extension)
+                span.set(cache_hit=bool(cached_path))
+                if cached_path:
+                    return cached_path
 
-            # Save the streamed audio to a temporary file
-            with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as temp_audio:
-                temp_filename = temp_audio.name
+            try:
+                response = profiling.measure_stream(span, self._synthesize(text))
 
-                # Iterate over the generator to write chunks to file
-                for chunk in response:
-                    temp_audio.write(chunk)
+                if cache_key is not None:
+                    return self.audio_cache.put(cache_key, extension, response)
 
-            return temp_filename
-            
+                # Save the streamed audio to a temporary file
+                with tempfile.NamedTemporaryFile(suffix=f".{extension}", dir=temp_audio_dir(), delete=False) as temp_audio:
+                    temp_filename = temp_audio.name
+
+                    # Iterate over the generator to write chunks to file
+                    for chunk in response:
+                        temp_audio.write(chunk)
+
+                return temp_filename
+                
+            except Exception as e:
+                print(f"Error in text-to-speech conversion: {str(e)}")
+                span.set(failed=True)
+                return None
+
+    def text_to_speech_stream(self, text: str) -> Iterator[bytes]:
+        """Yield synthesized PCM audio for text as it arrives, from the audio cache when possible"""
+        from audio import read_chunks
+
+        extension = TTS_OUTPUT_FORMAT.split("_")[0]
+        cache_key = self._tts_cache_key(text)
+        # Timed until the last chunk has been consumed, so playback pacing is included
+        with profiling.span("text_to_speech_stream", chars=len(text)) as span:
+            try:
+                if cache_key is not None:
+                    cached_path = self.audio_cache.get(cache_key, extension)
+                    span.set(cache_hit=bool(cached_path))
+                    if cached_path:
+                        yield from profiling.measure_stream(span, read_chunks(cached_path))
+                        return
+                    yield from profiling.measure_stream(
+                        span, self.audio_cache.tee(cache_key, extension, self._synthesize(text))
+                    )
+                else:
+                    yield from profiling.measure_stream(span, self._synthesize(text))
+            except Exception as e:
+                print(f"Error in text-to-speech conversion: {str(e)}")
+                span.set(failed=True)
+
+    def speak(self, text: str) -> bool:
+        """Synthesize text and play it, starting playback before synthesis has finished"""
+        try:
+            return self.player.play(self.text_to_speech_stream(text)) > 0
         except Exception as e:
-            print(f"Error in text-to-speech conversion: {str(e)}")
+            print(f"Error playing audio: {str(e)}")
+            return False
+
+    def _openai_request(self, create: Callable[..., Any], tokens: int = 0, **kwargs: Any) -> Any:
+        """
+        Call an OpenAI endpoint within the shared rate limit
+        
+        Args:
+            create: A with_raw_response create method, so the rate-limit headers can be read
+            tokens: Tokens to reserve against the token budget
+            
+        Returns:
+            The parsed response; 429s, 5xx and connection errors are retried up to OPENAI_MAX_RETRIES times
+        """
+        from openai import APIConnectionError, APIStatusError
+
+        for attempt in range(OPENAI_MAX_RETRIES + 1):
+            self.openai_limiter.acquire(tokens)
+            upload = kwargs.get("file")
+            if attempt and hasattr(upload, "seek"):
+                upload.seek(0)
+            try:
+                raw = create(**kwargs)
+            except APIStatusError as e:
+                self.openai_limiter.record_response(e.status_code, e.response.headers)
+                if attempt == OPENAI_MAX_RETRIES or (e.status_code != 429 and e.status_code < 500):
+                    raise
+                if e.status_code != 429:
+                    # A 429 is paced by the limiter; other failures back off with full jitter
+                    time.sleep(random.uniform(0, min(8.0, 0.5 * 2 ** attempt)))
+                continue
+            except APIConnectionError:
+                if attempt == OPENAI_MAX_RETRIES:
+                    raise
+                time.sleep(random.uniform(0, min(8.0, 0.5 * 2 ** attempt)))
+                continue
+            self.openai_limiter.record_response(raw.status_code, raw.headers)
+            return raw.parse()
+
+    def _synthesize(self, text: str) -> Iterator[bytes]:
+        """Run an ElevenLabs synthesis request within the shared rate limit, yielding its audio chunks"""
+        from elevenlabs import VoiceSettings
+        from elevenlabs.core import ApiError
+
+        self.elevenlabs_limiter.acquire()
+        try:
+            yield from self.elevenlabs_client.text_to_speech.stream(
+                voice_id=TTS_VOICE_ID,
+                optimize_streaming_latency=0,
+                output_format=TTS_OUTPUT_FORMAT,
+                text=text,
+                model_id=TTS_MODEL_ID,
+                voice_settings=VoiceSettings(**TTS_VOICE_SETTINGS),
+            )
+        except ApiError as e:
+            self.elevenlabs_limiter.record_response(e.status_code or 0, e.headers)
+            raise
+        self.elevenlabs_limiter.record_response(200)
+
+    def _tts_cache_key(self, text: str) -> Optional[str]:
+        if self.audio_cache is None:
             return None
+        return AudioCache.make_key(
+            text,
+            voice_id=TTS_VOICE_ID,
+            model_id=TTS_MODEL_ID,
+            output_format=TTS_OUTPUT_FORMAT,
+            voice_settings=TTS_VOICE_SETTINGS,
+        )
+
+    def release_audio(self, audio_file_path: str) -> None:
+        """Delete an audio file returned by text_to_speech unless it belongs to the audio cache"""
+        if self.audio_cache is not None and self.audio_cache.contains(audio_file_path):
+            return
+        try:
+            os.remove(audio_file_path)
+        except OSError:
+            pass
     
     def play_audio(self, audio_file_path: str) -> bool:
         """
-        Play an audio file
+        Play an audio file in-process
         
         Args:
-            audio_file_path: Path to the audio file to play
+            audio_file_path: Path to the audio file to play (raw .pcm from text_to_speech, or any format soundfile can decode)
             
         Returns:
             True if successful, False otherwise
         """
+        from audio import StreamPlayer, read_chunks, decode_audio_file
+
         try:
-            # TODO: Implement audio playback functionality
-            # This is a placeholder for audio playback
-            
-            # Example implementation with a system call (platform dependent):
-            import subprocess
-            subprocess.call(["afplay", audio_file_path])  # macOS
-            
-            #print(f"Playing audio from {audio_file_path}")
-            #print("Audio playback functionality to be implemented")
+            if audio_file_path.endswith(".pcm"):
+                self.player.play(read_chunks(audio_file_path))
+            else:
+                pcm, sample_rate = decode_audio_file(audio_file_path)
+                StreamPlayer(sample_rate).play([pcm])
             return True
             
         except Exception as e:
@@ -247,12 +879,46 @@ class AIService:
 class SpanishLearningAssistant:
     """Main class that handles the Spanish learning assistant functionality"""
     
-    def __init__(self):
-        self.translator = TranslationService(DEEPL_ACCESS_KEY)
-        self.ai_service = AIService(OPENAI_API_KEY)
-        self.audio_recorder = AudioRecorder()
+    def __init__(
+        self,
+        stream_responses: bool = STREAM_RESPONSES,
+        incremental_transcription: bool = INCREMENTAL_TRANSCRIPTION,
+        speculative_translation: bool = SPECULATIVE_TRANSLATION,
+        explain: bool = EXPLAIN_TRANSLATIONS,
+        translator: Optional[TranslationService] = None,
+        ai_service: Optional[AIService] = None,
+        audio_recorder: Optional[AudioRecorder] = None,
+    ):
+        self.stream_responses = stream_responses
+        self.incremental_transcription = incremental_transcription
+        self.speculative_translation = speculative_translation
+        self.explain = explain
+        self.ai_service = ai_service or AIService(
+            OPENAI_API_KEY, explanation_cache=ExplanationCache(), audio_cache=AudioCache()
+        )
+        # The translation memory is only built once translation mode is used, and only for our own translator
+        self._load_memory = translator is None
+        # The chat model stands in for DeepL when it is slow or down
+        if translator is None:
+            translator = TranslationService(
+                DEEPL_ACCESS_KEY,
+                cache=TranslationCache(),
+                fallback=self.ai_service.translate_text,
+                phrases=PhraseTable.open_default(),
+            )
+        self.translator = translator
+        self._audio_recorder = audio_recorder
+        self.turn_scheduler = TurnScheduler()
+        self.speculator = Speculator()
         self.current_mode = "text"  # Default input mode
     
+    @property
+    def audio_recorder(self) -> AudioRecorder:
+        """Microphone recorder, only set up once a voice mode is used"""
+        if self._audio_recorder is None:
+            self._audio_recorder = AudioRecorder()
+        return self._audio_recorder
+
     def get_input_mode(self) -> Optional[str]:
         """Get the user's preferred input mode"""
         while True:
@@ -275,21 +941,19 @@ class SpanishLearningAssistant:
         if mode == "text":
             return input("***   Enter Spanish text: ")
         elif mode == "voice":
-            # Record audio
-            audio_file = self.audio_recorder.record_audio()
-
-            if not audio_file:
-                return None
-
-            transcription = self.ai_service.transcribe_audio(audio_file)
+            transcription = self.transcribe_speech()
 
             if transcription:
+                if self.speculative_translation:
+                    # Translate while the user reads the transcription; thrown away if they reject it
+                    self.speculator.start(transcription, lambda cancel: self._translate_and_explain(transcription, cancel))
                 print(f"***   Transcribed: {transcription}")
                 confirm = input("***   Is this correct? (y/n): ").lower()
 
                 if confirm == 'y':
                     return transcription
                 else:
+                    self.speculator.discard()
                     print("***   Let's try again.")
                     return None
             else:
@@ -298,6 +962,19 @@ class SpanishLearningAssistant:
 
         return None
     
+    def transcribe_speech(self, hands_free: bool = False) -> Optional[str]:
+        """Record the user and return the transcription, transcribing segments as they are recorded when enabled"""
+        if not self.incremental_transcription:
+            audio_file = self.audio_recorder.record_audio(hands_free)
+            if not audio_file:
+                return None
+            return self.ai_service.transcribe_audio(audio_file)
+
+        # Only the final segment is still being transcribed once the user stops talking
+        transcriber = IncrementalTranscriber(self.audio_recorder.prepare_segment, self.ai_service.transcribe_audio)
+        self.audio_recorder.record_segments(transcriber.submit, hands_free)
+        return transcriber.result()
+    
     def conversation_mode(self) -> None:
         """Handle conversation mode with AI agent using voice or text"""
         print_separator()
@@ -317,42 +994,141 @@ class SpanishLearningAssistant:
             else:
                 print("***   Invalid option. Please enter 'v' or 't'.")
 
-        context = [{"role": "system", "content": CONVO_PROMPT}]
+        context = ConversationContext(CONVO_PROMPT, self._summarize_history)
 
         while True:
             user_input = None
 
             if mode == 'voice':
-                audio_file = self.audio_recorder.record_audio()
-                if audio_file:
-                    user_input = self.ai_service.transcribe_audio(audio_file)
-                    if user_input:
-                        print(f"***   You said: {user_input}")
+                user_input = self.transcribe_speech(hands_free=True)
+                if user_input:
+                    print(f"***   You said: {user_input}")
             else:
                 user_input = input("***   Your message: ")
 
             if not user_input or user_input.lower() in ['back', 'exit']:
+                self.turn_scheduler.cancel_current()
                 break
 
-            # Translate if needed
-            translation = self.translator.translate(user_input)
+            try:
+                if self.stream_responses:
+                    response = self.run_streaming_conversation_turn(context, user_input)
+                else:
+                    response = self.run_conversation_turn(context, user_input)
+            except (TurnCancelled, KeyboardInterrupt):
+                self.turn_scheduler.cancel_current()
+                print("\n***   Turn cancelled, returning to the main menu")
+                break
+
+            context.add("user", user_input)
+            context.add("assistant", response)
+            print_separator()
+
+        context.close()
+
+    def _summarize_history(self, summary: Optional[str], messages: List[Dict[str, str]]) -> Optional[str]:
+        """Fold older conversation messages into the running summary"""
+        return self.ai_service.summarize_history(summary, messages)
+
+    def run_conversation_turn(self, context: ConversationContext, user_input: str) -> str:
+        """
+        Run one conversation turn, overlapping the translation with the chat completion
+        
+        Args:
+            context: Conversation history so far (not modified)
+            user_input: What the user just said
+            
+        Returns:
+            The AI response
+        """
+        turn = self.turn_scheduler.start_turn()
+
+        with profiling.span("conversation_turn", streaming=False):
+            # The translation is only shown to the user, so it does not need to finish before the completion starts
+            translation_future = turn.submit(self.translator.translate, user_input)
+            completion_future = turn.submit(
+                self.ai_service.get_text_completion,
+                context.messages([{"role": "user", "content": user_input}]),
+                purpose="conversation",
+            )
+
+            # Collect results in display order regardless of which finished first
+            translation = turn.result(translation_future)
             if translation:
                 print(f"***   Translation: {translation}")
 
-            context.append({"role": "user", "content": user_input})
-            response = self.ai_service.get_text_completion(context)
+            response = turn.result(completion_future)
             print(f"***   AI: {response}")
 
-            speech_file = self.ai_service.text_to_speech(response)
-            if speech_file:
-                self.ai_service.play_audio(speech_file)
-                os.remove(speech_file)
+            turn.result(turn.submit(self.ai_service.speak, response))
 
-            context.append({"role": "assistant", "content": response})
-            print_separator()
+        return response
+
+    def run_streaming_conversation_turn(self, context: ConversationContext, user_input: str) -> str:
+        """
+        Run one conversation turn, speaking the reply sentence by sentence while it is still being generated
+        
+        Args:
+            context: Conversation history so far (not modified)
+            user_input: What the user just said
+            
+        Returns:
+            The AI response
+        """
+        turn = self.turn_scheduler.start_turn()
+        # The player is looked up on first playback, so a missing audio device is reported by the pipeline
+        speech = SpeechPipeline(self.ai_service.text_to_speech_stream, lambda chunks: self.ai_service.player.play(chunks))
+        turn.on_cancel(speech.cancel)
+        tokens: "queue.Queue[Optional[str]]" = queue.Queue()
+
+        with profiling.span("conversation_turn", streaming=True) as span:
+            translation_future = turn.submit(self.translator.translate, user_input)
+            reply_future = turn.submit(
+                self._stream_reply, context.messages([{"role": "user", "content": user_input}]), speech, tokens
+            )
+
+            translation = turn.result(translation_future)
+            if translation:
+                print(f"***   Translation: {translation}")
+
+            print("***   AI: ", end="", flush=True)
+            for token in turn.drain(tokens):
+                print(token, end="", flush=True)
+            print()
+
+            response = turn.result(reply_future)
+            turn.wait(speech.done)
+            if speech.time_to_first_audio is not None:
+                span.set(time_to_first_audio_ms=round(1000 * speech.time_to_first_audio, 3))
+        return response
+
+    def _stream_reply(
+        self, messages: List[Dict[str, str]], speech: SpeechPipeline, tokens: "queue.Queue[Optional[str]]"
+    ) -> str:
+        """Consume the completion stream, handing finished sentences to the speech pipeline"""
+        splitter = SentenceSplitter()
+        parts = []
+        try:
+            for text in self.ai_service.stream_text_completion(messages):
+                parts.append(text)
+                tokens.put(text)
+                for sentence in splitter.feed(text):
+                    speech.add_sentence(sentence)
+            for sentence in splitter.flush():
+                speech.add_sentence(sentence)
+        finally:
+            speech.finish()
+            tokens.put(None)
+        return "".join(parts)
 
     def translation_mode(self, mode: str) -> None:
         """Handle translation and explanation mode"""
+        if self._load_memory:
+            # Built in the background while the user types, so neither startup nor other modes wait on
+            # NumPy or on reading the whole cache; suggest() sees what has been loaded so far
+            self._load_memory = False
+            threading.Thread(target=self.translator.load_memory, name="translation-memory", daemon=True).start()
+
         # Initialize context with system prompt
         context = [{"role": "system", "content": TEXT_PROMPT}]
 
@@ -362,16 +1138,26 @@ class SpanishLearningAssistant:
             return
 
         if spanish_input.lower() in ['quit', 'exit', 'back']:
+            self.speculator.discard()
             return
 
-        # Get translation
-        translation = self.translator.translate(spanish_input)
+        # Show a close earlier sentence straight away; the exact translation follows
+        match = self.translator.suggest(spanish_input)
+        if match is not None and match.score < 1.0:
+            print(f"***   Similar to '{match.source}' ({match.score:.0%}): {match.translation}")
+
+        # Get translation, already under way if it was started while the transcription was being confirmed
+        translation, explanation = self.speculator.take(
+            spanish_input, lambda cancel: self._translate_and_explain(spanish_input, cancel)
+        )
         if not translation:
             print("Could not translate the text. Please try again.")
             return
 
         print_separator()
         print(f"***   Translation: {translation}\n*")
+        if explanation:
+            print(f"***   Explanation: {explanation}\n*")
 
         # # Build the request for explanation
         # full_translation_string = f"Analyze this Spanish sentence: '{spanish_input}' which translates to English as: '{translation}'"
@@ -405,6 +1191,15 @@ class SpanishLearningAssistant:
         #         context.append({"role": "assistant", "content": answer})
 
         print_separator()
+
+    def _translate_and_explain(
+        self, spanish_input: str, cancel: Optional[threading.Event] = None
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """Translate the input and, when explanations are enabled, explain it; the explanation is skipped once cancelled"""
+        translation = self.translator.translate(spanish_input)
+        if not translation or not self.explain or (cancel is not None and cancel.is_set()):
+            return translation, None
+        return translation, self.ai_service.get_explanation(spanish_input, translation)
     
     def run(self) -> None:
         """Main loop for the Spanish learning assistant"""
@@ -424,26 +1219,58 @@ class SpanishLearningAssistant:
             else:
                 self.translation_mode(self.current_mode)
 
+        self.turn_scheduler.close()
+        self.speculator.close()
+        stats = self.speculator.stats()
+        if stats["started"]:
+            print(
+                f"***   Speculative translations: {stats['used']} of {stats['started']} used ({stats['hit_rate']:.0%}), "
+                f"{stats['wasted']} wasted, {stats['fully_hidden']} ready before confirmation"
+            )
+        usage_report = self.ai_service.ledger.report()
+        if usage_report:
+            print(usage_report)
+
 
 def cleanup_temp_files() -> None:
-    """Clean up any temporary files that might be left"""
-    temp_dir = tempfile.gettempdir()
-    for file in os.listdir(temp_dir):
-        if file.endswith((".wav", ".mp3")) and os.path.isfile(os.path.join(temp_dir, file)):
-            try:
-                os.remove(os.path.join(temp_dir, file))
-            except:
-                pass
+    """Remove the temporary audio files this process left behind, and nothing else"""
+    global _temp_dir
+    with _temp_dir_lock:
+        temp_dir, _temp_dir = _temp_dir, None
+    if temp_dir is not None:
+        shutil.rmtree(temp_dir, ignore_errors=True)
 
 
 def main() -> None:
     """Main function to run the application"""
+    parser = argparse.ArgumentParser(description="Spanish Learning Assistant")
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const=profiling.DEFAULT_PROFILE_PATH,
+        metavar="PATH",
+        help=f"Write per-stage timing spans to PATH (default {profiling.DEFAULT_PROFILE_PATH}); also enabled by {profiling.PROFILE_ENV_VAR}",
+    )
+    parser.add_argument(
+        "--usage",
+        nargs="?",
+        const=DEFAULT_USAGE_PATH,
+        metavar="PATH",
+        help=f"Write token counts and latency of every chat request to PATH on exit (default {DEFAULT_USAGE_PATH})",
+    )
+    args = parser.parse_args()
+    if args.profile:
+        profiling.enable(args.profile)
+    else:
+        profiling.enable_from_env()
+
     print("\n* * *  Spanish Learning Assistant  * * *\n")
     print("This application supports text, voice input, and conversation modes.")
     print("You can speak Spanish and get explanations in English.")
     print("In voice mode, press ENTER to start recording, then ENTER again to stop.")
     print("In conversation mode, you can have a dialog with an AI assistant.")
 
+    assistant = None
     try:
         assistant = SpanishLearningAssistant()
         assistant.run()
@@ -454,6 +1281,9 @@ def main() -> None:
         traceback.print_exc()
     finally:
         cleanup_temp_files()
+        if args.usage and assistant is not None:
+            assistant.ai_service.ledger.dump(args.usage)
+            print(f"***   Usage written to {args.usage}")
         print("\nProgram ended.")
 
 
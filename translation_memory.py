@@ -0,0 +1,245 @@
+import math
+import threading
+from array import array
+from itertools import islice
+from typing import Optional, List, Dict, Any, Iterable, Tuple, Set, NamedTuple
+
+import numpy as np
+
+from phrases import phrase_key
+
+# Constants
+TM_NGRAM = 5  # Character n-gram length; shorter n-grams are too common to keep lookups fast at a million pairs
+TM_THRESHOLD = 0.7  # Minimum Dice similarity of n-gram sets for a stored pair to be returned
+TM_MERGE_MIN = 10_000  # Recent entries kept in the growable tail before it is merged into the packed index
+TM_MERGE_RATIO = 0.25  # ...or this share of the packed index, whichever is larger, so merges stay amortized
+TM_PREFIX_EXTENSION = 2  # Extra rare n-grams scanned for candidates, which must then share this many more
+TM_LOAD_BATCH = 5000  # Pairs added per lock acquisition by load(), so lookups are not stalled by a bulk load
+
+
+class MemoryMatch(NamedTuple):
+    """A stored translation pair close to the looked-up text"""
+
+    source: str
+    translation: str
+    score: float  # Dice similarity of the normalized n-gram sets, 1.0 for an exact normalized match
+
+
+class TranslationMemory:
+    """
+    Past translation pairs in a character n-gram inverted index, for near-duplicate lookups
+
+    Postings live in a packed CSR index (NumPy offsets and sorted entry ids) plus a small tail of
+    recent additions that is merged in once it grows. Lookups use prefix filtering: a pair can only
+    reach the threshold if it shares a few of the query's rarest n-grams, so only those posting lists
+    generate candidates, and the remaining n-grams are counted for those candidates by binary search.
+    """
+
+    def __init__(
+        self,
+        source_lang: str = "ES",
+        target_lang: str = "EN",
+        threshold: float = TM_THRESHOLD,
+        ngram: int = TM_NGRAM,
+    ):
+        self.source_lang = source_lang
+        self.target_lang = target_lang
+        self.threshold = threshold
+        self.ngram = ngram
+
+        self._sources: List[str] = []
+        self._translations: List[str] = []
+        self._ids: Dict[str, int] = {}  # Normalized source text to entry id
+        self._vocabulary: Dict[str, int] = {}  # N-gram to n-gram id
+        self._sizes = np.zeros(1024, dtype=np.int32)  # Distinct n-grams per entry
+
+        # Packed index covering entries below self._packed
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._postings = np.zeros(0, dtype=np.int32)
+        self._packed = 0
+        # Tail covering the rest, as n-gram id -> entry ids (always ascending)
+        self._tail: Dict[int, array] = {}
+
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+
+    def __len__(self) -> int:
+        return len(self._sources)
+
+    def add(self, source: str, translation: str, source_lang: str = "ES", target_lang: str = "EN") -> None:
+        """Store a translation pair, replacing the translation of an earlier pair with the same normalized text"""
+        self.add_many([(source, translation)], source_lang, target_lang)
+
+    def add_many(self, pairs: Iterable[Tuple[str, str]], source_lang: str = "ES", target_lang: str = "EN") -> int:
+        """Store several translation pairs, returning how many new entries were added"""
+        if source_lang != self.source_lang or target_lang != self.target_lang:
+            return 0
+        added = 0
+        with self._lock:
+            for source, translation in pairs:
+                key = phrase_key(source)
+                if not key:
+                    continue
+                entry = self._ids.get(key)
+                if entry is not None:
+                    self._translations[entry] = translation
+                    continue
+
+                entry = self._ids[key] = len(self._sources)
+                self._sources.append(source)
+                self._translations.append(translation)
+                grams = self._grams(key)
+                if entry >= len(self._sizes):
+                    self._sizes = np.concatenate([self._sizes, np.zeros(len(self._sizes), dtype=np.int32)])
+                self._sizes[entry] = len(grams)
+                for gram in grams:
+                    gram_id = self._vocabulary.setdefault(gram, len(self._vocabulary))
+                    postings = self._tail.get(gram_id)
+                    if postings is None:
+                        postings = self._tail[gram_id] = array("i")
+                    postings.append(entry)
+                added += 1
+
+            if len(self._sources) - self._packed >= max(TM_MERGE_MIN, TM_MERGE_RATIO * self._packed):
+                self._merge()
+        return added
+
+    def load(self, pairs: Iterable[Tuple[str, str]]) -> int:
+        """Bulk-add pairs in this memory's language pair, in batches, then compact the index"""
+        pairs = iter(pairs)
+        added = 0
+        while True:
+            batch = list(islice(pairs, TM_LOAD_BATCH))
+            if not batch:
+                break
+            added += self.add_many(batch, self.source_lang, self.target_lang)
+        self.compact()
+        return added
+
+    def lookup(self, text: str, source_lang: str = "ES", target_lang: str = "EN") -> Optional[MemoryMatch]:
+        """
+        Find the stored pair most similar to text
+
+        Returns:
+            The best match scoring at least the threshold, or None
+        """
+        if source_lang != self.source_lang or target_lang != self.target_lang:
+            return None
+        key = phrase_key(text)
+        if not key:
+            return None
+
+        with self._lock:
+            self.lookups += 1
+            entry = self._ids.get(key)
+            if entry is not None:
+                self.hits += 1
+                return MemoryMatch(self._sources[entry], self._translations[entry], 1.0)
+
+            match = self._best_match(self._grams(key))
+            if match is not None:
+                self.hits += 1
+            return match
+
+    def stats(self) -> Dict[str, Any]:
+        """Return size and hit counters"""
+        with self._lock:
+            return {
+                "entries": len(self._sources),
+                "ngrams": len(self._vocabulary),
+                "postings": len(self._postings) + sum(len(postings) for postings in self._tail.values()),
+                "index_bytes": self._offsets.nbytes + self._postings.nbytes + self._sizes.nbytes,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+            }
+
+    def compact(self) -> None:
+        """Merge the tail into the packed index, e.g. after a bulk load"""
+        with self._lock:
+            if self._packed < len(self._sources):
+                self._merge()
+
+    def _grams(self, key: str) -> Set[str]:
+        padded = f" {key} "
+        return {padded[index:index + self.ngram] for index in range(max(1, len(padded) - self.ngram + 1))}
+
+    def _postings_for(self, gram_id: int) -> np.ndarray:
+        """Ascending ids of the entries containing an n-gram (lock held)"""
+        packed = self._postings[self._offsets[gram_id]:self._offsets[gram_id + 1]] if gram_id + 1 < len(self._offsets) else None
+        tail = self._tail.get(gram_id)
+        if tail is None:
+            return packed if packed is not None else np.zeros(0, dtype=np.int32)
+        tail = np.frombuffer(tail, dtype=np.int32).copy()  # Copied so the tail can keep growing
+        return tail if packed is None or not len(packed) else np.concatenate([packed, tail])
+
+    def _best_match(self, grams: Set[str]) -> Optional[MemoryMatch]:
+        """Score the candidates sharing enough n-grams with the query (lock held)"""
+        size = len(grams)
+        threshold = self.threshold
+        # Dice = 2 * shared / (size + entry_size) >= threshold needs shared >= threshold * size / (2 - threshold),
+        # so any match shares at least 1 + extension of the (size - min_shared + 1 + extension) rarest n-grams.
+        # Requiring more than one shared n-gram costs one more posting list but prunes far more candidates.
+        min_shared = max(1, math.ceil(threshold * size / (2 - threshold) - 1e-9))
+        known = [self._vocabulary[gram] for gram in grams if gram in self._vocabulary]
+        if len(known) < min_shared:
+            return None
+
+        postings = sorted((self._postings_for(gram_id) for gram_id in known), key=len)
+        extension = min(TM_PREFIX_EXTENSION, min_shared - 1)
+        prefix = len(known) - min_shared + 1 + extension  # Unseen n-grams are the rarest of all and match nothing
+        scanned = np.sort(np.concatenate(postings[:prefix]))
+        # In sorted order, an entry seen more than `extension` times equals the id `extension` places on
+        repeated = scanned[extension:] == scanned[:len(scanned) - extension]
+        candidates = scanned[extension:][repeated]
+        if not len(candidates):
+            return None
+        candidates = candidates[np.concatenate(([True], candidates[1:] != candidates[:-1]))]
+        shared = np.searchsorted(scanned, candidates, "right") - np.searchsorted(scanned, candidates, "left")
+        sizes = self._sizes[candidates]
+        # Dice >= threshold  <=>  shared >= threshold * (size + entry_size) / 2, per candidate
+        needed = np.ceil(threshold * (size + sizes) / 2 - 1e-9)
+
+        # Count the remaining n-grams, rarest first, dropping candidates that could not reach
+        # the threshold even if they contained every n-gram still to be counted
+        remaining = len(postings) - prefix
+        for entries in postings[prefix:]:
+            keep = shared + remaining >= needed
+            if not keep.all():
+                candidates, shared, sizes, needed = candidates[keep], shared[keep], sizes[keep], needed[keep]
+            if not len(candidates):
+                return None
+            positions = np.searchsorted(entries, candidates)
+            found = positions < len(entries)
+            found[found] = entries[positions[found]] == candidates[found]
+            shared += found
+            remaining -= 1
+        if not len(candidates):
+            return None
+
+        scores = 2 * shared / (size + sizes)
+        best = int(np.argmax(scores))
+        if scores[best] < threshold:
+            return None
+        entry = int(candidates[best])
+        return MemoryMatch(self._sources[entry], self._translations[entry], float(scores[best]))
+
+    def _merge(self) -> None:
+        """Fold the tail into the packed index (lock held)"""
+        vocabulary_size = len(self._vocabulary)
+        packed_grams = np.repeat(np.arange(len(self._offsets) - 1, dtype=np.int32), np.diff(self._offsets))
+        tail_grams = [np.full(len(entries), gram_id, dtype=np.int32) for gram_id, entries in self._tail.items()]
+        tail_entries = [np.frombuffer(entries, dtype=np.int32) for entries in self._tail.values()]
+
+        grams = np.concatenate([packed_grams] + tail_grams)
+        entries = np.concatenate([self._postings] + tail_entries)
+        del tail_entries  # Release the buffers before the tail arrays are dropped
+        # Packed entries precede tail entries and both are ascending, so a stable sort keeps each list sorted
+        order = np.argsort(grams, kind="stable")
+        self._postings = entries[order]
+        self._offsets = np.zeros(vocabulary_size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(grams, minlength=vocabulary_size), out=self._offsets[1:])
+        self._packed = len(self._sources)
+        self._tail = {}
+
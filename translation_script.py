@@ -1,17 +1,10 @@
 from env import DEEPL_ACCESS_KEY, OPENAI_API_KEY
-import requests
-import os
-import time
 import sys
+import threading
 import warnings
-import tempfile
-import sounddevice as sd
-from scipy.io.wavfile import write
-import numpy as np
 from prompts import TEXT_PROMPT
-
-# AI tool
-from openai import OpenAI
+from translation import TranslationService
+from cache import TranslationCache, ExplanationCache
 
 # Constants
 DEEPL_API_URL = "https://api-free.deepl.com/v2/translate"
@@ -26,34 +19,40 @@ warnings.filterwarnings(
     "ignore", message="FP16 is not supported on CPU; using FP32 instead"
 )
 
-# Initialize OpenAI client
-client = OpenAI(api_key=OPENAI_API_KEY)
+# OpenAI client, created on first use so startup does not pay for importing the SDK
+_client = None
+
+
+def get_client():
+    """Return the OpenAI client, creating it on first use"""
+    global _client
+    if _client is None:
+        from openai import OpenAI
+
+        _client = OpenAI(api_key=OPENAI_API_KEY)
+    return _client
+
+# DeepL translator shared by every translation call
+translator = TranslationService(DEEPL_ACCESS_KEY, DEEPL_API_URL, cache=TranslationCache())
+
+# Explanations for sentences we have already analyzed, invalidated whenever TEXT_PROMPT changes
+explanation_cache = ExplanationCache()
 
 
 def get_translation(text: str):
     """Translate Spanish text to English using DeepL API"""
-    try:
-        response = requests.post(
-            url=DEEPL_API_URL,
-            headers={'Authorization': 'DeepL-Auth-Key ' + DEEPL_ACCESS_KEY},
-            data={"text": [text], "target_lang": "EN", "source_lang": "ES"},
-            timeout=30,
-        )
+    return get_translations([text])[0]
 
-        if response.status_code == 200:
-            return str(response.json()["translations"][0]["text"]).replace("\n", " ")
-        else:
-            print(f"Translation error: {response.status_code} - {response.reason}")
-            return None
-    except Exception as e:
-        print(f"Exception during translation: {str(e)}")
-        return None
+
+def get_translations(texts: list[str]):
+    """Translate many Spanish texts to English, batching them into as few DeepL requests as possible"""
+    return translator.translate_many(texts, source_lang="ES", target_lang="EN")
 
 
 def get_explanation(context: list[dict]):
     """Get explanation from OpenAI"""
     try:
-        completion = client.chat.completions.create(
+        completion = get_client().chat.completions.create(
             model=MODEL_NAME, messages=context, max_tokens=MAX_TOKENS
         )
         return completion.choices[0].message.content
@@ -69,81 +68,64 @@ def print_separator():
 
 def record_audio_simple():
     """Record audio using a simple start/stop approach with ENTER key"""
+    from audio import StreamRecorder, prepare_for_upload, trim_silence
+
     print("***   Press ENTER to start recording...")
     input()  # Wait for Enter key
 
     print("***   Recording... Press ENTER to stop")
-    print("***   (Recording will automatically stop after 30 seconds)")
+    print(f"***   (Recording will automatically stop after {MAX_RECORD_TIME} seconds)")
 
     # Start recording
-    recording = sd.rec(
-        int(MAX_RECORD_TIME * SAMPLE_RATE),
-        samplerate=SAMPLE_RATE,
-        channels=1,
-        dtype='float32',
-    )
+    recorder = StreamRecorder(SAMPLE_RATE, MAX_RECORD_TIME)
+    recorder.start()
 
     # Create a separate thread to wait for key press
-    stop_recording = False
+    stop_recording = threading.Event()
 
     def wait_for_enter():
-        nonlocal stop_recording
         input()  # Wait for Enter key
-        stop_recording = True
-
-    import threading
+        stop_recording.set()
 
     input_thread = threading.Thread(target=wait_for_enter)
     input_thread.daemon = True
     input_thread.start()
 
     # Show recording progress until Enter is pressed or max time is reached
-    start_time = time.time()
-    frame_index = 0
-
-    while not stop_recording and frame_index < len(recording):
-        elapsed = time.time() - start_time
-        print(f"***   Recording: {elapsed:.1f}s", end="\r")
-        time.sleep(0.1)
-        frame_index = int(elapsed * SAMPLE_RATE)
+    while not stop_recording.is_set() and not recorder.finished.is_set():
+        print(f"***   Recording: {recorder.seconds:.1f}s", end="\r")
+        stop_recording.wait(0.1)
 
-        if elapsed >= MAX_RECORD_TIME:
-            break
+    # Stop recording; the buffer holds exactly the frames that were captured
+    samples = recorder.stop()
+    print(f"\n***   Recording finished! Duration: {len(samples) / SAMPLE_RATE:.1f} seconds")
 
-    # Calculate actual duration
-    duration = time.time() - start_time
+    # Leading and trailing silence only costs upload time
+    samples = trim_silence(samples, SAMPLE_RATE)
 
-    # Stop recording
-    sd.stop()
-    print(f"\n***   Recording finished! Duration: {duration:.1f} seconds")
-
-    # Trim recording to actual duration
-    actual_frames = int(duration * SAMPLE_RATE)
-    trimmed_recording = recording[:actual_frames]
-
-    # Create temporary file for the recording
-    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_audio:
-        temp_filename = temp_audio.name
-        # Normalize and convert to int16
-        trimmed_recording = np.int16(trimmed_recording * 32767)
-        write(temp_filename, SAMPLE_RATE, trimmed_recording)
+    if len(samples) == 0:
+        return None
 
-    return temp_filename
+    return prepare_for_upload(samples, SAMPLE_RATE)
 
 
-def transcribe_audio(audio_file_path):
-    """Transcribe audio file using OpenAI Whisper API"""
+def transcribe_audio(audio):
+    """Transcribe a recording (in-memory buffer or file path) using OpenAI Whisper API"""
     try:
-        with open(audio_file_path, "rb") as audio_file:
-            transcription = client.audio.transcriptions.create(
+        if isinstance(audio, str):
+            with open(audio, "rb") as audio_file:
+                transcription = get_client().audio.transcriptions.create(
+                    model="whisper-1",
+                    file=audio_file,
+                    language="es",  # Specify Spanish for better accuracy
+                )
+        else:
+            transcription = get_client().audio.transcriptions.create(
                 model="whisper-1",
-                file=audio_file,
+                file=audio,
                 language="es",  # Specify Spanish for better accuracy
             )
 
-        # Clean up the temporary file
-        os.remove(audio_file_path)
-
         return transcription.text
     except Exception as e:
         print(f"Error transcribing audio: {str(e)}")
@@ -210,7 +192,7 @@ def main():
         print(f"***   Using {current_mode.upper()} input mode")
 
         # Initialize context with system prompt
-        context = [{"role": "system", "content": SYSTEM_PROMPT}]
+        context = [{"role": "system", "content": TEXT_PROMPT}]
 
         # Get Spanish input based on selected mode
         spanish_input = get_spanish_input(current_mode)
@@ -233,8 +215,12 @@ def main():
         full_translation_string = f"Analyze this Spanish sentence: '{spanish_input}' which translates to English as: '{translation}'"
         context.append({"role": "user", "content": full_translation_string})
 
-        # Get detailed explanation
-        explanation = get_explanation(context)
+        # Get detailed explanation, reusing a cached one for sentences we have seen before
+        explanation = explanation_cache.get(spanish_input, translation, MODEL_NAME, TEXT_PROMPT)
+        if explanation is None:
+            explanation = get_explanation(context)
+            if explanation != "Could not generate explanation.":
+                explanation_cache.put(spanish_input, translation, MODEL_NAME, TEXT_PROMPT, explanation)
         print(f"***   Explanation: {explanation}\n*")
 
         # Add the explanation to context
@@ -279,12 +265,4 @@ if __name__ == "__main__":
 
         traceback.print_exc()
     finally:
-        # Clean up any temporary files that might be left
-        temp_dir = tempfile.gettempdir()
-        for file in os.listdir(temp_dir):
-            if file.endswith(".wav") and os.path.isfile(os.path.join(temp_dir, file)):
-                try:
-                    os.remove(os.path.join(temp_dir, file))
-                except:
-                    pass
         print("\nProgram ended.")
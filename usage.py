@@ -0,0 +1,127 @@
+import json
+import threading
+import time
+from collections import deque
+from typing import Optional, List, Dict, Any, Tuple
+
+# Constants
+DEFAULT_USAGE_PATH = "usage.json"
+USAGE_MAX_RECORDS = 10_000  # Per-request records kept for percentiles; totals count every request
+USAGE_PERCENTILES = [50, 95]
+
+
+def usage_tokens(usage: Any) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+    """(prompt, cached, completion) tokens from an OpenAI usage object, None where not reported"""
+    if usage is None:
+        return None, None, None
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) if details is not None else None
+    return usage.prompt_tokens, cached or 0, usage.completion_tokens
+
+
+def _percentile(values: List[float], percentile: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(percentile / 100 * (len(ordered) - 1))))]
+
+
+class UsageLedger:
+    """
+    Token counts and latency of every chat request in a session
+
+    Shows how much of each prompt the provider served from its prompt cache, and how often replies
+    hit max_tokens, so MAX_TOKENS and the prompt layout can be tuned with data.
+    """
+
+    def __init__(self, max_records: int = USAGE_MAX_RECORDS):
+        self.started = time.time()
+        self.records: "deque[Dict[str, Any]]" = deque(maxlen=max_records)
+        self.totals: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        purpose: str,
+        model: str,
+        usage: Any,
+        total_seconds: float,
+        first_token_seconds: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        finish_reason: Optional[str] = None,
+        failed: bool = False,
+    ) -> None:
+        """
+        Add one request
+
+        Args:
+            purpose: What the request was for, e.g. "explanation" or "conversation"
+            usage: The response's usage object, or None when the provider did not report it
+            first_token_seconds: Time to the first streamed token, for streamed requests
+            finish_reason: "length" means the reply was cut off at max_tokens
+        """
+        prompt, cached, completion = usage_tokens(usage)
+        entry = {
+            "ts": round(time.time(), 3),
+            "purpose": purpose,
+            "model": model,
+            "prompt_tokens": prompt,
+            "cached_tokens": cached,
+            "completion_tokens": completion,
+            "max_tokens": max_tokens,
+            "finish_reason": finish_reason,
+            "time_to_first_token_ms": round(1000 * first_token_seconds, 3) if first_token_seconds is not None else None,
+            "total_ms": round(1000 * total_seconds, 3),
+        }
+        if failed:
+            entry["failed"] = True
+        with self._lock:
+            self.records.append(entry)
+            totals = self.totals.setdefault(
+                purpose,
+                {"requests": 0, "failed": 0, "truncated": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0},
+            )
+            totals["requests"] += 1
+            totals["failed"] += failed
+            totals["truncated"] += finish_reason == "length"
+            totals["prompt_tokens"] += prompt or 0
+            totals["cached_tokens"] += cached or 0
+            totals["completion_tokens"] += completion or 0
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Totals, prompt cache hit rate and latency percentiles per purpose"""
+        with self._lock:
+            records = list(self.records)
+            totals = {purpose: dict(counts) for purpose, counts in self.totals.items()}
+
+        summary = {}
+        for purpose, counts in sorted(totals.items()):
+            own = [record for record in records if record["purpose"] == purpose and not record.get("failed")]
+            counts["cached_share"] = round(counts["cached_tokens"] / counts["prompt_tokens"], 3) if counts["prompt_tokens"] else 0.0
+            for name, key in (("completion_tokens", "completion_tokens"), ("ttft_ms", "time_to_first_token_ms"), ("total_ms", "total_ms")):
+                values = [record[key] for record in own if record[key] is not None]
+                for percentile in USAGE_PERCENTILES:
+                    counts[f"{name}_p{percentile}"] = _percentile(values, percentile)
+            summary[purpose] = counts
+        return summary
+
+    def dump(self, path: str) -> None:
+        """Write the summary and every kept request record as JSON"""
+        with self._lock:
+            records = list(self.records)
+        data = {"started": self.started, "ended": time.time(), "summary": self.summary(), "requests": records}
+        with open(path, "w", encoding="utf-8") as usage_file:
+            json.dump(data, usage_file, indent=2)
+
+    def report(self) -> str:
+        """One line per purpose for printing at exit"""
+        lines = []
+        for purpose, counts in self.summary().items():
+            ttft = counts["ttft_ms_p50"]
+            lines.append(
+                f"***   {purpose}: {counts['requests']} requests, {counts['prompt_tokens']} prompt tokens "
+                f"({counts['cached_share']:.0%} cached), {counts['completion_tokens']} completion tokens, "
+                f"{counts['truncated']} cut off at max_tokens"
+                + (f", p50 first token {ttft:.0f} ms" if ttft is not None else "")
+            )
+        return "\n".join(lines)